@@ -12,17 +12,41 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+"""Measure the wake word accuracy and latency on recorded WAV files.
+
+The real ResponsiveRecognizer listens to every file with the configured
+wake word engine, or the one given on the command line.  Files are spread
+across a pool of processes, each loading its own engine.
+
+Files of the positive directory contain the wake word, if a file with the
+same name and a .txt extension holds the time in seconds at which the wake
+word ends, the detection latency is measured from it.  Files of the
+negative directory don't contain the wake word.
+
+Reported are the false rejects (positive files without detection), false
+accepts per hour of negative audio, the detection latency and the CPU
+seconds spent per hour of audio.
+
+Usage:
+    python audio_accuracy_test.py [-h] [options] [POSITIVE_DIR NEGATIVE_DIR]
+"""
+from __future__ import print_function
+
+import argparse
+import tempfile
 import time
 import wave
+from copy import deepcopy
 from glob import glob
+from multiprocessing import Pool, cpu_count
 
 import os
-import pyee
-from os.path import dirname, join
+from os.path import dirname, isdir, isfile, join, splitext
 from speech_recognition import AudioSource
 
-from mycroft.client.speech.listener import RecognizerLoop
+from mycroft.client.speech.hotword_factory import HotWordFactory
 from mycroft.client.speech.mic import ResponsiveRecognizer
+from mycroft.configuration import Configuration
 
 
 def to_percent(val):
@@ -42,7 +66,7 @@ class FileStream(object):
         self.sample_width = self.file.getsampwidth()
         self.last_update_time = 0.0
 
-        self.total_s = self.size / self.sample_rate / self.sample_width
+        self.total_s = float(self.size) / self.sample_rate
         if self.total_s > self.MIN_S_TO_DEBUG:
             self.debug = True
         else:
@@ -51,6 +75,11 @@ class FileStream(object):
     def calc_progress(self):
         return float(self.file.tell()) / self.size
 
+    @property
+    def position(self):
+        """ Seconds of audio read so far. """
+        return float(self.file.tell()) / self.sample_rate
+
     def read(self, chunk_size):
 
         progress = self.calc_progress()
@@ -81,35 +110,6 @@ class FileMockMicrophone(AudioSource):
         self.stream.close()
 
 
-class AudioTester(object):
-    def __init__(self, samp_rate):
-        print  # Pad debug messages
-        self.ww_recognizer = RecognizerLoop().create_mycroft_recognizer(
-            samp_rate, 'en-us')
-        self.listener = ResponsiveRecognizer(self.ww_recognizer)
-        print
-
-    def test_audio(self, file_name):
-        source = FileMockMicrophone(file_name)
-        ee = pyee.EventEmitter()
-
-        class SharedData:
-            times_found = 0
-
-        def on_found_wake_word():
-            SharedData.times_found += 1
-
-        ee.on('recognizer_loop:record_begin', on_found_wake_word)
-
-        try:
-            while True:
-                self.listener.listen(source, ee)
-        except EOFError:
-            pass
-
-        return SharedData.times_found
-
-
 class Color:
     BOLD = '\033[1m'
     NORMAL = '\033[0m'
@@ -126,100 +126,245 @@ def get_root_dir():
 
 
 def get_file_names(folder):
-    query = join(folder, '*.wav')
-    root_dir = get_root_dir()
-    full_path = join(root_dir, query)
-    file_names = sorted(glob(full_path))
-
-    if len(file_names) < 1:
-        raise IOError
-
-    return file_names
-
-
-def test_audio_files(tester, file_names, on_file_finish):
-    num_found = 0
-    for file_name in file_names:
-        short_name = os.path.basename(file_name)
-        times_found = tester.test_audio(file_name)
-
-        num_found += times_found
-        on_file_finish(short_name, times_found)
-
-    return num_found
-
-
-def file_frame_rate(file_name):
-    wf = wave.open(file_name, 'rb')
-    frame_rate = wf.getframerate()
-    wf.close()
-    return frame_rate
-
-
-def print_ww_found_status(word, short_name):
-    print("Wake word " + bold_str(word) + " - " + short_name)
-
-
-def test_false_negative(directory):
-    file_names = get_file_names(directory)
-
-    # Grab audio format info from first file
-    tester = AudioTester(file_frame_rate(file_names[0]))
-
-    def on_file_finish(short_name, times_found):
-        not_found_str = Color.RED + "Not found"
-        found_str = Color.GREEN + "Detected "
-        status_str = not_found_str if times_found == 0 else found_str
-        print_ww_found_status(status_str, short_name)
-
-    num_found = test_audio_files(tester, file_names, on_file_finish)
-    total = len(file_names)
-
-    print
-    print("Found " + bold_str(num_found) + " out of " + bold_str(total))
-    print(bold_str(to_percent(float(num_found) / total)) + " accuracy.")
-    print
-
-
-def test_false_positive(directory):
-    file_names = get_file_names(directory)
-
-    # Grab audio format info from first file
-    tester = AudioTester(file_frame_rate(file_names[0]))
-
-    def on_file_finish(short_name, times_found):
-        not_found_str = Color.GREEN + "Not found"
-        found_str = Color.RED + "Detected "
-        status_str = not_found_str if times_found == 0 else found_str
-        print_ww_found_status(status_str, short_name)
-
-    num_found = test_audio_files(tester, file_names, on_file_finish)
-    total = len(file_names)
-
-    print
-    print("Found " + bold_str(num_found) + " false positives")
-    print("in " + bold_str(str(total)) + " files")
-    print
+    if not isdir(folder):
+        folder = join(get_root_dir(), folder)
+    return sorted(glob(join(folder, '*.wav')))
+
+
+def load_label(file_name):
+    """Get the time labelled for a recording.
+
+    Returns:
+        float: seconds read from the .txt file next to the recording, None
+               if there is no label
+    """
+    label_file = splitext(file_name)[0] + '.txt'
+    if isfile(label_file):
+        with open(label_file) as f:
+            return float(f.read().strip())
+    return None
+
+
+def create_engine(word, module=None, threshold=None, phonemes=None,
+                  lang=None):
+    """Create the wake word engine, from the configuration by default."""
+    config = Configuration.get()
+    lang = lang or config.get('lang', 'en-us')
+    hotword = dict(config.get('hotwords', {}).get(word, {}))
+    if module:
+        hotword['module'] = module
+    if threshold:
+        hotword['threshold'] = threshold
+    if phonemes:
+        hotword['phonemes'] = phonemes
+    return HotWordFactory.create_hotword(word, {word: hotword}, lang)
+
+
+def create_recognizer(ww_recognizer):
+    """Create a ResponsiveRecognizer isolated from a running speech client.
+
+    Recordings are neither saved nor uploaded and the microphone level is
+    published to a file of its own, not to the one of the speech client.
+    """
+    config = deepcopy(Configuration.get())
+    config['opt_in'] = False
+    listener = config['listener']
+    listener['record_wake_words'] = False
+    listener['record_utterances'] = False
+    listener['wake_word_upload'] = dict(listener['wake_word_upload'],
+                                        enable=False)
+    fd, meter_path = tempfile.mkstemp(suffix='.mmap')
+    os.close(fd)
+    try:
+        return ResponsiveRecognizer(ww_recognizer, meter_path=meter_path,
+                                    config=config)
+    finally:
+        # Mapped by the recognizer, the file isn't needed anymore
+        os.remove(meter_path)
 
 
-def run_test():
-    directory = join('audio-accuracy-test', 'data')
+class AudioTester(object):
+    """
+    AudioTester
+    Runs a ResponsiveRecognizer over files, the way the speech client
+    listens: wait for the wake word, record the phrase following it and
+    wait again.
+    """
+
+    def __init__(self, ww_recognizer):
+        self.listener = create_recognizer(ww_recognizer)
+        # Don't consume the signals of a running speech client
+        self.listener._skip_wake_word = lambda: False
 
-    false_neg_dir = join(directory, 'with_wake_word', 'query_after')
-    false_pos_dir = join(directory, 'without_wake_word')
+    def test_audio(self, file_name):
+        """Listen to a file.
 
-    try:
-        test_false_negative(false_neg_dir)
-    except IOError:
-        print(bold_str("Warning: No wav files found in " + false_neg_dir))
+        Returns:
+            tuple: (seconds of audio where the wake word was detected, CPU
+                    seconds used, seconds of audio in the file)
+        """
+        source = FileMockMicrophone(file_name)
+        source.stream.debug = False
+        sec_per_buffer = float(source.CHUNK) / source.SAMPLE_RATE
+        detections = []
+        start = time.clock()
+        try:
+            while True:
+                self.listener._reset_threshold()
+                self.listener._wait_until_wake_word(source, sec_per_buffer)
+                detections.append(source.stream.position)
+                self.listener._record_phrase(source, sec_per_buffer)
+        except EOFError:
+            pass
+        cpu = time.clock() - start
+        duration = source.stream.total_s
+        source.close()
+        return detections, cpu, duration
+
+
+_tester = None
+
+
+def init_worker(word, module, threshold, phonemes, lang):
+    global _tester
+    _tester = AudioTester(create_engine(word, module, threshold, phonemes,
+                                        lang))
+
+
+def test_file(args):
+    file_name, positive = args
+    detections, cpu, duration = _tester.test_audio(file_name)
+    return file_name, positive, detections, cpu, duration
+
+
+class Results(object):
+    """ Totals of the benchmark. """
+
+    def __init__(self):
+        self.positives = 0
+        self.false_rejects = 0
+        self.latencies = []
+        self.false_accepts = 0
+        self.negative_sec = 0.0
+        self.audio_sec = 0.0
+        self.cpu_sec = 0.0
+
+    def add(self, file_name, positive, detections, cpu, duration):
+        self.audio_sec += duration
+        self.cpu_sec += cpu
+        if positive:
+            self.positives += 1
+            if not detections:
+                self.false_rejects += 1
+            else:
+                label = load_label(file_name)
+                if label is not None:
+                    self.latencies.append(detections[0] - label)
+        else:
+            self.negative_sec += duration
+            self.false_accepts += len(detections)
 
+    def print_file(self, file_name, positive, detections, cpu, duration):
+        short_name = os.path.basename(file_name)
+        if positive:
+            status = Color.GREEN + "Detected " if detections else \
+                Color.RED + "Not found"
+        else:
+            status = Color.RED + "Detected " if detections else \
+                Color.GREEN + "Not found"
+        times = ", ".join("%.2fs" % t for t in detections)
+        print("Wake word " + bold_str(status) + " - " + short_name +
+              (" at " + times if times else ""))
+
+    def print_summary(self):
+        print("")
+        if self.positives:
+            print("False rejects: " + bold_str(self.false_rejects) +
+                  " out of " + bold_str(self.positives) + " (" +
+                  to_percent(float(self.false_rejects) / self.positives) +
+                  ")")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            mean = sum(latencies) / len(latencies)
+            median = latencies[len(latencies) // 2]
+            p90 = latencies[min(int(len(latencies) * 0.9),
+                                len(latencies) - 1)]
+            print("Latency after the wake word: mean %.3fs, median %.3fs, "
+                  "90%% %.3fs over %d labelled files" %
+                  (mean, median, p90, len(latencies)))
+        if self.negative_sec:
+            hours = self.negative_sec / 3600
+            print("False accepts: " + bold_str(self.false_accepts) +
+                  " in %.2f hours, " % hours +
+                  bold_str("%.2f" % (self.false_accepts / hours)) +
+                  " per hour")
+        if self.audio_sec:
+            print("CPU: %.1f seconds per audio hour" %
+                  (3600 * self.cpu_sec / self.audio_sec))
+        print("")
+
+
+def run_test(positive_dir, negative_dir, word, module=None, threshold=None,
+             phonemes=None, lang=None, processes=None):
+    files = [(f, True) for f in get_file_names(positive_dir)] + \
+        [(f, False) for f in get_file_names(negative_dir)]
+    if not files:
+        print(bold_str("Warning: No wav files found in " + positive_dir +
+                       " or " + negative_dir))
+        return None
+
+    results = Results()
+    pool = Pool(processes or cpu_count(), init_worker,
+                (word, module, threshold, phonemes, lang))
     try:
-        test_false_positive(false_pos_dir)
-    except IOError:
-        print(bold_str("Warning: No wav files found in " + false_pos_dir))
-
+        # Longest files first, so the pool doesn't wait on a late one
+        files.sort(key=lambda f: -os.path.getsize(f[0]))
+        for result in pool.imap_unordered(test_file, files):
+            results.print_file(*result)
+            results.add(*result)
+    finally:
+        pool.terminate()
+    results.print_summary()
+    return results
+
+
+def main():
+    directory = join('audio-accuracy-test', 'data')
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'positive_dir', nargs='?',
+        default=join(directory, 'with_wake_word', 'query_after'),
+        help="Directory of wav files with the wake word")
+    parser.add_argument(
+        'negative_dir', nargs='?',
+        default=join(directory, 'without_wake_word'),
+        help="Directory of wav files without the wake word")
+    parser.add_argument(
+        '-w', '--word', dest='word',
+        help="Wake word (Default: configured wake word)")
+    parser.add_argument(
+        '-m', '--module', dest='module',
+        help="Hotword engine (Default: configured for the wake word)")
+    parser.add_argument(
+        '-t', '--threshold', dest='threshold', type=float,
+        help="Engine threshold (Default: configured)")
+    parser.add_argument(
+        '--phonemes', dest='phonemes',
+        help="Wake word phonemes (Default: configured)")
+    parser.add_argument(
+        '-l', '--lang', dest='lang',
+        help="Language (Default: configured)")
+    parser.add_argument(
+        '-p', '--processes', dest='processes', type=int,
+        help="Number of processes (Default: number of CPUs)")
+    args = parser.parse_args()
+
+    word = args.word or Configuration.get().get('listener', {}).get(
+        'wake_word', 'hey mycroft')
+    run_test(args.positive_dir, args.negative_dir, word, args.module,
+             args.threshold, args.phonemes, args.lang, args.processes)
     print("Complete!")
 
 
 if __name__ == "__main__":
-    run_test()
+    main()
@@ -0,0 +1,108 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Compare the VAD engines on recorded WAV files.
+
+Every file is fed to ResponsiveRecognizer._record_phrase() as if recording
+had just begun, once per VAD engine.  The time at which the phrase was
+considered complete and the CPU time spent are reported.  If a file with the
+same name and a .txt extension holds the time in seconds at which the speech
+really ends, the error of each engine is reported as well.
+
+Usage:
+    python vad_benchmark.py DIRECTORY [ENGINE ...]
+"""
+import sys
+import time
+from glob import glob
+
+from os.path import basename, join
+
+from audio_accuracy_test import FileMockMicrophone, create_recognizer, \
+    load_label
+from mycroft.client.speech.hotword_factory import HotWordEngine
+from mycroft.client.speech.vad import VADFactory
+
+
+def run_engine(engine, file_name):
+    """Record a phrase from file_name with the given VAD engine.
+
+    Returns:
+        tuple: (seconds at which the phrase ended or None if the file ended
+                first, CPU seconds used, seconds of audio processed)
+    """
+    source = FileMockMicrophone(file_name)
+    recognizer = create_recognizer(HotWordEngine())
+    recognizer.vad = VADFactory.create({'module': engine},
+                                       source.SAMPLE_RATE)
+    sec_per_buffer = float(source.CHUNK) / source.SAMPLE_RATE
+    bytes_per_sec = source.SAMPLE_RATE * source.SAMPLE_WIDTH
+
+    start = time.clock()
+    try:
+        audio = recognizer._record_phrase(source, sec_per_buffer)
+        end = float(len(audio)) / bytes_per_sec
+        processed = end
+    except EOFError:
+        end = None
+        processed = float(source.stream.file.tell()) / source.SAMPLE_RATE
+    cpu = time.clock() - start
+    source.close()
+    return end, cpu, processed
+
+
+def format_time(value):
+    return "%7.2f" % value if value is not None else "      -"
+
+
+def main(directory, engines):
+    file_names = sorted(glob(join(directory, '*.wav')))
+    if not file_names:
+        print("No wav files found in " + directory)
+        return
+
+    totals = dict((engine, [0.0, 0.0, 0, 0.0]) for engine in engines)
+    print("%-30s %-10s %7s %7s %12s" % ("file", "engine", "end (s)",
+                                        "error", "cpu ms/s"))
+    for file_name in file_names:
+        label = load_label(file_name)
+        for engine in engines:
+            end, cpu, processed = run_engine(engine, file_name)
+            error = None
+            if label is not None and end is not None:
+                error = end - label
+                totals[engine][2] += 1
+                totals[engine][3] += abs(error)
+            totals[engine][0] += cpu
+            totals[engine][1] += processed
+            print("%-30s %-10s %s %s %12.2f" % (
+                basename(file_name)[:30], engine, format_time(end),
+                format_time(error), 1000 * cpu / max(processed, 1e-6)))
+
+    print("")
+    for engine in engines:
+        cpu, processed, labelled, abs_error = totals[engine]
+        summary = "%-10s %8.2f ms CPU per audio second" % (
+            engine, 1000 * cpu / max(processed, 1e-6))
+        if labelled:
+            summary += ", mean end of speech error %.2f s" % (
+                abs_error / labelled)
+        print(summary)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2:] or sorted(VADFactory.CLASSES))
@@ -14,7 +14,11 @@
 #
 import time
 
-from mycroft.util.signal import check_for_signal, create_signal
+from mycroft.util.signal import (
+    check_for_signal,
+    create_signal,
+    wait_for_signal_clear
+)
 
 
 def is_speaking():
@@ -34,8 +38,7 @@ def wait_while_speaking():
     begin.
     """
     time.sleep(0.1)  # Wait briefly in for any queued speech to begin
-    while is_speaking():
-        time.sleep(0.1)
+    wait_for_signal_clear("isSpeaking")
 
 
 def stop_speaking():
@@ -46,8 +49,7 @@ def stop_speaking():
     send('mycroft.audio.speech.stop')
 
     # Block until stopped
-    while check_for_signal("isSpeaking", -1):
-        time.sleep(0.25)
+    wait_for_signal_clear("isSpeaking")
 
     # This consumes the signal
     check_for_signal('stoppingTTS')
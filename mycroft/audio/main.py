@@ -13,7 +13,7 @@
 # limitations under the License.
 #
 import imp
-import json
+import logging
 import sys
 import time
 
@@ -23,7 +23,7 @@ from os.path import abspath, dirname, basename, isdir, join
 import mycroft.audio.speech as speech
 from mycroft.configuration import Configuration
 from mycroft.messagebus.client.ws import WebsocketClient
-from mycroft.messagebus.message import Message
+from mycroft.messagebus.message import Message, describe, parse_header
 from mycroft.util.log import LOG
 
 try:
@@ -458,17 +458,13 @@ def main():
     setup_pulseaudio_handlers(config.get('Audio').get('pulseaudio'))
 
     def echo(message):
-        try:
-            _message = json.loads(message)
-            if 'mycroft.audio.service' not in _message.get('type'):
-                return
-            message = json.dumps(_message)
-        except:
-            pass
-        LOG.debug(message)
+        header = parse_header(message)
+        if header and 'mycroft.audio.service' in (header[0] or ''):
+            LOG.debug(describe(message))
 
     LOG.info("Staring Audio Services")
-    ws.on('message', echo)
+    if LOG.level <= logging.DEBUG:
+        ws.on('received', echo)
     ws.once('open', load_services_callback)
     try:
         ws.run_forever()
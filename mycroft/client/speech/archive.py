@@ -0,0 +1,283 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import shutil
+import subprocess
+import tempfile
+from Queue import Queue, Full
+from threading import Thread, Event
+
+import os
+from os.path import join, expanduser, isfile, isdir, getsize, getmtime
+from speech_recognition import AudioData
+
+from mycroft.util import resolve_resource_file
+from mycroft.util.log import LOG
+
+
+class AudioArchiver(Thread):
+    """
+    AudioArchiver
+    Saves recordings to a directory in the background.
+
+    archive() only queues the audio, encoding and writing happen in this
+    thread so capture is never stalled.  When the queue is full recordings
+    are dropped and counted.  After each write the oldest files are removed
+    to keep the directory under its quota.  With an uploader the directory
+    is its spool, files waiting for upload are never removed, new
+    recordings are dropped instead while the spool is over quota.
+
+    Args:
+        directory (str): where recordings are saved
+        audio_format (str): "flac" or "wav"
+        quota_mb (float): maximum size of the directory
+        queue_size (int): recordings waiting to be saved before dropping
+        uploader (ScpUploader): uploads the saved files, if given
+        name (str): name of the archive in the metrics
+    """
+
+    def __init__(self, directory, audio_format="flac", quota_mb=100,
+                 queue_size=8, uploader=None, name="recordings"):
+        super(AudioArchiver, self).__init__()
+        self.daemon = True
+        self.directory = directory
+        self.name = name
+        self.audio_format = audio_format
+        self.quota = int(quota_mb * 1024 * 1024)
+        self.queue = Queue(queue_size)
+        self.uploader = uploader
+        self.dropped = 0
+        self.rotated = 0
+        self.disk_usage = 0
+        self._reported = (0, 0)
+        if not isdir(directory):
+            os.makedirs(directory)
+
+    def archive(self, frame_data, sample_rate, sample_width, name):
+        """Queue a recording to be saved, without blocking.
+
+        Args:
+            frame_data (str): raw audio
+            sample_rate (int): sample rate of the audio
+            sample_width (int): bytes per sample
+            name (str): file name, without extension
+
+        Returns:
+            bool: False if the recording was dropped
+        """
+        try:
+            self.queue.put_nowait((frame_data, sample_rate, sample_width,
+                                   name))
+            return True
+        except Full:
+            self.dropped += 1
+            LOG.warning("Archive queue full, dropped " + name)
+            return False
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.save(*item)
+            except Exception as e:
+                LOG.error("Could not archive " + item[3] + ": " + repr(e))
+
+    def save(self, frame_data, sample_rate, sample_width, name):
+        audio = AudioData(frame_data, sample_rate, sample_width)
+        if self.audio_format == "flac":
+            data = audio.get_flac_data()
+        else:
+            data = audio.get_wav_data()
+        if self.uploader:
+            self.disk_usage = sum(size for _, size, _ in self._list_files())
+            if self.disk_usage + len(data) > self.quota:
+                self.dropped += 1
+                LOG.warning("Upload spool full, dropped " + name)
+                return None
+        filename = join(self.directory, name + '.' + self.audio_format)
+        # Written under a temporary name so the uploader never sees a
+        # partial file
+        with open(filename + '.tmp', 'wb') as f:
+            f.write(data)
+        os.rename(filename + '.tmp', filename)
+        self.rotate()
+        if self.uploader:
+            self.uploader.notify()
+        return filename
+
+    def _list_files(self):
+        """ Get (mtime, size, path) of the saved files, oldest first. """
+        files = []
+        for name in os.listdir(self.directory):
+            path = join(self.directory, name)
+            if isfile(path):
+                files.append((getmtime(path), getsize(path), path))
+        files.sort()
+        return files
+
+    def rotate(self):
+        """ Remove the oldest recordings until under the quota. """
+        files = self._list_files()
+        total = sum(size for _, size, _ in files)
+        # Files waiting for upload are kept, see save()
+        while files and total > self.quota and not self.uploader:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+                self.rotated += 1
+            except OSError:
+                pass
+            total -= size
+        self.disk_usage = total
+
+    def report(self, metrics):
+        """Add the archive statistics to metrics.
+
+        Args:
+            metrics (MetricsAggregator): metrics to update
+        """
+        prefix = "mycroft.archive." + self.name + "."
+        dropped, rotated = self._reported
+        metrics.increment(prefix + "dropped", self.dropped - dropped)
+        metrics.increment(prefix + "rotated", self.rotated - rotated)
+        self._reported = (self.dropped, self.rotated)
+        metrics.level(prefix + "queue_depth", self.queue.qsize())
+        metrics.level(prefix + "disk_bytes", self.disk_usage)
+        if self.uploader:
+            self.uploader.report(metrics, prefix)
+
+    def stop(self):
+        """ Save the queued recordings and stop. """
+        self.queue.put(None)
+        self.join()
+        if self.uploader:
+            self.uploader.stop()
+
+
+class ScpUploader(Thread):
+    """
+    ScpUploader
+    Uploads the files of a spool directory to the wake word server.
+
+    Files are sent in batches with a single scp command over one ssh
+    connection kept open between batches (ssh connection multiplexing), and
+    removed once uploaded.  Failed batches are retried with an increasing
+    delay, the files stay in the spool meanwhile, including across restarts.
+
+    Args:
+        config (dict): listener.wake_word_upload configuration
+        spool (str): directory holding the files to upload
+    """
+    # Seconds to wait after a new file for others to join the batch
+    BATCH_DELAY = 10.0
+    MAX_RETRY_DELAY = 900.0
+
+    def __init__(self, config, spool):
+        super(ScpUploader, self).__init__()
+        self.daemon = True
+        self.config = config
+        self.spool = spool
+        self.pending = Event()
+        self.pending.set()  # Spooled files from a previous run
+        self.running = True
+        self.failures = 0
+        self.uploaded = 0
+        self._reported = (0, 0)
+        self.control_path = join(tempfile.gettempdir(),
+                                 'mycroft-upload-%r@%h:%p')
+
+    def notify(self):
+        """ Called when a file was added to the spool. """
+        self.pending.set()
+
+    def get_keyfile(self):
+        keyfile = resolve_resource_file('wakeword_rsa')
+        userfile = expanduser('~/.mycroft/wakeword_rsa')
+
+        if not isfile(userfile):
+            shutil.copy2(keyfile, userfile)
+            os.chmod(userfile, 0o600)
+        return userfile
+
+    def upload(self, files):
+        """Send files with one scp command.
+
+        Returns:
+            bool: True if all files were uploaded
+        """
+        address = self.config['user'] + '@' + \
+            self.config['server'] + ':' + self.config['folder']
+        for fn in files:
+            os.chmod(fn, 0o666)
+        cmd = ['scp', '-q', '-o', 'StrictHostKeyChecking=no',
+               '-o', 'BatchMode=yes',
+               '-o', 'ControlMaster=auto',
+               '-o', 'ControlPath=' + self.control_path,
+               '-o', 'ControlPersist=600',
+               '-P', str(self.config['port']),
+               '-i', self.get_keyfile()] + files + [address]
+        return subprocess.call(cmd) == 0
+
+    def run(self):
+        retry_delay = self.BATCH_DELAY
+        while self.running:
+            self.pending.wait()
+            if not self.running:
+                break
+            # Let more files join the batch
+            self.pending.clear()
+            self.pending.wait(self.BATCH_DELAY)
+            self.pending.clear()
+
+            files = sorted(join(self.spool, f) for f in os.listdir(self.spool)
+                           if not f.endswith('.tmp'))
+            if not files:
+                continue
+            LOG.debug('Uploading %d files...' % len(files))
+            try:
+                success = self.upload(files)
+            except Exception as e:
+                LOG.error('Upload failed: ' + repr(e))
+                success = False
+
+            if success:
+                self.uploaded += len(files)
+                retry_delay = self.BATCH_DELAY
+                for fn in files:
+                    try:
+                        os.remove(fn)
+                    except OSError:
+                        pass
+            else:
+                self.failures += 1
+                LOG.debug('Could not upload to ' + self.config['server'] +
+                          ', retrying in %ds' % retry_delay)
+                self.pending.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, self.MAX_RETRY_DELAY)
+                self.pending.set()
+
+    def report(self, metrics, prefix="mycroft.archive."):
+        uploaded, failures = self._reported
+        metrics.increment(prefix + "uploaded", self.uploaded - uploaded)
+        metrics.increment(prefix + "upload_failures",
+                          self.failures - failures)
+        self._reported = (self.uploaded, self.failures)
+        metrics.level(prefix + "upload_pending",
+                      len(os.listdir(self.spool)))
+
+    def stop(self):
+        self.running = False
+        self.pending.set()
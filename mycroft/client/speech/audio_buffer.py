@@ -0,0 +1,175 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from itertools import count
+from threading import Condition
+
+
+class CyclicAudioBuffer(object):
+    """Fixed size rolling window of raw audio.
+
+    The storage is allocated once, with twice the requested size, and every
+    byte is written both at its position and at its position + size.  This
+    keeps any window of the most recent audio contiguous in memory so it can
+    be handed out as a memoryview without copying or concatenating.
+
+    Views returned by get() and get_last() alias the internal storage and are
+    only valid until the next call to append().
+
+    Args:
+        size (int): Maximum number of bytes kept in the window
+        initial_data (str): Audio to prefill the window with
+    """
+
+    def __init__(self, size, initial_data=b''):
+        self.size = int(size)
+        self._buffer = bytearray(2 * self.size)
+        self._view = memoryview(self._buffer)
+        self._pos = 0  # Next write position, always in [0, size)
+        self._len = 0  # Number of valid bytes in the window
+        self.append(initial_data)
+
+    def __len__(self):
+        return self._len
+
+    def clear(self):
+        """ Drop all audio from the window (the storage is kept). """
+        self._pos = 0
+        self._len = 0
+
+    def append(self, data):
+        """Add audio to the end of the window, dropping the oldest audio.
+
+        Args:
+            data (str): raw audio bytes
+        """
+        data = memoryview(data)
+        n = len(data)
+        if n > self.size:
+            data = data[n - self.size:]
+            n = self.size
+        if n == 0:
+            return
+
+        pos = self._pos
+        size = self.size
+        self._buffer[pos:pos + n] = data
+        # Mirror the part written to the lower half into the upper half and
+        # the part that spilled into the upper half back to the lower half.
+        split = min(pos + n, size) - pos
+        self._buffer[pos + size:pos + size + split] = data[:split]
+        if n > split:
+            self._buffer[0:n - split] = data[split:]
+
+        self._pos = (pos + n) % size
+        self._len = min(self._len + n, size)
+
+    def get_last(self, size):
+        """Get the most recent audio in the window.
+
+        Args:
+            size (int): number of bytes wanted
+
+        Returns:
+            memoryview: contiguous view of at most size bytes
+        """
+        size = min(int(size), self._len)
+        end = self._pos + self.size
+        return self._view[end - size:end]
+
+    def get(self):
+        """Get all audio currently held in the window.
+
+        Returns:
+            memoryview: contiguous view of the whole window
+        """
+        return self.get_last(self._len)
+
+
+class PhraseAudioBuffer(object):
+    """Preallocated buffer for a phrase while it is being recorded.
+
+    Audio is written once into storage sized for the longest phrase allowed.
+    Other threads can iterate over the audio with chunks() while recording
+    is still in progress.  Every buffer gets a unique id, the recorded
+    AudioData carries it as phrase_id.
+
+    Args:
+        size (int): Maximum number of bytes in the phrase, audio appended
+                    beyond this is dropped
+        initial_data (str): Audio to start the phrase with
+    """
+
+    _ids = count(1)
+
+    def __init__(self, size, initial_data=b''):
+        self.id = next(PhraseAudioBuffer._ids)
+        self.size = int(size)
+        self._buffer = bytearray(self.size)
+        self._view = memoryview(self._buffer)
+        self._len = 0
+        self._cond = Condition()
+        self.finished = False
+        self.append(initial_data)
+
+    def __len__(self):
+        return self._len
+
+    def append(self, data):
+        """Add recorded audio to the end of the phrase.
+
+        Args:
+            data (str): raw audio bytes
+        """
+        n = min(len(data), self.size - self._len)
+        with self._cond:
+            self._buffer[self._len:self._len + n] = memoryview(data)[:n]
+            self._len += n
+            self._cond.notify_all()
+
+    def finish(self):
+        """ Mark the phrase as complete, ending any chunks() iteration. """
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def get(self):
+        """Get the audio recorded so far.
+
+        Returns:
+            memoryview: view of the recorded audio
+        """
+        return self._view[:self._len]
+
+    def chunks(self):
+        """Iterate over the phrase as it is being recorded.
+
+        Blocks waiting for audio until finish() has been called.
+
+        Yields:
+            str: audio recorded since the previous chunk
+        """
+        pos = 0
+        while True:
+            with self._cond:
+                while pos >= self._len and not self.finished:
+                    self._cond.wait()
+                end = self._len
+                finished = self.finished
+            # Recorded audio is never overwritten, so no need for the lock
+            if end > pos:
+                yield self._view[pos:end].tobytes()
+                pos = end
+            elif finished:
+                return
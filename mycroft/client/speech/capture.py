@@ -0,0 +1,204 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from threading import Thread, Condition
+
+from speech_recognition import AudioSource
+
+from mycroft.util.log import LOG
+
+
+class CaptureHub(Thread):
+    """
+    CaptureHub
+    Reads an opened audio source in a single thread and publishes every
+    chunk into a shared ring.  Any number of consumers read the ring through
+    their own CaptureCursor.
+
+    Chunks are stored by reference, consumers never copy or block each
+    other.  A consumer lagging more than the ring holds skips the oldest
+    audio instead of stalling capture, the skipped chunks are counted.
+
+    Args:
+        source (AudioSource): entered audio source to read from
+        buffer_sec (float): seconds of audio kept for lagging consumers
+        on_error (callable): called with the IOError when a read fails
+    """
+
+    def __init__(self, source, buffer_sec=10.0, on_error=None):
+        super(CaptureHub, self).__init__()
+        self.daemon = True
+        self.source = source
+        self.on_error = on_error
+        self.capacity = max(int(buffer_sec * source.SAMPLE_RATE /
+                                source.CHUNK), 1)
+        self._chunks = [None] * self.capacity
+        self._seq = 0  # Number of chunks published so far
+        self._cond = Condition()
+        self._cursors = []
+        self.running = False
+
+    @property
+    def sec_per_chunk(self):
+        return float(self.source.CHUNK) / self.source.SAMPLE_RATE
+
+    def create_cursor(self, name):
+        """Add a consumer, reading audio published from now on.
+
+        Args:
+            name (str): name of the consumer, used in stats and logs
+
+        Returns:
+            CaptureCursor: the consumer's read position in the ring
+        """
+        with self._cond:
+            cursor = CaptureCursor(self, name, self._seq)
+            self._cursors.append(cursor)
+        return cursor
+
+    def create_source(self, name):
+        """Add a consumer expecting an AudioSource, like the recognizer."""
+        return CaptureSource(self.source, self.create_cursor(name))
+
+    def remove_cursor(self, cursor):
+        with self._cond:
+            if cursor in self._cursors:
+                self._cursors.remove(cursor)
+
+    def publish(self, chunk):
+        with self._cond:
+            self._chunks[self._seq % self.capacity] = chunk
+            self._seq += 1
+            self._cond.notify_all()
+
+    def start(self):
+        # Set before the thread runs so that cursors don't see a stopped hub
+        self.running = True
+        super(CaptureHub, self).start()
+
+    def run(self):
+        try:
+            while self.running:
+                try:
+                    chunk = self.source.stream.read(self.source.CHUNK)
+                except IOError as e:
+                    if self.on_error:
+                        self.on_error(e)
+                    continue
+                self.publish(chunk)
+        finally:
+            with self._cond:
+                self.running = False
+                self._cond.notify_all()
+
+    def stop(self):
+        """ Stop capturing, consumers get EOFError once caught up. """
+        self.running = False
+        if self.is_alive():
+            self.join()
+
+    def stats(self):
+        """Get the state of every consumer.
+
+        Returns:
+            dict: name -> {'lag': chunks not read yet, 'lag_sec': same in
+                  seconds, 'max_lag': worst lag seen, 'dropped': chunks
+                  skipped because the consumer was too slow}
+        """
+        with self._cond:
+            return dict((c.name, c.stats()) for c in self._cursors)
+
+
+class CaptureCursor(object):
+    """
+    CaptureCursor
+    Read position of one consumer in a CaptureHub.  Provides the read()
+    method of an audio stream so it can replace one.
+    """
+
+    def __init__(self, hub, name, position):
+        self.hub = hub
+        self.name = name
+        self.position = position
+        self.max_lag = 0
+        self.dropped = 0
+
+    @property
+    def lag(self):
+        """ Number of published chunks not read yet. """
+        return self.hub._seq - self.position
+
+    def read(self, size=None):
+        """Get the next chunk, waiting for it to be captured.
+
+        Args:
+            size (int): ignored, chunks are returned as read from the source
+
+        Returns:
+            str: raw audio
+
+        Raises:
+            EOFError: when the hub has stopped and every chunk has been read
+        """
+        hub = self.hub
+        with hub._cond:
+            while self.position >= hub._seq:
+                if not hub.running:
+                    raise EOFError("Capture stopped")
+                hub._cond.wait()
+            lag = hub._seq - self.position
+            if lag > hub.capacity:
+                skipped = lag - hub.capacity
+                LOG.warning("Capture consumer %s is %.2fs behind, skipping "
+                            "%d chunks" % (self.name, lag * hub.sec_per_chunk,
+                                           skipped))
+                self.dropped += skipped
+                self.position += skipped
+                lag = hub.capacity
+            self.max_lag = max(self.max_lag, lag)
+            chunk = hub._chunks[self.position % hub.capacity]
+            self.position += 1
+        return chunk
+
+    def stats(self):
+        lag = self.lag
+        return {
+            'lag': lag,
+            'lag_sec': lag * self.hub.sec_per_chunk,
+            'max_lag': self.max_lag,
+            'dropped': self.dropped
+        }
+
+    def close(self):
+        self.hub.remove_cursor(self)
+
+
+class CaptureSource(AudioSource):
+    """
+    CaptureSource
+    AudioSource reading from a CaptureCursor, with the same format as the
+    captured source.
+    """
+
+    def __init__(self, source, cursor):
+        self.stream = cursor
+        self.CHUNK = source.CHUNK
+        self.SAMPLE_RATE = source.SAMPLE_RATE
+        self.SAMPLE_WIDTH = source.SAMPLE_WIDTH
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream.close()
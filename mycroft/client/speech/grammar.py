@@ -0,0 +1,340 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import re
+
+import os
+from os.path import isfile
+
+from mycroft.util.log import LOG
+
+GRAMMAR_SEARCHES = ('commands0', 'commands1')
+
+
+def set_decoder_grammar(decoder, path, generation):
+    """Switch a pocketsphinx decoder to a JSGF grammar.
+
+    Successive generations alternate between two search names so the
+    search being replaced is never the one in use.  Must be called by the
+    thread using the decoder, between utterances.
+
+    Returns:
+        str: name of the search
+    """
+    name = GRAMMAR_SEARCHES[generation % 2]
+    decoder.set_jsgf_file(name, str(path))
+    decoder.set_search(name)
+    return name
+
+
+def _rule_name(prefix, name):
+    return prefix + '_' + re.sub('[^a-zA-Z0-9_]', '_', name)
+
+
+def _words(phrase):
+    return re.findall(r"[a-z']+", phrase.lower())
+
+
+def _regex_phrases(pattern):
+    """Literal phrases of a regular expression, outside of its groups.
+
+    Escapes, character classes and groups are left out, the top level
+    alternatives give one phrase each.
+    """
+    alternatives = ['']
+    depth = 0
+    pos = 0
+    while pos < len(pattern):
+        char = pattern[pos]
+        if char == '\\':
+            pos += 1  # Escaped character or class
+            char = ' '
+        elif char == '[':
+            pos = pattern.find(']', pos + 2)
+            if pos < 0:
+                break
+            char = ' '
+        elif char in '()':
+            depth += 1 if char == '(' else -1
+            char = ' '
+        elif char == '|' and depth == 0:
+            alternatives.append('')
+            char = ''
+        if depth == 0:
+            alternatives[-1] += char
+        pos += 1
+    return [' '.join(_words(a)) for a in alternatives if _words(a)]
+
+
+def _read_lines(file_name):
+    if not isfile(file_name):
+        LOG.warning('Could not find file ' + file_name)
+        return []
+    with open(file_name) as f:
+        return [l.strip() for l in f if l.strip() and
+                not l.strip().startswith('#')]
+
+
+class VocabularyGrammar(object):
+    """
+    VocabularyGrammar
+    JSGF grammar of the commands the loaded skills can handle, for
+    transcribing locally against a closed command set.
+
+    Filled from the vocabulary and intents registered on the message bus.
+    Adapt intents accept any sequence of the words of their keywords, the
+    literal words of a regex entity count as keywords of its groups but the
+    free text captured by the groups can't be expressed.  Padatious intents
+    accept the sentences of their .intent file.  Only the rules of the
+    intents changed since the last build are regenerated.
+
+    Args:
+        is_known (callable): tells if a word can be decoded, phrases with
+                             unknown words are left out
+    """
+
+    # Message bus messages updating the grammar -> method handling them
+    MESSAGES = {
+        'register_vocab': 'register_vocab',
+        'register_intent': 'register_intent',
+        'padatious:register_intent': 'register_padatious_intent',
+        'padatious:register_entity': 'register_padatious_entity',
+        'detach_intent': 'detach_intent',
+        'detach_skill': 'detach_skill'
+    }
+
+    def __init__(self, is_known=None):
+        self.is_known = is_known or (lambda word: True)
+        self.vocab = {}  # Adapt entity type -> set of phrases
+        self.intents = {}  # Intent name -> (kind, data)
+        self.entities = {}  # Padatious entity name -> list of lines
+        self.rules = {}  # Intent name -> JSGF rules, None when outdated
+        self.version = 0
+        self.built_version = None
+
+    def clear(self):
+        """ Forget all the vocabulary and intents. """
+        self.vocab = {}
+        self.intents = {}
+        self.entities = {}
+        self.rules = {}
+        self.version += 1
+
+    def handle(self, msg_type, data):
+        """Update the grammar from a message of MESSAGES.
+
+        Args:
+            msg_type (str): type of the message
+            data (dict): data of the message
+        """
+        getattr(self, self.MESSAGES[msg_type])(data)
+
+    def set_word_filter(self, is_known):
+        """ Change the function telling if a word can be decoded. """
+        if is_known != self.is_known:
+            self.is_known = is_known
+            self._changed(list(self.intents))
+
+    def _changed(self, names):
+        for name in names:
+            self.rules[name] = None
+        self.version += 1
+
+    def _intents_using(self, kind, key):
+        return [name for name, (k, data) in self.intents.items()
+                if k == kind and key in data]
+
+    def register_vocab(self, data):
+        """ Handle a register_vocab message. """
+        if data.get('regex'):
+            regex = data['regex']
+            phrases = _regex_phrases(regex)
+            for entity_type in re.findall(r'\(\?P<(\w+)>', regex):
+                self._add_vocab(entity_type, phrases)
+        elif data.get('end'):
+            self._add_vocab(data['end'],
+                            [' '.join(_words(data.get('start', '')))])
+
+    def _add_vocab(self, entity_type, new_phrases):
+        phrases = self.vocab.setdefault(entity_type, set())
+        new_phrases = set(p for p in new_phrases if p) - phrases
+        if new_phrases:
+            phrases.update(new_phrases)
+            self._changed(self._intents_using('adapt', entity_type))
+
+    def register_intent(self, data):
+        """ Handle a register_intent message from an Adapt skill. """
+        types = set(t for t, _ in data.get('requires', []))
+        types.update(t for t, _ in data.get('optional', []))
+        for alternatives in data.get('at_least_one', []):
+            types.update(alternatives)
+        self.intents[data['name']] = ('adapt', types)
+        self._changed([data['name']])
+
+    def register_padatious_intent(self, data):
+        """ Handle a padatious:register_intent message. """
+        lines = _read_lines(data['file_name'])
+        # Entities referenced by the sentences
+        refs = set(re.findall(r'{(\w+)}', ' '.join(lines).lower()))
+        self.intents[data['name']] = ('padatious', (lines, refs))
+        self._changed([data['name']])
+
+    def register_padatious_entity(self, data):
+        """ Handle a padatious:register_entity message. """
+        self.entities[data['name']] = _read_lines(data['file_name'])
+        skill_id, entity = data['name'].split(':', 1)
+        self._changed([name for name, (kind, d) in self.intents.items()
+                       if kind == 'padatious' and entity in d[1] and
+                       name.startswith(skill_id + ':')])
+
+    def detach_intent(self, data):
+        """ Handle a detach_intent message. """
+        if self.intents.pop(data.get('intent_name'), None):
+            self.rules.pop(data.get('intent_name'), None)
+            self.version += 1
+
+    def detach_skill(self, data):
+        """ Forget the intents and entities of an unloaded skill. """
+        skill_id = data.get('skill_id')
+        for name in [n for n in self.intents if n.startswith(skill_id)]:
+            self.detach_intent({'intent_name': name})
+        for name in [n for n in self.entities if n.startswith(skill_id)]:
+            del self.entities[name]
+
+    def _alternatives(self, phrases):
+        known = [p for p in sorted(phrases)
+                 if all(self.is_known(w) for w in p.split())]
+        return ' | '.join(known)
+
+    def _adapt_rules(self, name, types):
+        rule = _rule_name('adapt', name)
+        words = set()
+        for entity_type in types:
+            words.update(self.vocab.get(entity_type, []))
+        expansion = self._alternatives(words)
+        if not expansion:
+            return None
+        return '<%s> = ( %s )+;\n' % (rule, expansion)
+
+    def _padatious_rules(self, name, lines, refs):
+        rule = _rule_name('padatious', name)
+        skill_id = name.split(':', 1)[0]
+        text = ''
+        entity_rules = {}
+        for entity in refs:
+            values = [' '.join(_words(l)) for l in
+                      self.entities.get(skill_id + ':' + entity, [])]
+            expansion = self._alternatives(set(v for v in values if v))
+            if expansion:
+                entity_rules[entity] = _rule_name(rule, entity)
+                text += '<%s> = %s;\n' % (entity_rules[entity], expansion)
+        sentences = []
+        for line in lines:
+            sentence = self._convert_sentence(line, entity_rules)
+            if sentence:
+                sentences.append(sentence)
+        if not sentences:
+            return None
+        return text + '<%s> = %s;\n' % (rule, ' | '.join(sentences))
+
+    def _convert_sentence(self, line, entity_rules):
+        """Convert a Padatious sentence to a JSGF expansion.
+
+        "(a | b)" alternatives are kept, an empty alternative makes the group
+        optional and {entity} references the entity rule.
+
+        Returns:
+            str: the expansion, None if the sentence has unknown words or
+                 entities
+        """
+        tokens = re.findall(r"[()|]|{\w+}|[\w']+", line.lower())
+
+        def parse(pos):
+            # Returns the alternatives of the group starting at pos
+            alternatives = [[]]
+            while pos < len(tokens):
+                token = tokens[pos]
+                if token == ')':
+                    break
+                if token == '|':
+                    alternatives.append([])
+                elif token == '(':
+                    group, pos = parse(pos + 1)
+                    alternatives[-1].append(group)
+                elif token.startswith('{'):
+                    entity = entity_rules.get(token[1:-1])
+                    alternatives[-1].append('<%s>' % entity if entity
+                                            else None)
+                else:
+                    alternatives[-1].append(token if self.is_known(token)
+                                            else None)
+                pos += 1
+            return self._join_group(alternatives), pos
+
+        return parse(0)[0]
+
+    @staticmethod
+    def _join_group(alternatives):
+        optional = False
+        valid = []
+        for alternative in alternatives:
+            if not alternative:
+                optional = True
+            elif None not in alternative:
+                valid.append(' '.join(alternative))
+        if not valid:
+            return None
+        if optional:
+            return '[ %s ]' % ' | '.join(valid)
+        return '( %s )' % ' | '.join(valid)
+
+    def build(self):
+        """Get the grammar, regenerating the outdated rules.
+
+        Returns:
+            str: JSGF grammar, None if no command can be expressed
+        """
+        names = []
+        text = ''
+        for name in sorted(self.intents):
+            if self.rules.get(name) is None:
+                kind, data = self.intents[name]
+                if kind == 'adapt':
+                    self.rules[name] = self._adapt_rules(name, data) or ''
+                else:
+                    self.rules[name] = self._padatious_rules(
+                        name, *data) or ''
+            if self.rules[name]:
+                text += self.rules[name]
+                names.append(_rule_name(self.intents[name][0], name))
+        self.built_version = self.version
+        if not names:
+            return None
+        return ('#JSGF V1.0;\n\ngrammar commands;\n\n' + text +
+                'public <command> = %s;\n' %
+                ' | '.join('<%s>' % n for n in names))
+
+    def save(self, path):
+        """Write the grammar to path, replacing it atomically.
+
+        Returns:
+            bool: False if there was no grammar to write
+        """
+        jsgf = self.build()
+        if not jsgf:
+            return False
+        with open(path + '.tmp', 'w') as f:
+            f.write(jsgf)
+        os.rename(path + '.tmp', path)
+        return True
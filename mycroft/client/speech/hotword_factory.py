@@ -26,7 +26,8 @@ RECOGNIZER_DIR = join(abspath(dirname(__file__)), "recognizer")
 
 
 class HotWordEngine(object):
-    def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us"):
+    def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us",
+                 listener_config=None):
         self.lang = str(lang).lower()
         self.key_phrase = str(key_phrase).lower()
         # rough estimate 1 phoneme per 2 chars
@@ -35,23 +36,59 @@ class HotWordEngine(object):
             config = Configuration.get().get("hot_words", {})
             config = config.get(self.key_phrase, {})
         self.config = config
-        self.listener_config = Configuration.get().get("listener", {})
+        if listener_config is None:
+            listener_config = Configuration.get().get("listener", {})
+        self.listener_config = listener_config
+        # Set by engines able to detect the wake word incrementally through
+        # update(), otherwise found_wake_word() is called on audio windows
+        self.streaming = False
+        # Phrase detected by the last successful found_wake_word() or
+        # update(), for engines listening for more than key_phrase
+        self.found_phrase = None
+        # Seconds between the end of that phrase and the end of the audio
+        # decoded, None for engines not telling where the phrase ended
+        self.found_end = None
 
     def found_wake_word(self, frame_data):
         return False
 
+    def update(self, chunk):
+        """Feed the next chunk of audio to a streaming engine.
+
+        Every chunk of audio is passed once, in order, and the engine keeps
+        its decoder state between calls.
+
+        Args:
+            chunk (str): raw audio following the previous chunk
+
+        Returns:
+            bool: True if the wake word was detected
+        """
+        return False
+
+    def reset(self):
+        """ Discard any audio a streaming engine has been fed. """
+        pass
+
 
 class PocketsphinxHotWord(HotWordEngine):
-    def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us"):
-        super(PocketsphinxHotWord, self).__init__(key_phrase, config, lang)
+    # Name of the engine in the "module" setting of the hot word
+    module = "pocketsphinx"
+    # Frames per second of the decoder
+    FRAME_RATE = 100.0
+
+    def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us",
+                 listener_config=None):
+        super(PocketsphinxHotWord, self).__init__(key_phrase, config, lang,
+                                                  listener_config)
         # Hotword module imports
         from pocketsphinx import Decoder
         # Hotword module config
         module = self.config.get("module")
-        if module != "pocketsphinx":
+        if module != self.module:
             LOG.warning(
                 str(module) + " module does not match with "
-                              "Hotword class pocketsphinx")
+                              "Hotword class " + self.module)
         # Hotword module params
         self.phonemes = self.config.get("phonemes", "HH EY . M AY K R AO F T")
         self.num_phonemes = len(self.phonemes.split())
@@ -60,6 +97,9 @@ class PocketsphinxHotWord(HotWordEngine):
         dict_name = self.create_dict(self.key_phrase, self.phonemes)
         config = self.create_config(dict_name, Decoder.default_config())
         self.decoder = Decoder(config)
+        self.streaming = self.config.get("streaming", True)
+        self.in_utterance = False
+        self.utterance_bytes = 0  # Audio decoded in the current utterance
 
     def create_dict(self, key_phrase, phonemes):
         (fd, file_name) = tempfile.mkstemp()
@@ -85,21 +125,130 @@ class PocketsphinxHotWord(HotWordEngine):
 
     def transcribe(self, byte_data, metrics=None):
         start = time.time()
+        self.reset()
         self.decoder.start_utt()
         self.decoder.process_raw(byte_data, False, False)
         self.decoder.end_utt()
+        self.utterance_bytes = len(byte_data)
         if metrics:
             metrics.timer("mycroft.stt.local.time_s", time.time() - start)
         return self.decoder.hyp()
 
+    def find_phrase(self, hyp):
+        """Get the phrase detected in a hypothesis.
+
+        Returns:
+            str: the phrase, None if none was detected
+        """
+        if hyp and self.key_phrase in hyp.hypstr.lower():
+            return self.key_phrase
+        return None
+
+    def get_found_end(self):
+        """Get the seconds decoded after the end of the detected phrase.
+
+        Returns:
+            float: seconds, None if the decoder has no segment
+        """
+        ends = [seg.end_frame for seg in self.decoder.seg()]
+        if not ends:
+            return None
+        decoded = self.utterance_bytes / (2.0 * self.sample_rate)
+        return max(0.0, decoded - (max(ends) + 1) / self.FRAME_RATE)
+
     def found_wake_word(self, frame_data):
-        hyp = self.transcribe(frame_data)
-        return hyp and self.key_phrase in hyp.hypstr.lower()
+        self.found_phrase = self.find_phrase(self.transcribe(frame_data))
+        if self.found_phrase:
+            self.found_end = self.get_found_end()
+        return self.found_phrase is not None
+
+    def update(self, chunk):
+        if not self.in_utterance:
+            self.decoder.start_utt()
+            self.in_utterance = True
+            self.utterance_bytes = 0
+        self.decoder.process_raw(chunk, False, False)
+        self.utterance_bytes += len(chunk)
+        phrase = self.find_phrase(self.decoder.hyp())
+        if phrase:
+            self.found_phrase = phrase
+            self.found_end = self.get_found_end()
+            # Restart the search so the detection isn't reported again
+            self.reset()
+            return True
+        return False
+
+    def reset(self):
+        if self.in_utterance:
+            self.decoder.end_utt()
+            self.in_utterance = False
+
+
+class PocketsphinxMultiHotWord(PocketsphinxHotWord):
+    """Listen for several phrases with a single keyword list search.
+
+    The phrases and their settings are listed under "phrases" in the
+    configuration, e.g. {"wake up": {"phonemes": "W EY K . AH P",
+    "threshold": 1e-20}}.  key_phrase is always listened for, with the
+    engine's own phonemes and threshold.  All phrases are searched for in
+    the same decoder pass, found_phrase tells which one was detected.
+    """
+    module = "pocketsphinx_multi"
+
+    def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us",
+                 listener_config=None):
+        super(PocketsphinxMultiHotWord, self).__init__(key_phrase, config,
+                                                       lang, listener_config)
+        self.phrases = self.load_phrases()
+        self.num_phonemes = max(len(p["phonemes"].split())
+                                for p in self.phrases.values())
+        kws_name = self.create_kws(self.phrases)
+        self.decoder.set_kws('phrases', kws_name)
+        self.decoder.set_search('phrases')
+
+    def load_phrases(self):
+        phrases = dict((str(k).lower(), v)
+                       for k, v in self.config.get("phrases", {}).items())
+        phrases[self.key_phrase] = {
+            "phonemes": self.phonemes,
+            "threshold": self.threshold
+        }
+        return phrases
+
+    def create_dict(self, key_phrase, phonemes):
+        (fd, file_name) = tempfile.mkstemp()
+        words = {}
+        for phrase, settings in self.load_phrases().items():
+            phoneme_groups = settings["phonemes"].split('.')
+            for word, phoneme in zip(phrase.split(), phoneme_groups):
+                words.setdefault(word, phoneme)
+        with os.fdopen(fd, 'w') as f:
+            for word, phoneme in sorted(words.items()):
+                f.write(word + ' ' + phoneme + '\n')
+        return file_name
+
+    def create_kws(self, phrases):
+        (fd, file_name) = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            for phrase, settings in sorted(phrases.items()):
+                threshold = float(settings.get("threshold", 1e-90))
+                f.write('%s /%s/\n' % (phrase, threshold))
+        return file_name
+
+    def find_phrase(self, hyp):
+        if not hyp:
+            return None
+        hypstr = hyp.hypstr.lower()
+        # Most recent detection when several are in the hypothesis
+        position, phrase = max((hypstr.rfind(p), p) for p in self.phrases)
+        return phrase if position >= 0 else None
 
 
 class SnowboyHotWord(HotWordEngine):
-    def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us"):
-        super(SnowboyHotWord, self).__init__(key_phrase, config, lang)
+    def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us",
+                 listener_config=None):
+        super(SnowboyHotWord, self).__init__(key_phrase, config, lang,
+                                             listener_config)
         # Hotword module imports
         from snowboydecoder import HotwordDetector
         # Hotword module config
@@ -117,20 +266,32 @@ class SnowboyHotWord(HotWordEngine):
                                        sensitivity=[sensitivity] * len(paths))
         self.lang = str(lang).lower()
         self.key_phrase = str(key_phrase).lower()
+        self.streaming = self.config.get("streaming", True)
 
     def found_wake_word(self, frame_data):
         wake_word = self.snowboy.detector.RunDetection(frame_data)
-        return wake_word == 1
+        if wake_word == 1:
+            self.found_phrase = self.key_phrase
+            return True
+        return False
+
+    def update(self, chunk):
+        return self.found_wake_word(chunk)
+
+    def reset(self):
+        self.snowboy.detector.Reset()
 
 
 class HotWordFactory(object):
     CLASSES = {
         "pocketsphinx": PocketsphinxHotWord,
+        "pocketsphinx_multi": PocketsphinxMultiHotWord,
         "snowboy": SnowboyHotWord
     }
 
     @staticmethod
-    def create_hotword(hotword="hey mycroft", config=None, lang="en-us"):
+    def create_hotword(hotword="hey mycroft", config=None, lang="en-us",
+                       listener_config=None):
         LOG.info("creating " + hotword)
         if not config:
             config = Configuration.get().get("hotwords", {})
@@ -138,7 +299,8 @@ class HotWordFactory(object):
         config = config.get(hotword, {"module": module})
         clazz = HotWordFactory.CLASSES.get(module)
         try:
-            return clazz(hotword, config, lang=lang)
+            return clazz(hotword, config, lang=lang,
+                         listener_config=listener_config)
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
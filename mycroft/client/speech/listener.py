@@ -13,11 +13,12 @@
 # limitations under the License.
 #
 import time
+from copy import deepcopy
 from Queue import Queue, Empty
-from threading import Thread
+from tempfile import gettempdir
+from threading import Thread, Timer, Lock
 import pwd
 import os
-import multiprocessing
 
 import speech_recognition as sr
 from pyee import EventEmitter
@@ -30,11 +31,14 @@ from mycroft.client.speech.mic import MutableMicrophone, ResponsiveRecognizer
 from mycroft.configuration import Configuration
 from mycroft.metrics import MetricsAggregator
 from mycroft.session import SessionManager
-from mycroft.stt import STTFactory
+from mycroft.stt import STTFactory, StreamingSTT, CompositeSTT
 from mycroft.util.log import LOG
 from mycroft.client.speech.pocketsphinx_audio_consumer \
     import PocketsphinxAudioConsumer
-from mycroft.util import (check_for_signal)
+from mycroft.client.speech.transcriber_pool import TranscriberPool
+from mycroft.client.speech.capture import CaptureHub
+from mycroft.client.speech.grammar import VocabularyGrammar
+from mycroft.util import (check_for_signal, get_ipc_directory)
 
 
 class AudioProducer(Thread):
@@ -42,9 +46,20 @@ class AudioProducer(Thread):
     AudioProducer
     given a mic and a recognizer implementation, continuously listens to the
     mic for potential speech chunks and pushes them onto the queue.
+
+    The mic is read by a CaptureHub, the recognizer is one of its consumers.
+    Other consumers can attach to the hub announced with the
+    "recognizer_loop:capture_hub" event.
+
+    With several microphones each has its producer, the audio is tagged
+    with source_id, the name of the microphone.
+
+    report() is called periodically to publish the capture statistics,
+    and once more by the producer thread when it stops.
     """
 
-    def __init__(self, state, queue, mic, recognizer, emitter):
+    def __init__(self, state, queue, mic, recognizer, emitter,
+                 buffer_sec=10.0, source_id=None):
         super(AudioProducer, self).__init__()
         self.daemon = True
         self.state = state
@@ -52,22 +67,72 @@ class AudioProducer(Thread):
         self.mic = mic
         self.recognizer = recognizer
         self.emitter = emitter
+        self.buffer_sec = buffer_sec
+        self.source_id = source_id
+        self.hub = None
+        self.metrics = MetricsAggregator()
+        self._dropped = {}  # Consumer name -> chunks dropped at last report
+        self._report_lock = Lock()
+
+    def on_capture_error(self, ex):
+        # NOTE: Audio stack on raspi is slightly different, throws
+        # IOError every other listen, almost like it can't handle
+        # buffering audio between listen loops.
+        # The internet was not helpful.
+        # http://stackoverflow.com/questions/10733903/pyaudio-input-overflowed
+        self.emitter.emit("recognizer_loop:ioerror", ex)
 
     def run(self):
-        with self.mic as source:
-            self.recognizer.adjust_for_ambient_noise(source)
-            while self.state.running:
-                try:
-                    audio = self.recognizer.listen(source, self.emitter)
-                    if len(audio.frame_data) != 65538:  # 2 seconds (silence)
-                        self.queue.put(audio)
-                except IOError, ex:
-                    # NOTE: Audio stack on raspi is slightly different, throws
-                    # IOError every other listen, almost like it can't handle
-                    # buffering audio between listen loops.
-                    # The internet was not helpful.
-                    # http://stackoverflow.com/questions/10733903/pyaudio-input-overflowed
-                    self.emitter.emit("recognizer_loop:ioerror", ex)
+        with self.mic as mic_source:
+            self.hub = CaptureHub(mic_source, self.buffer_sec,
+                                  self.on_capture_error)
+            self.hub.start()
+            self.emitter.emit("recognizer_loop:capture_hub", self.hub)
+            try:
+                with self.hub.create_source('recognizer') as source:
+                    self.recognizer.adjust_for_ambient_noise(source)
+                    while self.state.running:
+                        audio = self.recognizer.listen(source, self.emitter)
+                        if audio and len(audio.frame_data) != 65538:
+                            # 65538: 2 seconds (silence)
+                            audio.source_id = self.source_id
+                            audio.end_time = time.time()
+                            self.queue.put(audio)
+            finally:
+                self.report()
+                self.hub.stop()
+                self.recognizer.close()
+
+    def report(self):
+        """
+            Log how far behind the capture every consumer is, then publish
+            it with the statistics of the microphone and the recognizer.
+        """
+        hub = self.hub
+        if not hub:
+            return
+        # Called by the loop and by the producer thread when it stops
+        with self._report_lock:
+            self.mic.report_metrics(self.metrics)
+            self.recognizer.report_metrics(self.metrics)
+            prefix = "mycroft.capture."
+            if self.source_id:
+                prefix += self.source_id + "."
+            sec_per_chunk = hub.sec_per_chunk
+            for name, stats in hub.stats().items():
+                dropped = stats['dropped'] - self._dropped.get(name, 0)
+                self._dropped[name] = stats['dropped']
+                log = LOG.warning if dropped else LOG.debug
+                log("Capture consumer %s: %.2fs behind, at most %.2fs, %d "
+                    "chunks dropped" % (prefix + name, stats['lag_sec'],
+                                        stats['max_lag'] * sec_per_chunk,
+                                        dropped))
+                self.metrics.level(prefix + name + ".lag_s",
+                                   stats['lag_sec'])
+                self.metrics.level(prefix + name + ".max_lag_s",
+                                   stats['max_lag'] * sec_per_chunk)
+                self.metrics.increment(prefix + name + ".dropped", dropped)
+            self.metrics.flush()
 
     def stop(self):
         """
@@ -77,6 +142,50 @@ class AudioProducer(Thread):
         self.recognizer.stop()
 
 
+class STTStream(Thread):
+    """
+    STTStream
+    Feeds a phrase to a StreamingSTT engine while it is being recorded
+    """
+
+    def __init__(self, stt, phrase_buffer):
+        super(STTStream, self).__init__()
+        self.daemon = True
+        self.stt = stt
+        self.phrase_buffer = phrase_buffer
+        self.error = None
+        self.stopped = False
+
+    def run(self):
+        try:
+            self.stt.stream_start()
+            for chunk in self.phrase_buffer.chunks():
+                self.stt.stream_data(chunk)
+        except Exception as e:
+            self.error = e
+
+    def stop(self):
+        """
+            Wait for the whole phrase to be sent and return the
+            transcription.
+        """
+        self.join()
+        self.stopped = True
+        if self.error:
+            raise self.error
+        return self.stt.stream_stop()
+
+    def close(self):
+        """
+            Stop the stream, discarding the transcription.
+        """
+        if not self.stopped:
+            try:
+                self.stop()
+            except Exception as e:
+                LOG.debug("Discarded STT stream failed: " + repr(e))
+
+
 class AudioConsumer(Thread):
     """
     AudioConsumer
@@ -86,11 +195,19 @@ class AudioConsumer(Thread):
     # In seconds, the minimum audio size to be sent to remote STT
     MIN_AUDIO_SIZE = 0.5
 
-    MAX_LOCAL_TRANSCRIBE_PROCESSES = 8
-    MIN_LOCAL_TRANSCRIBE_PROCESSES = 2
+    # Default number of processes transcribing with local STT
+    LOCAL_TRANSCRIBE_PROCESSES = 2
+
+    # Seconds between publications of the transcription statistics
+    REPORT_SEC = 60.0
+
+    # In seconds, utterances heard by different microphones ending closer
+    # than this are the same command, only the first one is processed
+    DUPLICATE_SEC = 1.0
 
     def __init__(self, state, queue, emitter, stt,
-                 wakeup_recognizer, wakeword_recognizer):
+                 wakeup_recognizer, wakeword_recognizer,
+                 max_audio_size=None):
         super(AudioConsumer, self).__init__()
         self.daemon = True
         self.queue = queue
@@ -100,31 +217,40 @@ class AudioConsumer(Thread):
         self.wakeup_recognizer = wakeup_recognizer
         self.wakeword_recognizer = wakeword_recognizer
         self.metrics = MetricsAggregator()
-        self.transcribe_jobs = []
+        self.stt_stream = None
+        self._stream_lock = Lock()
+        self._last_heard = (None, 0.0)  # Source and end of last utterance
+        self.transcriber_pool = None
+        if isinstance(self.stt, PocketsphinxAudioConsumer):
+            # Long-lived workers with their own decoder, no fork per
+            # utterance
+            kwargs = {'max_audio_size': max_audio_size} \
+                if max_audio_size else {}
+            self.transcriber_pool = TranscriberPool(
+                self.stt.create_stt_decoder,
+                self.stt.config.get('local_stt_processes',
+                                    self.LOCAL_TRANSCRIBE_PROCESSES),
+                **kwargs)
 
     def run(self):
+        next_report = time.time() + self.REPORT_SEC
         while self.state.running:
             self.read()
-            if isinstance(self.stt, PocketsphinxAudioConsumer):
-                if len(multiprocessing.active_children()) \
-                        > self.MAX_LOCAL_TRANSCRIBE_PROCESSES:
-                    for j in self.transcribe_jobs:
-                        LOG.debug("waiting for process to end, j.ident  = " +
-                                  str(j.ident))
-                        j.join()
-                        self.transcribe_jobs.remove(j)
-                        LOG.debug("Process ended, j.ident = " + str(j.ident))
-                        if len(multiprocessing.active_children()) \
-                                <= self.MIN_LOCAL_TRANSCRIBE_PROCESSES:
-                            break
-                    LOG.debug("after joining, " +
-                              "multiprocessing.active_children() = " +
-                              str(len(multiprocessing.active_children())))
-                    LOG.debug("len(transcribe_jobs) = " +
-                              str(len(self.transcribe_jobs)))
-                for j in self.transcribe_jobs:
-                    if not j.is_alive():
-                        self.transcribe_jobs.remove(j)
+            if time.time() >= next_report:
+                next_report = time.time() + self.REPORT_SEC
+                self.report()
+        self.report()
+        if self.transcriber_pool:
+            self.transcriber_pool.shutdown()
+
+    def report(self):
+        """
+            Publish the transcription statistics gathered since the last
+            report, must be called by the consumer thread.
+        """
+        if isinstance(self.stt, CompositeSTT):
+            self.stt.report(self.metrics)
+        self.metrics.flush()
 
     def read(self):
         try:
@@ -137,28 +263,100 @@ class AudioConsumer(Thread):
 
         if self.state.sleeping:
             self.wake_up(audio)
+        elif self.is_duplicate(audio):
+            LOG.info("Dropped the utterance also heard by " +
+                     str(self._last_heard[0]) + " from " +
+                     str(audio.source_id))
+            if self.get_stream(audio):
+                self.close_stream()
         else:
-            if isinstance(self.stt, PocketsphinxAudioConsumer):
+            try:
+                self.process(audio)
+            finally:
+                self.close_stream()
 
-                process = multiprocessing.Process(target=self.process,
-                                                  args=([audio]))
+    def is_duplicate(self, audio):
+        """
+            Tell if audio is the command just heard by another microphone,
+            every microphone hearing a command queues its own utterance.
+        """
+        source = getattr(audio, 'source_id', None)
+        end_time = getattr(audio, 'end_time', None)
+        if source is None or end_time is None:
+            return False
+        last_source, last_end_time = self._last_heard
+        if last_source not in (None, source) and \
+                abs(end_time - last_end_time) < self.DUPLICATE_SEC:
+            return True
+        self._last_heard = (source, end_time)
+        return False
+
+    def stream(self, phrase_buffer):
+        """
+            Start streaming a phrase to the STT engine while it is being
+            recorded.  Called from the producer threads.
+        """
+        with self._stream_lock:
+            # The engine handles one stream at a time, if the previous
+            # phrase hasn't been processed yet this one will be sent once
+            # recorded.
+            if self.state.sleeping or self.stt_stream:
+                return
+            self.stt_stream = STTStream(self.stt, phrase_buffer)
+            self.stt_stream.start()
+
+    def close_stream(self):
+        """
+            Finish any pending STT stream so a new one can be started.
+        """
+        with self._stream_lock:
+            stt_stream = self.stt_stream
+        if stt_stream:
+            # Waits for the phrase to be recorded, without blocking the
+            # producers, no new stream starts until this one is closed
+            stt_stream.close()
+            with self._stream_lock:
+                self.stt_stream = None
+
+    def get_stream(self, audio):
+        """
+            Get the STT stream started while audio was recorded, if any.
+        """
+        with self._stream_lock:
+            stt_stream = self.stt_stream
+        if stt_stream and stt_stream.phrase_buffer.id == getattr(
+                audio, 'phrase_id', None):
+            return stt_stream
+        return None
 
-                process.start()
+    def wake_up(self, audio):
+        if self.wakeup_recognizer.found_wake_word(audio.frame_data):
+            self._wake_up()
 
-                self.transcribe_jobs.append(process)
+    def set_grammar(self, path, generation):
+        """
+            Transcribe locally with a JSGF grammar of the commands
+        """
+        self.stt.set_grammar(path, generation)
+        if self.transcriber_pool:
+            self.transcriber_pool.set_grammar(path, generation)
 
-                LOG.debug("listener.py, read str(self.transcribe_jobs) = " +
-                          str(self.transcribe_jobs))
-            else:
-                self.process(audio)
+    def handle_hotword(self, event):
+        """
+            Wake up if the stand up word ended the wait for the wake word,
+            which happens with engines listening for several phrases.  The
+            phrase recorded afterwards is then processed as a command.
+        """
+        if self.state.sleeping and \
+                event.get('hotword') == self.wakeup_recognizer.key_phrase:
+            self._wake_up()
 
     # TODO: Localization
-    def wake_up(self, audio):
-        if self.wakeup_recognizer.found_wake_word(audio.frame_data):
-            SessionManager.touch()
-            self.state.sleeping = False
-            self.__speak(mycroft.dialog.get("i am awake", self.stt.lang))
-            self.metrics.increment("mycroft.wakeup")
+    def _wake_up(self):
+        SessionManager.touch()
+        self.state.sleeping = False
+        self.__speak(mycroft.dialog.get("i am awake", self.stt.lang))
+        self.metrics.increment("mycroft.wakeup")
 
     @staticmethod
     def _audio_length(audio):
@@ -179,32 +377,49 @@ class AudioConsumer(Thread):
         else:
             if len(audio.frame_data) != 65538:  # 2 seconds (silence)
                 # if len(audio.frame_data) != 96258:  # 3 seconds silence
-                if isinstance(self.stt, PocketsphinxAudioConsumer):
-                    # LOG.debug("test phrase decode/transcribe")
-                    hyp = self.stt.transcribe(audio.frame_data)
-                    # hyp = self.stt.wake_word_recognizer.transcribe(
-                    # audio.frame_data)
-                    if hyp:
-                        if hyp.hypstr > '':
-                            payload = {
-                                'utterances': [hyp.hypstr.lower()],
-                                'lang': self.stt.lang,
-                                'session': SessionManager.get().session_id
-                            }
-                            self.emitter.emit("recognizer_loop:utterance",
-                                              payload)
-                            self.metrics.attr('utterances',
-                                              [hyp.hypstr.lower()])
-
+                if self.transcriber_pool:
+                    source_id = getattr(audio, 'source_id', None)
+                    self.transcriber_pool.submit(
+                        audio.frame_data,
+                        lambda hypstr, decode_time:
+                        self.handle_local_transcription(
+                            hypstr, decode_time, source_id))
                 else:
-                    self.transcribe(audio)
+                    self.transcribe(audio, self.get_stream(audio))
+
+    def handle_local_transcription(self, hypstr, decode_time,
+                                   source_id=None):
+        """
+            Called from the transcriber pool with the result of a local
+            transcription of the audio of the source_id microphone.
+        """
+        self.metrics.timer("mycroft.stt.local.time_s", decode_time)
+        LOG.debug("Local transcription took " + str(decode_time) + "s")
+        if hypstr:
+            payload = {
+                'utterances': [hypstr.lower()],
+                'lang': self.stt.lang,
+                'session': SessionManager.get().session_id
+            }
+            if source_id:
+                payload['source'] = source_id
+            self.emitter.emit("recognizer_loop:utterance", payload)
+            self.metrics.attr('utterances', [hypstr.lower()])
 
-    def transcribe(self, audio):
+    def transcribe(self, audio, stt_stream=None):
         text = None
         try:
-            # Invoke the STT engine on the audio clip
-            text = self.stt.execute(audio).lower().strip()
-            LOG.debug("STT: " + text)
+            # Invoke the STT engine on the audio clip, or collect the result
+            # of the audio streamed while it was recorded
+            if stt_stream:
+                text = stt_stream.stop()
+            else:
+                text = self.stt.execute(audio)
+            if text:
+                text = text.lower().strip()
+                LOG.debug("STT: " + text)
+            else:
+                LOG.debug("STT: no transcription")
         except sr.RequestError as e:
             LOG.error("Could not request Speech Recognition {0}".format(e))
         except ConnectionError as e:
@@ -224,6 +439,8 @@ class AudioConsumer(Thread):
                 'lang': self.stt.lang,
                 'session': SessionManager.get().session_id
             }
+            if getattr(audio, 'source_id', None):
+                payload['source'] = audio.source_id
             self.emitter.emit("recognizer_loop:utterance", payload)
             self.metrics.attr('utterances', [text])
 
@@ -235,6 +452,23 @@ class AudioConsumer(Thread):
         self.emitter.emit("speak", payload)
 
 
+def _get_config_key(config, path):
+    """Get a value of the configuration by its dotted path.
+
+    Args:
+        config (dict): the configuration
+        path (str): keys separated by dots, e.g. "listener.wake_word"
+
+    Returns:
+        the value, None if any key is missing
+    """
+    for key in path.split('.'):
+        if not isinstance(config, dict):
+            return None
+        config = config.get(key)
+    return config
+
+
 class RecognizerLoopState(object):
     def __init__(self):
         self.running = False
@@ -247,9 +481,38 @@ class RecognizerLoop(EventEmitter):
         recognizer and remote general speech recognition.
     """
 
+    # Seconds without vocabulary changes before the grammar is rebuilt,
+    # skills register many words when they load
+    GRAMMAR_DELAY = 2.0
+
+    # Seconds between reports of the capture statistics
+    REPORT_SEC = 60.0
+
     def __init__(self):
         super(RecognizerLoop, self).__init__()
         self.mute_calls = 0
+        # Commands of the loaded skills, for the local STT
+        self.grammar = VocabularyGrammar()
+        self.grammar_path = os.path.join(gettempdir(),
+                                         'mycroft_commands.jsgf')
+        self._grammar_lock = Lock()
+        self._grammar_timer = None
+        # The grammar only replaces the language model once it has all the
+        # vocabulary of the loaded skills, see set_vocabulary
+        self.grammar_complete = False
+        # Configuration key -> method applying a change of its value.
+        # A key's value doesn't include the subkeys having their own entry.
+        self.config_subscriptions = {
+            'lang': self.reload,
+            'opt_in': self.reload,
+            'listener': self.reload,
+            'listener.wake_word': self.reload_wake_word,
+            'listener.phonemes': self.reload_wake_word,
+            'listener.threshold': self.reload_wake_word,
+            'listener.stand_up_word': self.reload_wakeup,
+            'hotwords': self.reload_hotwords,
+            'stt': self.reload_stt
+        }
         self._load_config()
 
     def _load_config(self):
@@ -258,38 +521,126 @@ class RecognizerLoop(EventEmitter):
         """
         config = Configuration.get()
         self.config_core = config
-        self._config_hash = hash(str(config))
         self.lang = config.get('lang')
         self.config = config.get('listener')
-        rate = self.config.get('sample_rate')
-        device_index = self.config.get('device_index')
         self.enclosure_config = config.get('enclosure')
 
-        self.microphone = MutableMicrophone(device_index, rate,
-                                            mute=self.mute_calls > 0)
-        # FIXME - channels are not been used
-        self.microphone.CHANNELS = self.config.get('channels')
-
+        self.device_configs = self._get_device_configs()
         if check_for_signal('UseLocalSTT', -1):
             self.wakeword_recognizer = PocketsphinxAudioConsumer(
-                self.config, self.lang, self)
+                self.device_configs[0], self.lang, self)
         else:
-            self.wakeword_recognizer = self.create_wake_word_recognizer()
+            self.wakeword_recognizer = self.create_wake_word_recognizer(
+                self.device_configs[0])
 
-        self.wakeup_recognizer = self.create_wakeup_recognizer()
         # TODO - localization
         self.wakeup_recognizer = self.create_wakeup_recognizer()
-        self.responsive_recognizer = ResponsiveRecognizer(
-            self.wakeword_recognizer)
+        self._load_devices()
         self.state = RecognizerLoopState()
+        self._snapshot_config()
+
+    def _get_device_configs(self):
+        """
+            Get the listener configuration of every capture device.
+            Settings of the listener.devices entries override the listener
+            ones, without entries the listener device_index is used.
+        """
+        devices = self.config.get('devices') or [{}]
+        return [dict(self.config, **device) for device in devices]
+
+    def _load_devices(self):
+        """
+            Create a microphone and a recognizer for every capture device,
+            the first one uses the loop's wake word engine.  With the local
+            STT the other devices get a wake word engine of their own, the
+            local STT decoder and transcriber pool stay shared.
+        """
+        self.microphones = []
+        self.responsive_recognizers = []
+        self.source_ids = []
+        for i, config in enumerate(self.device_configs):
+            microphone = MutableMicrophone(
+                config.get('device_index'), config.get('sample_rate'),
+                mute=self.mute_calls > 0,
+                callback_capture=config.get('callback_capture', True))
+            # FIXME - channels are not been used
+            microphone.CHANNELS = config.get('channels')
+            core_config = dict(self.config_core, listener=config)
+            if i == 0:
+                recognizer = ResponsiveRecognizer(self.wakeword_recognizer,
+                                                  config=core_config)
+            else:
+                # Each microphone has its own wake word decoder state and
+                # energy levels, recordings are saved together
+                name = config.get('name', str(i))
+                recognizer = ResponsiveRecognizer(
+                    self.create_wake_word_recognizer(config),
+                    primary=self.responsive_recognizers[0],
+                    meter_path=os.path.join(get_ipc_directory(),
+                                            'mic_level.' + name + '.mmap'),
+                    config=core_config)
+            self.microphones.append(microphone)
+            self.responsive_recognizers.append(recognizer)
+            self.source_ids.append(config.get('name', str(i))
+                                   if len(self.device_configs) > 1 else None)
+        # The first microphone, the one used with a single device
+        self.microphone = self.microphones[0]
+        self.responsive_recognizer = self.responsive_recognizers[0]
+
+    def _snapshot_config(self):
+        """ Remember the configuration in use, to find what changes. """
+        # Taken after the engines are created, they can fill in the
+        # hotwords configuration.  The loaded configuration is updated in
+        # place on reload so it has to be copied.
+        config = Configuration.get()
+        self._config_hash = hash(str(config))
+        self._config = deepcopy(config)
+
+    def _get_subscribed_value(self, config, path):
+        value = _get_config_key(config, path)
+        if isinstance(value, dict):
+            prefix = path + '.'
+            value = dict((k, v) for k, v in value.items()
+                         if prefix + k not in self.config_subscriptions)
+        return value
 
-    def create_wake_word_recognizer(self):
-        # Create a local recognizer to hear the wakeup word, e.g. 'Hey Mycroft'
+    def _check_config(self):
+        """Apply configuration changes.
+
+        Only the components depending on the changed keys are replaced,
+        other changes of the speech configuration restart the whole loop.
+        """
+        config = Configuration.get()
+        if hash(str(config)) == self._config_hash:
+            return
+        handlers = []
+        for path, handler in self.config_subscriptions.items():
+            if self._get_subscribed_value(self._config, path) != \
+                    self._get_subscribed_value(config, path):
+                LOG.debug('Config key ' + path + ' has changed')
+                if handler not in handlers:
+                    handlers.append(handler)
+        if self.reload in handlers:
+            LOG.debug('Config has changed, reloading...')
+            self.reload()
+            return
+        # Sections are replaced, not updated, on reload
+        self.config = config.get('listener')
+        for handler in handlers:
+            handler()
+        self._snapshot_config()
+
+    def create_wake_word_recognizer(self, listener_config=None):
+        """
+            Create a local recognizer to hear the wakeup word, e.g.
+            'Hey Mycroft', with the listener configuration of a device
+        """
         LOG.info("creating wake word engine")
-        word = self.config.get("wake_word", "hey mycroft")
+        listener_config = listener_config or self.config
+        word = listener_config.get("wake_word", "hey mycroft")
         # TODO remove this, only for server settings compatibility
-        phonemes = self.config.get("phonemes")
-        thresh = self.config.get("threshold")
+        phonemes = listener_config.get("phonemes")
+        thresh = listener_config.get("threshold")
         config = self.config_core.get("hotwords", {word: {}})
         if word not in config:
             config[word] = {}
@@ -299,39 +650,159 @@ class RecognizerLoop(EventEmitter):
             config[word]["threshold"] = thresh
         if phonemes is None or thresh is None:
             config = None
-        return HotWordFactory.create_hotword(word, config, self.lang)
+        return HotWordFactory.create_hotword(word, config, self.lang,
+                                             listener_config)
 
     def create_wakeup_recognizer(self):
         LOG.info("creating stand up word engine")
         word = self.config.get("stand_up_word", "wake up")
         return HotWordFactory.create_hotword(word, lang=self.lang)
 
+    def reload_wake_word(self):
+        """
+            Replace the wake word engine, the microphone keeps running
+        """
+        if check_for_signal('UseLocalSTT', -1):
+            # The local STT is also the wake word engine
+            self.reload()
+            return
+        # Loaded here, the capture only waits for the swap
+        self.wakeword_recognizer = self.create_wake_word_recognizer(
+            self.device_configs[0])
+        self.consumer.wakeword_recognizer = self.wakeword_recognizer
+        self.responsive_recognizer.set_wake_word_recognizer(
+            self.wakeword_recognizer)
+        for recognizer, config in zip(self.responsive_recognizers[1:],
+                                      self.device_configs[1:]):
+            recognizer.set_wake_word_recognizer(
+                self.create_wake_word_recognizer(config))
+
+    def reload_wakeup(self):
+        """
+            Replace the stand up word engine
+        """
+        self.wakeup_recognizer = self.create_wakeup_recognizer()
+        self.consumer.wakeup_recognizer = self.wakeup_recognizer
+
+    def reload_hotwords(self):
+        self.reload_wake_word()
+        self.reload_wakeup()
+
+    def reload_stt(self):
+        """
+            Replace the speech to text engine, utterances already being
+            transcribed finish with the previous one
+        """
+        if check_for_signal('UseLocalSTT', -1):
+            return  # Not configured by the stt section
+        stt = STTFactory.create()
+        self.remove_all_listeners('recognizer_loop:record_stream')
+        self.consumer.stt = stt
+        if isinstance(stt, StreamingSTT):
+            self.on('recognizer_loop:record_stream', self.consumer.stream)
+
     def start_async(self):
         """
             Start consumer and producer threads
         """
         self.state.running = True
         queue = Queue()
-        self.producer = AudioProducer(self.state, queue, self.microphone,
-                                      self.responsive_recognizer, self)
-        self.producer.start()
+        # The producers of all microphones feed the same consumer
+        self.producers = []
+        for mic, recognizer, source_id in zip(self.microphones,
+                                              self.responsive_recognizers,
+                                              self.source_ids):
+            producer = AudioProducer(self.state, queue, mic, recognizer,
+                                     self, self.config.get(
+                                         'capture_buffer_sec', 10.0),
+                                     source_id)
+            producer.start()
+            self.producers.append(producer)
+        self.producer = self.producers[0]
         if check_for_signal('UseLocalSTT', -1):
+            # Room for the longest phrase any microphone records
+            max_audio_size = max(
+                recognizer.max_phrase_size(mic) for mic, recognizer in
+                zip(self.microphones, self.responsive_recognizers))
             self.consumer = AudioConsumer(self.state, queue, self,
                                           self.wakeword_recognizer,
                                           self.wakeup_recognizer,
-                                          self.wakeword_recognizer)
+                                          self.wakeword_recognizer,
+                                          max_audio_size)
         else:
             self.consumer = AudioConsumer(self.state, queue, self,
                                           STTFactory.create(),
                                           self.wakeup_recognizer,
                                           self.wakeword_recognizer)
+        if isinstance(self.consumer.stt, StreamingSTT):
+            self.on('recognizer_loop:record_stream', self.consumer.stream)
+        self.on('recognizer_loop:hotword', self.consumer.handle_hotword)
         self.consumer.start()
+        if self.grammar.version:
+            self.apply_grammar()
+
+    def update_grammar(self, msg_type, data):
+        """
+            Update the grammar of the commands with a message registering
+            or removing vocabulary, it is applied once skills are done
+            registering.
+        """
+        with self._grammar_lock:
+            self.grammar.handle(msg_type, data)
+            self._schedule_grammar()
+
+    def set_vocabulary(self, registrations):
+        """
+            Rebuild the grammar from all the registrations of the loaded
+            skills, the vocabulary they registered before this process
+            started listening to them included.
+
+            Args:
+                registrations (list): [message type, data] pairs
+        """
+        with self._grammar_lock:
+            self.grammar.clear()
+            for msg_type, data in registrations:
+                if msg_type in VocabularyGrammar.MESSAGES:
+                    self.grammar.handle(msg_type, data)
+            self.grammar_complete = True
+            self._schedule_grammar()
+
+    def _schedule_grammar(self):
+        # Called with the grammar lock held
+        if self._grammar_timer:
+            self._grammar_timer.cancel()
+        self._grammar_timer = Timer(self.GRAMMAR_DELAY, self.apply_grammar)
+        self._grammar_timer.daemon = True
+        self._grammar_timer.start()
+
+    def apply_grammar(self):
+        """
+            Make the local STT decode with the current grammar, the
+            language model is kept until the vocabulary is complete
+        """
+        if not self.grammar_complete or \
+                not check_for_signal('UseLocalSTT', -1) or \
+                not self.config.get('local_stt_grammar', True):
+            return
+        with self._grammar_lock:
+            self.grammar.set_word_filter(self.wakeword_recognizer.is_known)
+            if not self.grammar.save(self.grammar_path):
+                return
+            generation = self.grammar.version
+        LOG.info("Decoding with the grammar of the skills' commands")
+        self.consumer.set_grammar(self.grammar_path, generation)
 
     def stop(self):
         self.state.running = False
-        self.producer.stop()
+        self.remove_all_listeners('recognizer_loop:record_stream')
+        self.remove_listener('recognizer_loop:hotword',
+                             self.consumer.handle_hotword)
+        for producer in self.producers:
+            producer.stop()
         # wait for threads to shutdown
-        self.producer.join()
+        for producer in self.producers:
+            producer.join()
         self.consumer.join()
 
     def mute(self):
@@ -339,8 +810,8 @@ class RecognizerLoop(EventEmitter):
             Mute microphone and increase number of requests to mute
         """
         self.mute_calls += 1
-        if self.microphone:
-            self.microphone.mute()
+        for microphone in self.microphones:
+            microphone.mute()
 
     def unmute(self):
         """
@@ -350,8 +821,9 @@ class RecognizerLoop(EventEmitter):
         if self.mute_calls > 0:
             self.mute_calls -= 1
 
-        if self.mute_calls <= 0 and self.microphone:
-            self.microphone.unmute()
+        if self.mute_calls <= 0:
+            for microphone in self.microphones:
+                microphone.unmute()
             self.mute_calls = 0
 
     def force_unmute(self):
@@ -373,15 +845,23 @@ class RecognizerLoop(EventEmitter):
     def awaken(self):
         self.state.sleeping = False
 
+    def report(self):
+        """
+            Publish the capture statistics of every microphone
+        """
+        for producer in self.producers:
+            producer.report()
+
     def run(self):
         self.start_async()
+        next_report = time.time() + self.REPORT_SEC
         while self.state.running:
             try:
                 time.sleep(1)
-                if self._config_hash != hash(
-                        str(Configuration().get())):
-                    LOG.debug('Config has changed, reloading...')
-                    self.reload()
+                self._check_config()
+                if time.time() >= next_report:
+                    next_report = time.time() + self.REPORT_SEC
+                    self.report()
             except KeyboardInterrupt as e:
                 LOG.error(e)
                 self.stop()
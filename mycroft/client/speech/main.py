@@ -13,15 +13,18 @@
 # limitations under the License.
 #
 import sys
-from threading import Thread, Lock
+from threading import Thread, Lock, Timer
 
 from mycroft.client.enclosure.api import EnclosureAPI
+from mycroft.client.speech.grammar import VocabularyGrammar
 from mycroft.client.speech.listener import RecognizerLoop
 from mycroft.configuration import Configuration
 from mycroft.identity import IdentityManager
 from mycroft.lock import Lock as PIDLock  # Create/Support PID locking file
 from mycroft.messagebus.client.ws import WebsocketClient
 from mycroft.messagebus.message import Message
+from mycroft.skills.vocabulary import VOCABULARY_REQUEST, \
+    VOCABULARY_RESPONSE
 from mycroft.util.log import LOG
 from mycroft.util import check_for_signal
 
@@ -31,6 +34,9 @@ loop = None
 
 config = Configuration.get()
 
+# Seconds between requests of the skills' vocabulary until it is received
+VOCABULARY_RETRY_SEC = 10.0
+
 
 def handle_record_begin():
     LOG.info("Begin Recording...")
@@ -54,7 +60,13 @@ def handle_wakeword(event):
 
 def handle_utterance(event):
     LOG.info("Utterance: " + str(event['utterances']))
-    ws.emit(Message('recognizer_loop:utterance', event))
+    # With several microphones, the one which heard the utterance.  The
+    # event is shared with the other handlers, it is left untouched.
+    context = None
+    if 'source' in event:
+        context = {'source': event['source']}
+        event = dict((k, v) for k, v in event.items() if k != 'source')
+    ws.emit(Message('recognizer_loop:utterance', event, context))
 
 
 def handle_speak(event):
@@ -121,10 +133,30 @@ def handle_restart(event):
     loop.restart()
 
 
+def handle_vocabulary(message):
+    loop.update_grammar(message.type, message.data)
+
+
+def handle_vocabulary_response(message):
+    loop.set_vocabulary(message.data.get('registrations', []))
+
+
+def request_vocabulary(retry=False):
+    """ Ask the skills for their vocabulary, again until they answer. """
+    if retry and loop.grammar_complete:
+        return
+    ws.emit(Message(VOCABULARY_REQUEST))
+    timer = Timer(VOCABULARY_RETRY_SEC, request_vocabulary, (True,))
+    timer.daemon = True
+    timer.start()
+
+
 def handle_open():
     # TODO: Move this into the Enclosure (not speech client)
     # Reset the UI to indicate ready for speech processing
     EnclosureAPI(ws).reset()
+    # Skills may have registered their vocabulary while not connected
+    request_vocabulary()
 
 
 def connect():
@@ -158,6 +190,9 @@ def main():
     ws.on('recognizer_loop:audio_output_end', handle_audio_end)
     ws.on('mycroft.stop', handle_stop)
     ws.on('recognizer_loop:restart', handle_restart)
+    for msg_type in VocabularyGrammar.MESSAGES:
+        ws.on(msg_type, handle_vocabulary)
+    ws.on(VOCABULARY_RESPONSE, handle_vocabulary_response)
     event_thread = Thread(target=connect)
     event_thread.setDaemon(True)
     event_thread.start()
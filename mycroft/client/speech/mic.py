@@ -15,22 +15,26 @@
 import audioop
 import collections
 import datetime
-import shutil
 from tempfile import gettempdir
-from threading import Thread, Lock
+from threading import Condition, Event
 from time import sleep, time as get_time
 
 import os
 import pyaudio
 import speech_recognition
-from os import mkdir
-from os.path import isdir, join, expanduser, isfile
+from os.path import join
 from speech_recognition import (
     Microphone,
     AudioSource,
     AudioData
 )
 
+from mycroft.client.speech.archive import AudioArchiver, ScpUploader
+from mycroft.client.speech.audio_buffer import (
+    CyclicAudioBuffer,
+    PhraseAudioBuffer
+)
+from mycroft.client.speech.vad import VADFactory, NoiseFloorEstimator
 from mycroft.configuration import Configuration
 from mycroft.session import SessionManager
 from mycroft.util import (
@@ -41,41 +45,192 @@ from mycroft.util import (
     play_wav
 )
 from mycroft.util.log import LOG
+from mycroft.util.meter import MicMeter
+
+
+class CallbackStream(object):
+    """PyAudio input stream opened in callback mode.
+
+    PortAudio hands every captured buffer to _callback() from its own thread,
+    which copies it into a preallocated ring.  read() blocks on a condition
+    until enough audio is there instead of polling the device.
+
+    Only the callback advances the write counter and only the reader
+    advances the read counter, so the ring itself needs no lock.  The
+    condition is only held to wake the reader.  When the ring is full new
+    audio is dropped and counted as an overflow.
+
+    Args:
+        audio (PyAudio): PyAudio instance opening the stream
+        rate (int): sample rate
+        format (int): PyAudio sample format
+        frames_per_buffer (int): frames per callback
+        buffer_sec (float): seconds of audio the ring holds
+        **kwargs: other arguments of PyAudio.open()
+    """
+
+    def __init__(self, audio, rate, format, frames_per_buffer,
+                 buffer_sec=2.0, **kwargs):
+        self.sample_width = pyaudio.get_sample_size(format)
+        self.capacity = int(buffer_sec * rate) * self.sample_width
+        self._ring = bytearray(self.capacity)
+        self._written = 0
+        self._read = 0
+        self._cond = Condition()
+
+        # Statistics, also see report()
+        self.overflows = 0  # Buffers dropped, ring full
+        self.device_overflows = 0  # Buffers dropped by PortAudio
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.latency_max = 0.0
+        self._logged_overflows = 0
+        self._reported = (0, 0)
+
+        self.stream = audio.open(rate=rate, format=format,
+                                 frames_per_buffer=frames_per_buffer,
+                                 stream_callback=self._callback, **kwargs)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.device_overflows += 1
+        adc_time = time_info.get('input_buffer_adc_time', 0)
+        if adc_time > 0:
+            latency = time_info.get('current_time', adc_time) - adc_time
+            self.latency_sum += latency
+            self.latency_count += 1
+            self.latency_max = max(self.latency_max, latency)
+
+        n = len(in_data)
+        if self._written - self._read + n > self.capacity:
+            self.overflows += 1
+            return None, pyaudio.paContinue
+        data = memoryview(in_data)
+        pos = self._written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._ring[pos:pos + first] = data[:first]
+        self._ring[0:n - first] = data[first:]
+        with self._cond:
+            self._written += n
+            self._cond.notify()
+        return None, pyaudio.paContinue
+
+    def read(self, num_frames):
+        """Get the next num_frames frames, waiting for them if needed."""
+        n = num_frames * self.sample_width
+        with self._cond:
+            while self._written - self._read < n:
+                self._cond.wait()
+        if self.overflows != self._logged_overflows:
+            LOG.warning("Capture buffer full, %d buffers dropped" %
+                        (self.overflows - self._logged_overflows))
+            self._logged_overflows = self.overflows
+
+        pos = self._read % self.capacity
+        first = min(n, self.capacity - pos)
+        data = bytes(self._ring[pos:pos + first] + self._ring[0:n - first])
+        self._read += n
+        return data
+
+    def get_read_available(self):
+        return (self._written - self._read) // self.sample_width
+
+    def get_input_latency(self):
+        return self.stream.get_input_latency()
+
+    def report(self, metrics):
+        """Add the statistics gathered since the last report to metrics.
+
+        Args:
+            metrics (MetricsAggregator): metrics to update
+        """
+        overflows, device_overflows = self._reported
+        metrics.increment("mycroft.mic.overflows",
+                          self.overflows - overflows)
+        metrics.increment("mycroft.mic.device_overflows",
+                          self.device_overflows - device_overflows)
+        self._reported = (self.overflows, self.device_overflows)
+        if self.latency_count:
+            metrics.level("mycroft.mic.latency_avg_s",
+                          self.latency_sum / self.latency_count)
+            metrics.level("mycroft.mic.latency_max_s", self.latency_max)
+            self.latency_sum = 0.0
+            self.latency_count = 0
+            self.latency_max = 0.0
+
+    def start_stream(self):
+        # Audio from before the stream was stopped is stale
+        self._read = self._written
+        self.stream.start_stream()
+
+    def stop_stream(self):
+        self.stream.stop_stream()
+
+    def is_stopped(self):
+        return self.stream.is_stopped()
+
+    def close(self):
+        self.stream.close()
 
 
 class MutableStream(object):
+    # Longest time a read of a muted stream waits to be unmuted
+    MUTED_WAIT_SEC = 1.0
+
     def __init__(self, wrapped_stream, format, muted=False):
         assert wrapped_stream is not None
         self.wrapped_stream = wrapped_stream
         self.muted = muted
+        self.unmuted = Event()
+        if not muted:
+            self.unmuted.set()
+        self.paused = False
 
         self.SAMPLE_WIDTH = pyaudio.get_sample_size(format)
         self.muted_buffer = b''.join([b'\x00' * self.SAMPLE_WIDTH])
 
     def mute(self):
         self.muted = True
+        self.unmuted.clear()
 
     def unmute(self):
         self.muted = False
+        self.unmuted.set()
 
     def read(self, size):
-        frames = collections.deque()
-        remaining = size
-        while remaining > 0:
-            to_read = min(self.wrapped_stream.get_read_available(), remaining)
-            if to_read == 0:
-                sleep(.01)
-                continue
-            result = self.wrapped_stream.read(to_read)
-            frames.append(result)
-            remaining -= to_read
-
         if self.muted:
-            return self.muted_buffer
+            # Muted audio is never used: pause the device instead of
+            # draining it and park until unmuted.  The device is only
+            # touched from the reading thread.
+            if not self.paused:
+                self.wrapped_stream.stop_stream()
+                self.paused = True
+            self.unmuted.wait(self.MUTED_WAIT_SEC)
+            if self.muted:
+                return self.muted_buffer
+        if self.paused:
+            self.wrapped_stream.start_stream()
+            self.paused = False
+
+        if isinstance(self.wrapped_stream, CallbackStream):
+            audio = self.wrapped_stream.read(size)
+        else:
+            frames = collections.deque()
+            remaining = size
+            while remaining > 0:
+                to_read = min(self.wrapped_stream.get_read_available(),
+                              remaining)
+                if to_read == 0:
+                    sleep(.01)
+                    continue
+                result = self.wrapped_stream.read(to_read)
+                frames.append(result)
+                remaining -= to_read
+            audio = b"".join(list(frames))
+
         input_latency = self.wrapped_stream.get_input_latency()
         if input_latency > 0.2:
             LOG.warning("High input latency: %f" % input_latency)
-        audio = b"".join(list(frames))
         return audio
 
     def close(self):
@@ -91,11 +246,12 @@ class MutableStream(object):
 
 class MutableMicrophone(Microphone):
     def __init__(self, device_index=None, sample_rate=16000, chunk_size=1024,
-                 mute=False):
+                 mute=False, callback_capture=True):
         Microphone.__init__(
             self, device_index=device_index, sample_rate=sample_rate,
             chunk_size=chunk_size)
         self.muted = False
+        self.callback_capture = callback_capture
         if mute:
             self.mute()
 
@@ -103,12 +259,19 @@ class MutableMicrophone(Microphone):
         assert self.stream is None, \
             "This audio source is already inside a context manager"
         self.audio = pyaudio.PyAudio()
-        self.stream = MutableStream(self.audio.open(
-            input_device_index=self.device_index, channels=1,
-            format=self.format, rate=self.SAMPLE_RATE,
-            frames_per_buffer=self.CHUNK,
-            input=True,  # stream is an input stream
-        ), self.format, self.muted)
+        if self.callback_capture:
+            stream = CallbackStream(
+                self.audio, rate=self.SAMPLE_RATE, format=self.format,
+                frames_per_buffer=self.CHUNK,
+                input_device_index=self.device_index, channels=1, input=True)
+        else:
+            stream = self.audio.open(
+                input_device_index=self.device_index, channels=1,
+                format=self.format, rate=self.SAMPLE_RATE,
+                frames_per_buffer=self.CHUNK,
+                input=True,  # stream is an input stream
+            )
+        self.stream = MutableStream(stream, self.format, self.muted)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -131,6 +294,12 @@ class MutableMicrophone(Microphone):
     def is_muted(self):
         return self.muted
 
+    def report_metrics(self, metrics):
+        """ Add capture statistics to metrics, if the stream keeps any. """
+        if self.stream and \
+                isinstance(self.stream.wrapped_stream, CallbackStream):
+            self.stream.wrapped_stream.report(metrics)
+
 
 class ResponsiveRecognizer(speech_recognition.Recognizer):
     # Padding of silence when feeding to pocketsphinx
@@ -155,9 +324,23 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
     # Time between pocketsphinx checks for the wake word
     SEC_BETWEEN_WW_CHECKS = 0.2
 
-    def __init__(self, wake_word_recognizer):
+    # The maximum seconds of audio heard after the wake word, before its
+    # detection, starting the recorded phrase
+    MAX_PRE_ROLL_SEC = 2.0
 
-        self.config = Configuration.get()
+    def __init__(self, wake_word_recognizer, primary=None, meter_path=None,
+                 config=None):
+        """
+        Args:
+            wake_word_recognizer (HotWordEngine): wake word engine
+            primary (ResponsiveRecognizer): recognizer of the first of
+                                            several microphones, recordings
+                                            are saved by its archivers
+            meter_path (str): file publishing the microphone level,
+                              defaults to the one read by the CLI
+            config (dict): configuration to use instead of the loaded one
+        """
+        self.config = config or Configuration.get()
         listener_config = self.config.get('listener')
         self.upload_config = listener_config.get('wake_word_upload')
 
@@ -169,18 +352,30 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                 not check_for_signal('restartedFromSkill', 10):
             self.skip_wake_word = True
 
-        self.wake_word_name = wake_word_recognizer.key_phrase
-        # The maximum audio in seconds to keep for transcribing a phrase
-        # The wake word must fit in this time
-        num_phonemes = wake_word_recognizer.num_phonemes
-        len_phoneme = listener_config.get('phoneme_duration', 120) / 1000.0
-        self.TEST_WW_SEC = int(num_phonemes * len_phoneme)
-        self.SAVED_WW_SEC = (10 if self.upload_config['enable']
-                             else self.TEST_WW_SEC)
-
         speech_recognition.Recognizer.__init__(self)
-        self.wake_word_recognizer = wake_word_recognizer
+        self._use_wake_word_recognizer(wake_word_recognizer)
+        # Engine replacing the current one at the next chunk, see
+        # set_wake_word_recognizer()
+        self._next_wake_word_recognizer = None
         self.audio = pyaudio.PyAudio()
+        self.vad = VADFactory.create(listener_config.get('vad'),
+                                     listener_config.get('sample_rate', 16000))
+        # Background noise level, tracked on every chunk heard so that
+        # listen() never stops to calibrate
+        self.noise_floor = NoiseFloorEstimator(
+            listener_config.get('noise_floor_sec', 5.0))
+        # Seconds between the end of a phrase and listening for the wake word
+        # again, audio in that time is not heard.
+        self.dead_time = None
+        self._phrase_end = None
+        # Phrase which ended the last wait for the wake word, if any
+        self.hotword = None
+        # The recorded phrase starts with the audio heard between the end of
+        # the wake word and its detection, so nothing said right after the
+        # wake word is lost.  For windowed engines not telling where the
+        # wake word ended, the last pre_roll_sec before the detection.
+        self.pre_roll_sec = listener_config.get('pre_roll_sec', 0.2)
+        self._pre_roll = b''
         self.multiplier = listener_config.get('multiplier')
         self.energy_ratio = listener_config.get('energy_ratio')
         # check the config for the flag to save wake words.
@@ -188,10 +383,34 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         self.save_utterances = listener_config.get('record_utterances', False)
         self.save_wake_words = listener_config.get('record_wake_words') \
             or self.upload_config['enable'] or self.config['opt_in']
-        self.upload_lock = Lock()
         self.save_wake_words_dir = join(gettempdir(), 'mycroft_wake_words')
-        self.filenames_to_upload = []
-        self.mic_level_file = os.path.join(get_ipc_directory(), "mic_level")
+        # Recordings are encoded, saved and uploaded in the background
+        self.archive_config = listener_config.get('archive', {})
+        self.wake_word_archiver = None
+        self.utterance_archiver = None
+        self._owns_archivers = primary is None
+        if primary:
+            self.wake_word_archiver = primary.wake_word_archiver
+            self.utterance_archiver = primary.utterance_archiver
+        elif self.save_wake_words:
+            uploader = None
+            if self.upload_config['enable'] or self.config['opt_in']:
+                uploader = ScpUploader(self.upload_config,
+                                       self.save_wake_words_dir)
+            self.wake_word_archiver = self._create_archiver(
+                'wake_words', self.save_wake_words_dir, uploader)
+            if uploader:
+                uploader.start()
+        if self.save_utterances and not primary:
+            self.utterance_archiver = self._create_archiver(
+                'utterances', join(gettempdir(), 'mycroft_utterances'))
+        # Energy levels are published through a shared memory meter, the
+        # text file is only written for compatibility with older readers
+        self.mic_meter = MicMeter(meter_path, writer=True)
+        self.mic_level_file = None
+        if listener_config.get('mic_level_file', False) and not meter_path:
+            self.mic_level_file = os.path.join(get_ipc_directory(),
+                                               "mic_level")
         self._stop_signaled = False
 
     @staticmethod
@@ -202,7 +421,50 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
     def calc_energy(sound_chunk, sample_width):
         return audioop.rms(sound_chunk, sample_width)
 
-    def _record_phrase(self, source, sec_per_buffer):
+    @staticmethod
+    def _is_muted(chunk, source):
+        # Muted streams return a single silent sample instead of a chunk
+        return len(chunk) <= source.SAMPLE_WIDTH
+
+    def _create_phrase_buffer(self, source, sec_per_buffer, pre_roll=b''):
+        """Create a buffer large enough for the longest phrase allowed.
+
+        Args:
+            source (AudioSource):  Source producing the audio chunks
+            sec_per_buffer (float):  Fractional number of seconds in each chunk
+            pre_roll (str): audio heard before recording began
+
+        Returns:
+            PhraseAudioBuffer: buffer starting with a single silent sample
+                               followed by pre_roll
+        """
+        size = self._phrase_size(source, sec_per_buffer) + len(pre_roll)
+        return PhraseAudioBuffer(size, b'\0' * source.SAMPLE_WIDTH + pre_roll)
+
+    def _phrase_size(self, source, sec_per_buffer):
+        # Bytes of the longest phrase allowed, without the pre-roll
+        max_chunks = int(self.RECORDING_TIMEOUT / sec_per_buffer)
+        return (max_chunks * source.CHUNK + 1) * source.SAMPLE_WIDTH
+
+    def _max_pre_roll_size(self, source):
+        size = int(self.sec_to_bytes(max(self.MAX_PRE_ROLL_SEC,
+                                         self.pre_roll_sec), source))
+        return size - size % source.SAMPLE_WIDTH
+
+    def max_phrase_size(self, source):
+        """Get the size of the largest phrase recorded from a source.
+
+        Args:
+            source (AudioSource):  Source producing the audio chunks
+
+        Returns:
+            int: bytes of audio, pre-roll included
+        """
+        sec_per_buffer = float(source.CHUNK) / source.SAMPLE_RATE
+        return self._phrase_size(source, sec_per_buffer) + \
+            self._max_pre_roll_size(source)
+
+    def _record_phrase(self, source, sec_per_buffer, phrase_buffer=None):
         """Record an entire spoken phrase.
 
         Essentially, this code waits for a period of silence and then returns
@@ -212,10 +474,13 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         Args:
             source (AudioSource):  Source producing the audio chunks
             sec_per_buffer (float):  Fractional number of seconds in each chunk
+            phrase_buffer (PhraseAudioBuffer): Buffer to record into, other
+                                               threads may read from it while
+                                               recording
 
         Returns:
-            bytearray: complete audio buffer recorded, including any
-                       silence at the end of the user's utterance
+            str: complete audio buffer recorded, including any
+                 silence at the end of the user's utterance
         """
 
         num_loud_chunks = 0
@@ -247,18 +512,23 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         max_chunks_of_silence = int(self.RECORDING_TIMEOUT_WITH_SILENCE /
                                     sec_per_buffer)
 
-        # bytearray to store audio in
-        byte_data = '\0' * source.SAMPLE_WIDTH
+        # preallocated buffer to store audio in
+        if phrase_buffer is None:
+            phrase_buffer = self._create_phrase_buffer(source, sec_per_buffer)
 
         phrase_complete = False
         while num_chunks < max_chunks and not phrase_complete:
             chunk = self.record_sound_chunk(source)
-            byte_data += chunk
+            if self._is_muted(chunk, source):
+                # Muted while recording, Mycroft is speaking over the user
+                break
+            phrase_buffer.append(chunk)
             num_chunks += 1
 
-            energy = self.calc_energy(chunk, source.SAMPLE_WIDTH)
+            energy = self.vad.calc_energy(chunk, source.SAMPLE_WIDTH)
+            self.noise_floor.update(energy, sec_per_buffer)
             test_threshold = self.energy_threshold * self.multiplier
-            is_loud = energy > test_threshold
+            is_loud = self.vad.is_speech(chunk, energy, test_threshold)
             if is_loud:
                 noise = increase_noise(noise)
                 num_loud_chunks += 1
@@ -266,11 +536,9 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                 noise = decrease_noise(noise)
                 self._adjust_threshold(energy, sec_per_buffer)
 
+            self.mic_meter.update(energy, self.energy_threshold)
             if num_chunks % 10 == 0:
-                with open(self.mic_level_file, 'w') as f:
-                    f.write("Energy:  cur=" + str(energy) + " thresh=" +
-                            str(self.energy_threshold))
-                f.close()
+                self._write_mic_level_file(energy)
 
             was_loud_enough = num_loud_chunks > min_loud_chunks
 
@@ -289,7 +557,15 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
             if check_for_signal('buttonPress'):
                 phrase_complete = True
 
-        return byte_data
+        phrase_buffer.finish()
+        return phrase_buffer.get().tobytes()
+
+    def _write_mic_level_file(self, energy):
+        """ Write the energy level to the legacy text file, if enabled. """
+        if self.mic_level_file:
+            with open(self.mic_level_file, 'w') as f:
+                f.write("Energy:  cur=" + str(energy) + " thresh=" +
+                        str(self.energy_threshold))
 
     @staticmethod
     def sec_to_bytes(sec, source):
@@ -321,35 +597,70 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         """
         self._stop_signaled = True
 
-    def _upload_file(self, filename):
-        server = self.upload_config['server']
-        keyfile = resolve_resource_file('wakeword_rsa')
-        userfile = expanduser('~/.mycroft/wakeword_rsa')
+    def _create_archiver(self, name, directory, uploader=None):
+        archiver = AudioArchiver(
+            directory, self.archive_config.get('format', 'flac'),
+            self.archive_config.get('quota_mb', 100),
+            self.archive_config.get('queue_size', 8), uploader, name)
+        archiver.start()
+        return archiver
 
-        if not isfile(userfile):
-            shutil.copy2(keyfile, userfile)
-            os.chmod(userfile, 0o600)
-            keyfile = userfile
+    def report_metrics(self, metrics):
+        """
+            Add the archival statistics to metrics, archivers shared with
+            a primary recognizer are reported by it.
+        """
+        for archiver in (self.wake_word_archiver, self.utterance_archiver):
+            if archiver and self._owns_archivers:
+                archiver.report(metrics)
 
-        address = self.upload_config['user'] + '@' + \
-            server + ':' + self.upload_config['folder']
+    def _use_wake_word_recognizer(self, wake_word_recognizer):
+        listener_config = self.config.get('listener')
+        self.wake_word_name = wake_word_recognizer.key_phrase
+        # The maximum audio in seconds to keep for transcribing a phrase
+        # The wake word must fit in this time
+        num_phonemes = wake_word_recognizer.num_phonemes
+        len_phoneme = listener_config.get('phoneme_duration', 120) / 1000.0
+        self.TEST_WW_SEC = int(num_phonemes * len_phoneme)
+        self.SAVED_WW_SEC = (10 if self.upload_config['enable']
+                             else self.TEST_WW_SEC)
+        self.wake_word_recognizer = wake_word_recognizer
+        # Engines supporting it are fed chunk by chunk instead of re-decoding
+        # the last TEST_WW_SEC of audio every SEC_BETWEEN_WW_CHECKS
+        self.streaming_wake_word = getattr(wake_word_recognizer,
+                                           'streaming', False)
 
-        self.upload_lock.acquire()
-        try:
-            self.filenames_to_upload.append(filename)
-            for i, fn in enumerate(self.filenames_to_upload):
-                LOG.debug('Uploading ' + fn + '...')
-                os.chmod(fn, 0o666)
-                cmd = 'scp -o StrictHostKeyChecking=no -P ' + \
-                      str(self.upload_config['port']) + ' -i ' + \
-                      keyfile + ' ' + fn + ' ' + address
-                if os.system(cmd) == 0:
-                    del self.filenames_to_upload[i]
-                    os.remove(fn)
-                else:
-                    LOG.debug('Could not upload ' + fn + ' to ' + server)
-        finally:
-            self.upload_lock.release()
+    def set_wake_word_recognizer(self, wake_word_recognizer):
+        """Replace the wake word engine without stopping the capture.
+
+        The engine must be fully loaded, it is swapped in by the listening
+        thread between two chunks and the wait for the wake word restarts
+        with it.
+
+        Args:
+            wake_word_recognizer (HotWordEngine): the new engine
+        """
+        self._next_wake_word_recognizer = wake_word_recognizer
+
+    def _swap_wake_word_recognizer(self):
+        """Start using the engine given to set_wake_word_recognizer().
+
+        Returns:
+            bool: True if the engine was replaced
+        """
+        engine = self._next_wake_word_recognizer
+        if engine is None:
+            return False
+        self._next_wake_word_recognizer = None
+        self._use_wake_word_recognizer(engine)
+        LOG.info("Now listening for " + self.wake_word_name)
+        return True
+
+    def close(self):
+        """ Finish saving the recordings. """
+        for archiver in (self.wake_word_archiver, self.utterance_archiver):
+            if archiver and self._owns_archivers:
+                archiver.stop()
 
     def _wait_until_wake_word(self, source, sec_per_buffer):
         """Listen continuously on source until a wake word is spoken
@@ -357,23 +668,36 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         Args:
             source (AudioSource):  Source producing the audio chunks
             sec_per_buffer (float):  Fractional number of seconds in each chunk
+
+        Returns:
+            bool: True if the wait was interrupted to replace the engine
         """
         num_silent_bytes = int(self.SILENCE_SEC * source.SAMPLE_RATE *
                                source.SAMPLE_WIDTH)
 
-        silence = '\0' * num_silent_bytes
+        silence = b'\0' * num_silent_bytes
 
-        # bytearray to store audio in
-        byte_data = silence
+        pre_roll_size = int(self.sec_to_bytes(self.pre_roll_sec, source))
+        pre_roll_size -= pre_roll_size % source.SAMPLE_WIDTH
+        self._pre_roll = b''
+
+        # Preallocated rolling window holding the last SAVED_WW_SEC of audio,
+        # and at least the pre-roll, older audio is overwritten as new chunks
+        # arrive.
+        max_size = max(self.sec_to_bytes(self.SAVED_WW_SEC, source),
+                       self._max_pre_roll_size(source))
+        test_size = self.sec_to_bytes(self.TEST_WW_SEC, source)
+        audio_buffer = CyclicAudioBuffer(max_size, silence)
 
         buffers_per_check = self.SEC_BETWEEN_WW_CHECKS / sec_per_buffer
         buffers_since_check = 0.0
 
-        # Max bytes for byte_data before audio is removed from the front
-        max_size = self.sec_to_bytes(self.SAVED_WW_SEC, source)
-        test_size = self.sec_to_bytes(self.TEST_WW_SEC, source)
-
         said_wake_word = False
+        self.hotword = None
+
+        if self.streaming_wake_word:
+            # Don't let audio from before the last phrase trigger a detection
+            self.wake_word_recognizer.reset()
 
         # Rolling buffer to track the audio energy (loudness) heard on
         # the source recently.  An average audio energy is maintained
@@ -388,10 +712,20 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         while not said_wake_word and not self._stop_signaled:
             if self._skip_wake_word():
                 break
+            if self._next_wake_word_recognizer is not None:
+                return True
             chunk = self.record_sound_chunk(source)
+            if self._is_muted(chunk, source):
+                # Nothing to listen to, chunks only come when the stream is
+                # unmuted or every MUTED_WAIT_SEC for signals to be checked
+                if self.streaming_wake_word:
+                    self.wake_word_recognizer.reset()
+                continue
 
-            energy = self.calc_energy(chunk, source.SAMPLE_WIDTH)
-            if energy < self.energy_threshold * self.multiplier:
+            energy = self.vad.calc_energy(chunk, source.SAMPLE_WIDTH)
+            self.noise_floor.update(energy, sec_per_buffer)
+            if not self.vad.is_speech(chunk, energy,
+                                      self.energy_threshold * self.multiplier):
                 self._adjust_threshold(energy, sec_per_buffer)
 
             if len(energies) < energy_avg_samples:
@@ -411,54 +745,78 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                         # bump the threshold to just above this value
                         self.energy_threshold = energy * 1.2
 
-            # Periodically output energy level stats.  This can be used to
-            # visualize the microphone input, e.g. a needle on a meter.
+            # Output energy level stats.  This can be used to visualize the
+            # microphone input, e.g. a needle on a meter.
+            self.mic_meter.update(energy, self.energy_threshold)
             if counter % 3:
-                with open(self.mic_level_file, 'w') as f:
-                    f.write("Energy:  cur=" + str(energy) + " thresh=" +
-                            str(self.energy_threshold))
-                f.close()
+                self._write_mic_level_file(energy)
             counter += 1
 
-            # At first, the buffer is empty and must fill up.  After that
-            # just drop the first chunk bytes to keep it the same size.
-            needs_to_grow = len(byte_data) < max_size
-            if needs_to_grow:
-                byte_data += chunk
-            else:  # Remove beginning of audio and add new chunk to end
-                byte_data = byte_data[len(chunk):] + chunk
-
-            buffers_since_check += 1.0
-            if buffers_since_check > buffers_per_check:
-                buffers_since_check -= buffers_per_check
-                chopped = byte_data[-test_size:] \
-                    if test_size < len(byte_data) else byte_data
-                audio_data = chopped + silence
-                if self.skip_wake_word:
-                    tmp = float(len(audio_data)) / \
-                          (source.SAMPLE_RATE * source.SAMPLE_WIDTH)
-                    LOG.debug('audio data length = ' + str(tmp))
-                said_wake_word = \
-                    self.wake_word_recognizer.found_wake_word(audio_data)
-                # if a wake word is success full then record audio in temp
-                # file.
-                if self.save_wake_words and said_wake_word:
-                    audio = self._create_audio_data(byte_data, source)
-                    stamp = str(int(1000 * get_time()))
-                    uid = SessionManager.get().session_id
-                    if not isdir(self.save_wake_words_dir):
-                        mkdir(self.save_wake_words_dir)
-
-                    dr = self.save_wake_words_dir
-                    ww = self.wake_word_name.replace(' ', '-')
-                    filename = join(dr, ww + '.' + stamp + '.' + uid + '.wav')
-                    with open(filename, 'wb') as f:
-                        f.write(audio.get_wav_data())
-
-                    if self.upload_config['enable'] or self.config['opt_in']:
-                        t = Thread(target=self._upload_file, args=(filename,))
-                        t.daemon = True
-                        t.start()
+            audio_buffer.append(chunk)
+
+            if self.streaming_wake_word:
+                # Streaming engines see every chunk exactly once
+                said_wake_word = self.wake_word_recognizer.update(chunk)
+            else:
+                buffers_since_check += 1.0
+                if buffers_since_check > buffers_per_check:
+                    buffers_since_check -= buffers_per_check
+                    # Only the tested window is materialized, the engines
+                    # need a plain string to decode.
+                    audio_data = audio_buffer.get_last(test_size).tobytes() \
+                        + silence
+                    if self.skip_wake_word:
+                        tmp = float(len(audio_data)) / \
+                              (source.SAMPLE_RATE * source.SAMPLE_WIDTH)
+                        LOG.debug('audio data length = ' + str(tmp))
+                    said_wake_word = \
+                        self.wake_word_recognizer.found_wake_word(audio_data)
+
+            if said_wake_word:
+                self._pre_roll = self._get_pre_roll(
+                    audio_buffer, source, pre_roll_size,
+                    0 if self.streaming_wake_word else len(silence))
+                # Engines listening for several phrases report which one
+                self.hotword = getattr(self.wake_word_recognizer,
+                                       'found_phrase', None) or \
+                    self.wake_word_name
+
+            # if a wake word is success full then record audio in temp
+            # file.
+            if self.wake_word_archiver and said_wake_word:
+                stamp = str(int(1000 * get_time()))
+                uid = SessionManager.get().session_id
+                ww = self.wake_word_name.replace(' ', '-')
+                self.wake_word_archiver.archive(
+                    audio_buffer.get().tobytes(), source.SAMPLE_RATE,
+                    source.SAMPLE_WIDTH, ww + '.' + stamp + '.' + uid)
+        return False
+
+    def _get_pre_roll(self, audio_buffer, source, pre_roll_size, padding):
+        """Get the audio heard after the end of the detected wake word.
+
+        Args:
+            audio_buffer (CyclicAudioBuffer): audio heard until the detection
+            source (AudioSource):  Source producing the audio chunks
+            pre_roll_size (int): bytes to keep if the end isn't known
+            padding (int): bytes of silence decoded after the audio
+
+        Returns:
+            str: raw audio
+        """
+        end = getattr(self.wake_word_recognizer, 'found_end', None)
+        if end is not None:
+            size = int(self.sec_to_bytes(end, source)) - padding
+        elif self.streaming_wake_word:
+            # Detected in the last chunk, the next ones follow the wake word
+            size = 0
+        else:
+            size = pre_roll_size
+        size = min(size, self._max_pre_roll_size(source))
+        size -= size % source.SAMPLE_WIDTH
+        if size <= 0:
+            return b''
+        return audio_buffer.get_last(size).tobytes()
 
     @staticmethod
     def _create_audio_data(raw_data, source):
@@ -490,10 +848,9 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
 
         # Every time a new 'listen()' request begins, reset the threshold
         # used for silence detection.  This is as good of a reset point as
-        # any, as we expect the user and Mycroft to not be talking.
-        # NOTE: adjust_for_ambient_noise() doc claims it will stop early if
-        #       speech is detected, but there is no code to actually do that.
-        self.adjust_for_ambient_noise(source, 1.0)
+        # any, as we expect the user and Mycroft to not be talking.  The
+        # noise floor is already known, no audio is spent calibrating.
+        self._reset_threshold()
 
         if self.skip_wake_word:
             create_signal('startListening')
@@ -501,15 +858,24 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         else:
             LOG.debug("Waiting for wake word...")
 
-        self._wait_until_wake_word(source, sec_per_buffer)
+        if self._phrase_end is not None:
+            self.dead_time = get_time() - self._phrase_end
+            LOG.debug("Listening again %.3fs after the last phrase" %
+                      self.dead_time)
+        self._swap_wake_word_recognizer()
+        while self._wait_until_wake_word(source, sec_per_buffer):
+            self._swap_wake_word_recognizer()
         if self._stop_signaled:
             return
+        if self.hotword:
+            emitter.emit("recognizer_loop:hotword", {'hotword': self.hotword})
 
         LOG.debug("Recording...")
         emitter.emit("recognizer_loop:record_begin")
 
         # If enabled, play a wave file with a short sound to audibly
-        # indicate recording has begun.
+        # indicate recording has begun.  The player runs in the background,
+        # the audio keeps being captured meanwhile.
         if (self.config.get('confirm_listening') and
                 (not self.skip_wake_word or
                  check_for_signal('WaitingToConfirm', 10))):
@@ -518,19 +884,37 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
             if file:
                 play_wav(file)
 
-        frame_data = self._record_phrase(source, sec_per_buffer)
+        # Consumers can start processing the phrase through
+        # phrase_buffer.chunks() while it is still being recorded
+        phrase_buffer = self._create_phrase_buffer(source, sec_per_buffer,
+                                                   self._pre_roll)
+        emitter.emit("recognizer_loop:record_stream", phrase_buffer)
+        try:
+            frame_data = self._record_phrase(source, sec_per_buffer,
+                                             phrase_buffer)
+        finally:
+            phrase_buffer.finish()
+            self._phrase_end = get_time()
         audio_data = self._create_audio_data(frame_data, source)
+        # Matches the audio with the STT stream of the phrase
+        audio_data.phrase_id = phrase_buffer.id
         emitter.emit("recognizer_loop:record_end")
-        if self.save_utterances:
+        if self.utterance_archiver:
             LOG.info("Recording utterance")
             stamp = str(datetime.datetime.now())
-            filename = "/tmp/mycroft_utterance%s.wav" % stamp
-            with open(filename, 'wb') as filea:
-                filea.write(audio_data.get_wav_data())
+            self.utterance_archiver.archive(
+                frame_data, source.SAMPLE_RATE, source.SAMPLE_WIDTH,
+                "mycroft_utterance" + stamp)
             LOG.debug("Thinking...")
 
         return audio_data
 
+    def _reset_threshold(self):
+        """ Set the energy threshold from the estimated noise floor. """
+        floor = self.noise_floor.floor
+        if floor is not None:
+            self.energy_threshold = floor * self.energy_ratio
+
     def _adjust_threshold(self, energy, seconds_per_buffer):
         if self.dynamic_energy_threshold and energy > 0:
             # account for different chunk sizes and rates
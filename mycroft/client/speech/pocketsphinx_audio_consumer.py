@@ -25,6 +25,8 @@ import sys
 # import pydub
 # Copyright 2016 Mycroft AI, Inc.
 
+from mycroft.client.speech.grammar import (GRAMMAR_SEARCHES,
+                                           set_decoder_grammar)
 from mycroft.configuration import ConfigurationManager
 from mycroft.messagebus.message import Message
 from mycroft.metrics import MetricsAggregator
@@ -105,10 +107,29 @@ class PocketsphinxAudioConsumer(Thread):
         logger.debug("wake_word = " + self.wake_word)
         self.decoder.set_keyphrase('wake_word', self.wake_word)
 
+        # Search transcribing utterances, replaced by set_grammar()
+        self.stt_search = self.load_stt_search(self.decoder,
+                                               model_lang_dir) or 'lm'
+        self.next_grammar = None
+
+        if check_for_signal('skip_wake_word', -1):
+            self.decoder.set_search(self.stt_search)
+        elif listener_config.get('skip_wake_word', True) and \
+                not check_for_signal('restartedFromSkill', 10):
+            self.decoder.set_search(self.stt_search)
+            create_signal('skip_wake_word')
+
+    def load_stt_search(self, decoder, model_lang_dir):
+        """Add the search used to transcribe utterances to a decoder.
+
+        Returns:
+            str: name of the search, None if no grammar or model was found
+        """
         jsgf = join(model_lang_dir, 'hello.jsgf')
         if exists(jsgf):
-            self.decoder.set_search('grammar')
-            self.decoder.set_jsgf_file('jsgf', str(jsgf))
+            decoder.set_search('grammar')
+            decoder.set_jsgf_file('jsgf', str(jsgf))
+            return 'jsgf'
         else:
             # lm = join(model_lang_dir, 'en-70k-0.1-pruned.lm')
             # lm = join(model_lang_dir, 'guy6i_like.lm')
@@ -119,14 +140,52 @@ class PocketsphinxAudioConsumer(Thread):
             # lm = join(model_lang_dir, self.lang + '.lm.bin')
             if exists(lm):
                 logger.debug("lm = " + lm)
-                self.decoder.set_lm_file('lm', str(lm))
+                decoder.set_lm_file('lm', str(lm))
+                return 'lm'
+        return None
 
-        if check_for_signal('skip_wake_word', -1):
-            self.decoder.set_search('lm')
-        elif listener_config.get('skip_wake_word', True) and \
-                not check_for_signal('restartedFromSkill', 10):
-            self.decoder.set_search('lm')
-            create_signal('skip_wake_word')
+    def create_stt_decoder(self):
+        """Create a decoder dedicated to transcribing utterances.
+
+        Used by the TranscriberPool workers, which load the models once and
+        never search for the wake word.
+        """
+        model_lang_dir = join(BASEDIR, 'recognizer/model', str(self.lang))
+        decoder = Decoder(self.create_decoder_config(model_lang_dir))
+        search = self.load_stt_search(decoder, model_lang_dir)
+        if search:
+            decoder.set_search(search)
+        return decoder
+
+    def is_known(self, word):
+        """ Tell if word is in the pronunciation dictionary. """
+        return self.decoder.lookup_word(word) is not None
+
+    def set_grammar(self, path, generation):
+        """Transcribe utterances with a JSGF grammar.
+
+        The decoder switches to it before the next utterance, in the thread
+        using it.
+
+        Args:
+            path (str): grammar file
+            generation (int): number of the grammar, increasing with every
+                              change
+        """
+        self.next_grammar = (path, generation)
+
+    def _load_next_grammar(self):
+        next_grammar, self.next_grammar = self.next_grammar, None
+        if next_grammar:
+            current = self.decoder.get_search()
+            try:
+                self.stt_search = set_decoder_grammar(self.decoder,
+                                                      *next_grammar)
+            except Exception as e:
+                logger.error("Could not load the grammar: " + repr(e))
+            # Keep searching for the wake word if that was the search
+            if current not in GRAMMAR_SEARCHES + ('lm', 'jsgf'):
+                self.decoder.set_search(current)
 
     def create_decoder_config(self, model_lang_dir):
         decoder_config = Decoder.default_config()
@@ -163,6 +222,7 @@ class PocketsphinxAudioConsumer(Thread):
         return None
 
     def transcribe(self, byte_data, metrics=None):
+        self._load_next_grammar()
         start = time.time()
         # self.decoder.s
         # logger.debug("Thinking...")
@@ -188,7 +248,7 @@ class PocketsphinxAudioConsumer(Thread):
             logger.debug("*******************************")
             if self.wake_word in hyp.hypstr.lower() or \
                     check_for_signal('skip_wake_word', -1):
-                self.decoder.set_search('lm')
+                self.decoder.set_search(self.stt_search)
             else:
                 self.decoder.set_keyphrase('wake_word', self.wake_word)
                 self.decoder.set_search('_default')
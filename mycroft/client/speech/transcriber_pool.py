@@ -0,0 +1,222 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import ctypes
+import multiprocessing
+import time
+from Queue import Queue, Empty
+from itertools import count
+from threading import Thread, Lock
+
+from mycroft.client.speech.grammar import set_decoder_grammar
+from mycroft.util.log import LOG
+
+
+def _transcriber_main(create_decoder, slots, tasks, results, grammar,
+                      grammar_generation, current_job):
+    """ Loop run by each worker process. """
+    decoder = create_decoder()
+    generation = -1
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        with grammar_generation.get_lock():
+            path, new_generation = grammar.value, grammar_generation.value
+        if new_generation != generation:
+            generation = new_generation
+            try:
+                set_decoder_grammar(decoder, path, generation)
+            except Exception as e:
+                LOG.error("Could not load the grammar: " + repr(e))
+        job_id, slot, size = task
+        current_job.value = job_id
+        data = ctypes.string_at(ctypes.addressof(slots[slot]), size)
+        start = time.time()
+        hypstr = None
+        try:
+            decoder.start_utt()
+            decoder.process_raw(data, False, True)
+            decoder.end_utt()
+            hyp = decoder.hyp()
+            hypstr = hyp.hypstr if hyp else None
+        except Exception as e:
+            LOG.error("Local transcription failed: " + repr(e))
+        results.put((job_id, slot, hypstr, time.time() - start))
+        current_job.value = -1
+
+
+class TranscriberPool(object):
+    """
+    TranscriberPool
+    Fixed number of long-lived processes transcribing utterances locally.
+
+    Each worker creates its decoder once, when started.  Audio is passed
+    through preallocated shared memory slots, only small task descriptors go
+    through the queues.  When all slots are in use submit() waits for one,
+    bounding the memory used and the number of utterances being decoded.
+
+    Workers dying (e.g. the decoder crashing) are replaced, the utterance
+    they were decoding is dropped and its slot reused.
+
+    Args:
+        create_decoder (callable): returns a ready to use pocketsphinx
+                                   Decoder, called once in every worker
+        num_workers (int): number of worker processes
+        max_audio_size (int): maximum size in bytes of an utterance
+    """
+
+    # Seconds submit() waits for a free slot before dropping the utterance
+    SLOT_TIMEOUT_SEC = 10.0
+    # Seconds between checks of the workers
+    CHECK_SEC = 1.0
+
+    def __init__(self, create_decoder, num_workers=2,
+                 max_audio_size=16000 * 2 * 10):
+        self.create_decoder = create_decoder
+        self.max_audio_size = max_audio_size
+        num_slots = 2 * num_workers
+        self.slots = [multiprocessing.RawArray(ctypes.c_char, max_audio_size)
+                      for _ in range(num_slots)]
+        self.free_slots = Queue()
+        for slot in range(num_slots):
+            self.free_slots.put(slot)
+        # Grammar the workers switch to before their next utterance
+        self.grammar = multiprocessing.Array(ctypes.c_char, 4096)
+        self.grammar_generation = multiprocessing.Value(ctypes.c_int, -1)
+        self.tasks = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.lock = Lock()
+        self.jobs = {}  # Job id -> (slot, callback)
+        self.job_ids = count()
+        self.running = True
+
+        # Worker process -> id of the job it is decoding, -1 when idle
+        self.workers = {}
+        for _ in range(num_workers):
+            self._start_worker()
+
+        self.result_thread = Thread(target=self._handle_results)
+        self.result_thread.daemon = True
+        self.result_thread.start()
+
+    def _start_worker(self):
+        current_job = multiprocessing.Value(ctypes.c_int, -1)
+        worker = multiprocessing.Process(
+            target=_transcriber_main,
+            args=(self.create_decoder, self.slots, self.tasks, self.results,
+                  self.grammar, self.grammar_generation, current_job))
+        worker.daemon = True
+        worker.start()
+        self.workers[worker] = current_job
+
+    def submit(self, frame_data, callback):
+        """Queue audio for transcription.
+
+        Args:
+            frame_data (str): raw audio, truncated to max_audio_size
+            callback (callable): called from the pool's result thread with
+                                 the hypothesis string (or None) and the
+                                 seconds spent decoding, not called if the
+                                 worker decoding the audio died
+
+        Returns:
+            bool: False if no slot got free in time and the audio was
+                  dropped
+        """
+        size = min(len(frame_data), self.max_audio_size)
+        try:
+            slot = self.free_slots.get(timeout=self.SLOT_TIMEOUT_SEC)
+        except Empty:
+            LOG.error("No transcriber available for " +
+                      str(self.SLOT_TIMEOUT_SEC) + "s, dropping audio")
+            return False
+        ctypes.memmove(self.slots[slot], frame_data, size)
+        job_id = next(self.job_ids)
+        with self.lock:
+            self.jobs[job_id] = (slot, callback)
+        self.tasks.put((job_id, slot, size))
+        return True
+
+    def set_grammar(self, path, generation):
+        """Make the workers decode with a JSGF grammar.
+
+        Utterances already being decoded finish with the previous search.
+
+        Args:
+            path (str): grammar file
+            generation (int): number of the grammar, increasing with every
+                              change
+        """
+        with self.grammar_generation.get_lock():
+            self.grammar.value = path
+            self.grammar_generation.value = generation
+
+    def _finish_job(self, job_id):
+        """ Forget a job and free its slot, None if already finished. """
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+        if job:
+            self.free_slots.put(job[0])
+            return job[1]
+        return None
+
+    def _check_workers(self):
+        """ Replace the dead workers, dropping the job they were on. """
+        lost_jobs = []
+        with self.lock:
+            if not self.running:
+                return
+            for worker, current_job in list(self.workers.items()):
+                if worker.exitcode is None:
+                    continue
+                LOG.error("Transcriber process exited with code " +
+                          str(worker.exitcode) + ", restarting it")
+                del self.workers[worker]
+                lost_jobs.append(current_job.value)
+                self._start_worker()
+        for job_id in lost_jobs:
+            # The result may have been sent just before exiting
+            if job_id >= 0 and self._finish_job(job_id):
+                LOG.error("Utterance lost with the transcriber process")
+
+    def _handle_results(self):
+        while True:
+            try:
+                result = self.results.get(timeout=self.CHECK_SEC)
+            except Empty:
+                self._check_workers()
+                continue
+            if result is None:
+                break
+            job_id, slot, hypstr, decode_time = result
+            callback = self._finish_job(job_id)
+            if callback:
+                try:
+                    callback(hypstr, decode_time)
+                except Exception as e:
+                    LOG.exception(e)
+            self._check_workers()
+
+    def shutdown(self):
+        """ Stop the workers once they are done with queued audio. """
+        with self.lock:
+            self.running = False
+            workers = list(self.workers)
+        for _ in workers:
+            self.tasks.put(None)
+        for worker in workers:
+            worker.join()
+        self.results.put(None)
+        self.result_thread.join()
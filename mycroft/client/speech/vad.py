@@ -0,0 +1,223 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import audioop
+import math
+from collections import deque
+
+from mycroft.util.log import LOG
+
+
+class VADEngine(object):
+    """Voice activity detection on chunks of raw audio.
+
+    The base engine is the energy heuristic used by the ResponsiveRecognizer:
+    a chunk is speech when its RMS is above the recognizer's dynamic energy
+    threshold.
+
+    Args:
+        config (dict): listener.vad configuration
+        sample_rate (int): sample rate of the audio
+    """
+
+    def __init__(self, config=None, sample_rate=16000):
+        self.config = config or {}
+        self.sample_rate = sample_rate
+
+    def calc_energy(self, chunk, sample_width):
+        """Calculate the energy of a chunk, comparable to energy_threshold.
+
+        Args:
+            chunk (str): raw audio
+            sample_width (int): bytes per sample
+
+        Returns:
+            float: RMS of the chunk
+        """
+        return audioop.rms(chunk, sample_width)
+
+    def is_speech(self, chunk, energy, threshold):
+        """Decide if a chunk of audio contains speech.
+
+        Args:
+            chunk (str): raw audio
+            energy (float): energy of the chunk as returned by calc_energy()
+            threshold (float): current energy threshold of the recognizer
+
+        Returns:
+            bool: True if the chunk contains speech
+        """
+        return energy > threshold
+
+
+class SpectralVAD(VADEngine):
+    """Frame level VAD using spectral energy and zero-crossing rate.
+
+    Each chunk is split into short frames which are all processed at once
+    with NumPy.  A frame is speech when the energy in the speech band is
+    well above an adaptive estimate of the noise floor and its zero-crossing
+    rate is not noise-like.  A chunk is speech when enough of its frames are.
+    The recognizer's energy threshold is not used.
+    """
+
+    def __init__(self, config=None, sample_rate=16000):
+        super(SpectralVAD, self).__init__(config, sample_rate)
+        import numpy
+        self.np = numpy
+
+        frame_ms = self.config.get("frame_ms", 20)
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.snr = 10 ** (self.config.get("snr_db", 6.0) / 10.0)
+        self.max_zcr = self.config.get("max_zcr", 0.35)
+        self.speech_frame_ratio = self.config.get("speech_frame_ratio", 0.3)
+        # How fast the noise floor follows the level of non-speech frames
+        self.noise_adaptation = self.config.get("noise_adaptation", 0.05)
+        # How fast the noise floor rises while speech is detected, so that a
+        # persistent change in background noise is eventually accepted
+        self.noise_rise = 10 ** (self.config.get("noise_rise_db", 1.0) / 10.0)
+
+        low, high = self.config.get("band", [300, 3400])
+        freqs = numpy.fft.rfftfreq(self.frame_size, 1.0 / sample_rate)
+        self.band = (freqs >= low) & (freqs <= high)
+        self.window = numpy.hanning(self.frame_size)
+        self.noise_floor = None
+
+        self.sample_width = 2
+        self._chunk = None
+        self._samples = None
+
+    def _get_samples(self, chunk, sample_width):
+        # calc_energy() and is_speech() are called on the same chunk
+        if chunk is not self._chunk or sample_width != self.sample_width:
+            dtype = {1: self.np.int8, 2: self.np.int16, 4: self.np.int32}
+            self._samples = self.np.frombuffer(
+                chunk, dtype=dtype[sample_width]).astype(self.np.float64)
+            self._chunk = chunk
+            self.sample_width = sample_width
+        return self._samples
+
+    def calc_energy(self, chunk, sample_width):
+        samples = self._get_samples(chunk, sample_width)
+        if len(samples) == 0:
+            return 0
+        return self.np.sqrt(self.np.mean(samples * samples))
+
+    def is_speech(self, chunk, energy, threshold):
+        samples = self._get_samples(chunk, self.sample_width)
+        num_frames = len(samples) // self.frame_size
+        if num_frames == 0:
+            return False  # e.g. muted stream
+        np = self.np
+        # Any remainder shorter than a frame is ignored
+        frames = samples[:num_frames * self.frame_size].reshape(
+            num_frames, self.frame_size)
+
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        band_energy = spectrum[:, self.band].sum(axis=1) + 1.0
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        if self.noise_floor is None:
+            self.noise_floor = band_energy.min()
+
+        speech = ((band_energy > self.noise_floor * self.snr) &
+                  (zcr < self.max_zcr))
+
+        sec_per_chunk = float(len(samples)) / self.sample_rate
+        noise = band_energy[~speech]
+        if len(noise) > 0:
+            level = noise.mean()
+            if level < self.noise_floor:
+                self.noise_floor = level
+            else:
+                self.noise_floor += (self.noise_adaptation *
+                                     (level - self.noise_floor))
+        else:
+            self.noise_floor *= self.noise_rise ** sec_per_chunk
+
+        return speech.mean() >= self.speech_frame_ratio
+
+
+class NoiseFloorEstimator(object):
+    """Continuous estimate of the background noise energy.
+
+    Uses minimum statistics: chunk energies are smoothed and the noise floor
+    is the minimum of the smoothed energy over the last window_sec.  Pauses
+    between words are enough to track it, so it can run on all the audio,
+    speech included.  The window is split in blocks for old minima to expire
+    and the floor to rise when the background gets louder.
+
+    Args:
+        window_sec (float): seconds of audio the minimum is taken over
+        num_blocks (int): number of blocks the window is split in
+        time_constant (float): seconds the smoothing averages over
+    """
+
+    def __init__(self, window_sec=5.0, num_blocks=5, time_constant=0.1):
+        self.block_sec = float(window_sec) / num_blocks
+        self.time_constant = time_constant
+        self.blocks = deque(maxlen=num_blocks - 1)
+        self.block_min = None
+        self.block_elapsed = 0.0
+        self.smoothed = None
+
+    @property
+    def floor(self):
+        """ float: energy of the background noise, None if unknown yet """
+        minima = list(self.blocks)
+        if self.block_min is not None:
+            minima.append(self.block_min)
+        return min(minima) if minima else None
+
+    def update(self, energy, sec_per_buffer):
+        """Add the energy of a chunk to the estimate.
+
+        Args:
+            energy (float): energy of the chunk
+            sec_per_buffer (float): duration of the chunk
+        """
+        if energy <= 0:
+            return  # Muted, not representative of the background
+        if self.smoothed is None:
+            self.smoothed = float(energy)
+        else:
+            decay = math.exp(-sec_per_buffer / self.time_constant)
+            self.smoothed = decay * self.smoothed + (1 - decay) * energy
+        if self.block_min is None or self.smoothed < self.block_min:
+            self.block_min = self.smoothed
+        self.block_elapsed += sec_per_buffer
+        if self.block_elapsed >= self.block_sec:
+            self.blocks.append(self.block_min)
+            self.block_min = None
+            self.block_elapsed = 0.0
+
+
+class VADFactory(object):
+    CLASSES = {
+        "energy": VADEngine,
+        "spectral": SpectralVAD
+    }
+
+    @staticmethod
+    def create(config=None, sample_rate=16000):
+        config = config or {}
+        module = config.get("module", "energy")
+        clazz = VADFactory.CLASSES.get(module, VADEngine)
+        try:
+            return clazz(config.get(module, {}), sample_rate)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            LOG.exception('Could not create VAD. Falling back to default.')
+            return VADEngine(sample_rate=sample_rate)
@@ -33,8 +33,8 @@ import json                                                 # nopep8
 from threading import Thread, Lock                          # nopep8
 from mycroft.messagebus.client.ws import WebsocketClient    # nopep8
 from mycroft.messagebus.message import Message              # nopep8
-from mycroft.util import get_ipc_directory                  # nopep8
 from mycroft.util.log import LOG                      # nopep8
+from mycroft.util.meter import MicMeter                     # nopep8
 
 ws = None
 mutex = Lock()
@@ -195,47 +195,26 @@ def start_log_monitor(filename):
 
 
 class MicMonitorThread(Thread):
-    def __init__(self, filename):
+    def __init__(self, meter):
         Thread.__init__(self)
-        self.filename = filename
-        self.st_results = os.stat(filename)
+        self.meter = meter
 
     def run(self):
-        while True:
-            try:
-                st_results = os.stat(self.filename)
-
-                if (not st_results.st_ctime == self.st_results.st_ctime or
-                        not st_results.st_mtime == self.st_results.st_mtime):
-                    self.read_file_from(0)
-                    self.st_results = st_results
-                    draw_screen()
-            finally:
-                time.sleep(0.1)
-
-    def read_file_from(self, bytefrom):
         global meter_cur
         global meter_thresh
 
-        with open(self.filename, 'rb') as fh:
-            fh.seek(bytefrom)
-            while True:
-                line = fh.readline()
-                if line == "":
-                    break
-
-                # Just adjust meter settings
-                # Ex:Energy:  cur=4 thresh=1.5
-                parts = line.split("=")
-                meter_thresh = float(parts[len(parts) - 1])
-                meter_cur = float(parts[len(parts) - 2].split(" ")[0])
+        seq = None
+        while True:
+            # Polls the shared memory meter, no file access once mapped
+            level = self.meter.wait(seq, interval=0.1)
+            meter_cur, meter_thresh, _, seq = level
+            draw_screen()
 
 
-def start_mic_monitor(filename):
-    if os.path.isfile(filename):
-        thread = MicMonitorThread(filename)
-        thread.setDaemon(True)  # this thread won't prevent prog from exiting
-        thread.start()
+def start_mic_monitor(meter):
+    thread = MicMonitorThread(meter)
+    thread.setDaemon(True)  # this thread won't prevent prog from exiting
+    thread.start()
 
 
 def add_log_message(message):
@@ -894,8 +873,8 @@ start_log_monitor(localLogPath + "/mycroft-voice.log")
 start_log_monitor("/var/log/mycroft-skills.log")
 start_log_monitor("/var/log/mycroft-speech-client.log")
 
-# Monitor IPC file containing microphone level info
-start_mic_monitor(os.path.join(get_ipc_directory(), "mic_level"))
+# Monitor the microphone level published by the speech client
+start_mic_monitor(MicMeter())
 
 
 def main():
@@ -11,3 +11,24 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+#
+from os.path import isabs, join
+
+from mycroft.util import get_ipc_directory
+
+
+def build_socket_path(unix_socket):
+    """Get the path of the Unix domain socket of the bus.
+
+    Args:
+        unix_socket (str): websocket.unix_socket setting, relative to the
+                           IPC directory
+
+    Returns:
+        str: path of the socket, None if disabled
+    """
+    if not unix_socket:
+        return None
+    if isabs(unix_socket):
+        return unix_socket
+    return join(get_ipc_directory(), unix_socket)
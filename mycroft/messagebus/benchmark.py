@@ -0,0 +1,250 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Compare the cost of the message bus wire formats and transports.
+
+For a few typical messages, reports the serialized size and the CPU time
+to encode and decode them, then the time to send one message from a client
+to RECEIVERS clients: encoding by the sender, routing (and translation
+between formats) by the bus, and decoding by every receiver.  No network
+is involved, the bus connections are replaced by in-memory ones.  Log
+output is discarded, the cost of formatting it is included.
+
+With "transport", a bus is started in another process listening to TCP
+and to a Unix domain socket, and a client sends itself MESSAGES messages
+through it over each transport: one at a time for the round trip latency,
+then all at once for the throughput.
+
+Usage:
+    python -m mycroft.messagebus.benchmark [RECEIVERS]
+    python -m mycroft.messagebus.benchmark transport [MESSAGES]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+from threading import Event, Thread
+
+from os.path import join
+from tornado import ioloop, web
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_unix_socket
+
+from mycroft.messagebus.client.ws import WebsocketClient
+from mycroft.messagebus.message import Message, JSON, MSGPACK, \
+    available_formats
+from mycroft.messagebus.service import ws as service
+from mycroft.util.log import LOG
+
+REPEAT = 2000
+
+
+def sample_messages():
+    intent = {
+        'name': 'WeatherSkill:CurrentWeatherIntent',
+        'requires': [['WeatherKeyword', 'WeatherKeyword']],
+        'at_least_one': [],
+        'optional': [['Location', 'Location'], ['Time', 'Time']]
+    }
+    skills = dict(('skill-%d' % i, {
+        'name': 'Skill %d' % i,
+        'path': '/opt/mycroft/skills/skill-%d' % i,
+        'active': i % 3 != 0,
+        'intents': [dict(intent, name='skill-%d:Intent%d' % (i, j))
+                    for j in range(4)]
+    }) for i in range(40))
+    return [
+        Message('enclosure.mouth.viseme',
+                {'code': '3', 'until': 1512345678.125}),
+        Message('mycroft.audio.service.track_info_reply', {
+            'artist': 'The Beatles', 'album': 'Abbey Road',
+            'track': 'Here Comes the Sun', 'length': 185.7,
+            'image': 'https://example.com/covers/abbey-road.jpg'
+        }),
+        Message('register_intent', intent),
+        Message('mycroft.skills.list', skills, {'source': 'skills'})
+    ]
+
+
+class BenchmarkConnection(service.WebsocketEventHandler):
+    """ Bus connection which decodes what it receives. """
+
+    def __init__(self, fmt):
+        self.emitter = service.EventBusEmitter
+        self.format = fmt
+
+    def write_message(self, message, binary=False):
+        Message.deserialize(message)
+
+
+def measure(func, repeat=REPEAT):
+    """ CPU microseconds per call of func. """
+    start = time.clock()
+    for _ in range(repeat):
+        func()
+    return 1e6 * (time.clock() - start) / repeat
+
+
+def fan_out(message, sender_format, receiver_formats):
+    """Time sending message through the bus to the given receivers.
+
+    Returns:
+        float: CPU microseconds per message
+    """
+    sender = BenchmarkConnection(sender_format)
+    receivers = [BenchmarkConnection(fmt) for fmt in receiver_formats]
+    for connection in [sender] + receivers:
+        service.subscriptions.add(connection)
+    # The sender doesn't listen to what it sends
+    service.subscriptions.subscribe(sender, [])
+    try:
+        return measure(lambda: sender.on_message(
+            message.serialize(sender_format)), REPEAT / 10)
+    finally:
+        for connection in [sender] + receivers:
+            service.subscriptions.remove(connection)
+
+
+def main(receivers):
+    LOG.handler.stream = open(os.devnull, 'w')
+    formats = available_formats()
+    if MSGPACK not in formats:
+        print("msgpack is not installed, only measuring JSON")
+
+    print("%-40s %-8s %8s %10s %10s" % ("message", "format", "bytes",
+                                        "encode us", "decode us"))
+    messages = sample_messages()
+    for message in messages:
+        for fmt in formats:
+            data = message.serialize(fmt)
+            print("%-40s %-8s %8d %10.1f %10.1f" % (
+                message.type[:40], fmt, len(data),
+                measure(lambda: message.serialize(fmt)),
+                measure(lambda: Message.deserialize(data))))
+
+    print("")
+    print("Sending to %d receivers, us per message" % receivers)
+    setups = [(fmt, fmt) for fmt in formats]
+    if MSGPACK in formats:
+        setups.append((MSGPACK, 'mixed'))
+    print("%-40s %s" % ("message", " ".join("%14s" % (sender + '->' + to)
+                                            for sender, to in setups)))
+    for message in messages:
+        times = []
+        for sender, to in setups:
+            if to == 'mixed':
+                receiver_formats = [JSON, MSGPACK] * (receivers // 2) + \
+                    [JSON] * (receivers % 2)
+            else:
+                receiver_formats = [to] * receivers
+            times.append(fan_out(message, sender, receiver_formats))
+        print("%-40s %s" % (message.type[:40],
+                            " ".join("%14.1f" % t for t in times)))
+
+
+def run_bus(port, socket_path):
+    LOG.handler.stream = open(os.devnull, 'w')
+    application = web.Application([('/core', service.WebsocketEventHandler)])
+    application.listen(port, '127.0.0.1')
+    HTTPServer(application).add_socket(bind_unix_socket(socket_path))
+    ioloop.IOLoop.instance().start()
+
+
+def measure_transport(socket_path, port, messages):
+    """Send messages to the bus and back.
+
+    Args:
+        socket_path (str): Unix domain socket of the bus, None for TCP
+        port (int): TCP port of the bus
+
+    Returns:
+        tuple: (round trip latencies in seconds, messages per second)
+    """
+    ws = WebsocketClient('127.0.0.1', port, '/core')
+    ws.socket_path = socket_path
+    ws.client = ws.create_client()
+    received = [0]
+    expected = [1]
+    done = Event()
+
+    def on_echo(message):
+        received[0] += 1
+        if received[0] >= expected[0]:
+            done.set()
+
+    ws.on('benchmark.echo', on_echo)
+    connected = Event()
+    ws.once('open', connected.set)
+    thread = Thread(target=ws.run_forever)
+    thread.daemon = True
+    thread.start()
+    connected.wait(10)
+    message = Message('benchmark.echo', {'utterance': 'what time is it'})
+    # Let the subscription and format negotiation go through
+    time.sleep(0.5)
+
+    latencies = []
+    for i in range(messages):
+        done.clear()
+        expected[0] = received[0] + 1
+        start = time.time()
+        ws.emit(message)
+        done.wait(5)
+        latencies.append(time.time() - start)
+
+    done.clear()
+    expected[0] = received[0] + messages
+    start = time.time()
+    for i in range(messages):
+        ws.emit(message)
+    done.wait(60)
+    throughput = messages / (time.time() - start)
+    ws.close()
+    return sorted(latencies), throughput
+
+
+def main_transport(messages):
+    directory = tempfile.mkdtemp()
+    socket_path = join(directory, 'bus.sock')
+    port = 18181
+    bus = Process(target=run_bus, args=(port, socket_path))
+    bus.daemon = True
+    bus.start()
+    time.sleep(2)
+    LOG.handler.stream = open(os.devnull, 'w')
+    try:
+        print("%-10s %12s %12s %12s %12s" % ("transport", "mean ms",
+                                             "median ms", "p90 ms",
+                                             "messages/s"))
+        for name, path in (('tcp', None), ('unix', socket_path)):
+            latencies, throughput = measure_transport(path, port, messages)
+            print("%-10s %12.3f %12.3f %12.3f %12.0f" % (
+                name, 1000 * sum(latencies) / len(latencies),
+                1000 * latencies[len(latencies) // 2],
+                1000 * latencies[int(len(latencies) * 0.9)], throughput))
+    finally:
+        bus.terminate()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'transport':
+        main_transport(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+    elif len(sys.argv) > 2:
+        print(__doc__)
+        sys.exit(1)
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -13,48 +13,154 @@
 # limitations under the License.
 #
 import json
+import socket
 import time
+from collections import Counter
 from multiprocessing.pool import ThreadPool
+from threading import Lock
 
+import os
 from pyee import EventEmitter
-from websocket import WebSocketApp
+from websocket import ABNF, WebSocket, WebSocketApp, WebSocketException, \
+    handshake, parse_url
 
 from mycroft.configuration import Configuration
-from mycroft.messagebus.message import Message
+from mycroft.messagebus import build_socket_path
+from mycroft.messagebus.message import Message, SUBSCRIBE, UNSUBSCRIBE, \
+    ALL, JSON, MSGPACK, SET_FORMAT, FORMAT, available_formats, is_msgpack, \
+    parse_header
 from mycroft.util import validate_param
 from mycroft.util.log import LOG
 
 
+class UnixSocketApp(WebSocketApp):
+    """
+    UnixSocketApp
+    WebSocketApp connected to the bus through a Unix domain socket instead
+    of TCP.
+
+    Args:
+        path (str): path of the socket
+        url (str): websocket url, for the handshake headers
+    """
+
+    def __init__(self, path, url, **kwargs):
+        super(UnixSocketApp, self).__init__(url, **kwargs)
+        self.path = path
+
+    def run_forever(self):
+        if self.sock:
+            raise WebSocketException("socket is already opened")
+        close_frame = None
+        try:
+            self.sock = WebSocket(self.get_mask_key)
+            self.sock.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.sock.connect(self.path)
+            hostname, port, resource, _ = parse_url(self.url)
+            self.sock.handshake_response = handshake(
+                self.sock.sock, hostname, port, resource,
+                header=self.header, cookie=self.cookie)
+            self.sock.connected = True
+            self._callback(self.on_open)
+
+            while self.sock.connected and self.keep_running:
+                op_code, frame = self.sock.recv_data_frame()
+                if op_code == ABNF.OPCODE_CLOSE:
+                    close_frame = frame
+                    break
+                self._callback(self.on_message, frame.data)
+        except Exception as e:
+            # Reading fails as well when closed by close()
+            if self.keep_running:
+                self._callback(self.on_error, e)
+        finally:
+            self.sock.close()
+            self._callback(self.on_close, *self._get_close_args(
+                close_frame.data if close_frame else None))
+            self.sock = None
+
+
 class WebsocketClient(object):
-    def __init__(self, host=None, port=None, route=None, ssl=None):
+    """
+    WebsocketClient
+    Connection to the message bus.
+
+    The bus only sends the messages this client has handlers for: on(),
+    once() and remove() keep the subscriptions of the connection up to
+    date.  Messages are sent with MessagePack once the bus accepted it, if
+    websocket.format asks for it and msgpack is installed.  The Unix
+    domain socket of the bus is used instead of TCP when it exists and
+    websocket.unix_socket is set.
+
+    Received messages nobody listens to are dropped from their header,
+    without decoding them nor handing them to the handler threads, and
+    counted by type in dropped.
+
+    Besides message types, the following events can be listened to:
+        open, close, error: state of the connection
+        message: every message sent on the bus, as a JSON string.
+                 Listening to it subscribes to all messages.
+        received: the messages received by this client, as JSON strings
+    """
+    # Events which are not messages from the bus
+    LOCAL_EVENTS = ('open', 'close', 'error', 'received')
+
+    def __init__(self, host=None, port=None, route=None, ssl=None,
+                 fmt=None):
 
         config = Configuration.get().get("websocket")
         host = host or config.get("host")
         port = port or config.get("port")
         route = route or config.get("route")
         ssl = ssl or config.get("ssl")
+        fmt = fmt or config.get("format", JSON)
         validate_param(host, "websocket.host")
         validate_param(port, "websocket.port")
         validate_param(route, "websocket.route")
 
         self.url = WebsocketClient.build_url(host, port, route, ssl)
+        self.socket_path = build_socket_path(config.get("unix_socket"))
         self.emitter = EventEmitter()
         self.client = self.create_client()
         self.pool = ThreadPool(10)
         self.retry = 5
+        self.subscriptions = set()
+        self.subscriptions_lock = Lock()
+        self.dropped = Counter()  # Message type -> messages not handled
+        if fmt not in available_formats():
+            LOG.debug("Wire format " + fmt + " not available, using JSON")
+            fmt = JSON
+        self.preferred_format = fmt
+        self.format = JSON  # Until the bus accepts preferred_format
 
     @staticmethod
     def build_url(host, port, route, ssl):
         scheme = "wss" if ssl else "ws"
         return scheme + "://" + host + ":" + str(port) + route
 
-    def create_client(self):
-        return WebSocketApp(self.url,
-                            on_open=self.on_open, on_close=self.on_close,
-                            on_error=self.on_error, on_message=self.on_message)
+    def create_client(self, unix_socket=True):
+        """Create the connection to the bus.
+
+        Args:
+            unix_socket (bool): False to use TCP even if the bus listens to
+                                a Unix domain socket
+        """
+        callbacks = dict(on_open=self.on_open, on_close=self.on_close,
+                         on_error=self.on_error, on_message=self.on_message)
+        # TCP if the bus doesn't listen to the socket or it isn't accessible
+        if unix_socket and self.socket_path and \
+                os.access(self.socket_path, os.R_OK | os.W_OK):
+            return UnixSocketApp(self.socket_path, self.url, **callbacks)
+        return WebSocketApp(self.url, **callbacks)
 
     def on_open(self, ws):
         LOG.info("Connected")
+        # The bus has no subscriptions and uses JSON for a new connection
+        self.format = JSON
+        with self.subscriptions_lock:
+            self.emit(Message(SUBSCRIBE, {'topics': list(self.subscriptions)}))
+        if self.preferred_format != JSON:
+            self.emit(Message(SET_FORMAT, {'format': self.preferred_format}))
         self.emitter.emit("open")
         # Restore reconnect timer to 5 seconds on sucessful connect
         self.retry = 5
@@ -68,35 +174,112 @@ class WebsocketClient(object):
             self.client.close()
         except Exception, e:
             LOG.error(repr(e))
-        LOG.warning("WS Client will reconnect in %d seconds." % self.retry)
-        time.sleep(self.retry)
-        self.retry = min(self.retry * 2, 60)
-        self.client = self.create_client()
+        if isinstance(ws, UnixSocketApp) and isinstance(error, socket.error):
+            # The socket may be left by a bus which isn't running anymore,
+            # or listening to TCP only
+            LOG.warning("Bus socket unavailable, connecting with TCP")
+            self.client = self.create_client(unix_socket=False)
+        else:
+            LOG.warning("WS Client will reconnect in %d seconds." %
+                        self.retry)
+            time.sleep(self.retry)
+            self.retry = min(self.retry * 2, 60)
+            self.client = self.create_client()
         self.run_forever()
 
     def on_message(self, ws, message):
-        self.emitter.emit('message', message)
-        parsed_message = Message.deserialize(message)
-        self.pool.apply_async(
-            self.emitter.emit, (parsed_message.type, parsed_message))
+        # Decoded at most once, when needed.  The bus only checks the
+        # header, messages whose data can't be decoded are dropped here.
+        parsed = []
+
+        def deserialize():
+            if not parsed:
+                try:
+                    parsed.append(Message.deserialize(message))
+                except Exception as e:
+                    LOG.error("Dropped a malformed message: " + repr(e))
+                    parsed.append(None)
+            return parsed[0]
+
+        header = parse_header(message)
+        if header is None:
+            if deserialize() is None:
+                return
+            msg_type = deserialize().type
+        else:
+            msg_type = header[0]
+
+        # The frame as received, to be logged
+        self.emitter.emit('received', message)
+        if self.emitter.listeners('message'):
+            text = message
+            if is_msgpack(message):
+                if deserialize() is None:
+                    return
+                text = deserialize().serialize()
+            self.emitter.emit('message', text)
+
+        if msg_type == FORMAT and deserialize():
+            fmt = deserialize().data.get('format')
+            self.format = fmt if fmt in available_formats() else JSON
+
+        if not self.emitter.listeners(msg_type):
+            self.dropped[msg_type] += 1
+            if msg_type in self.subscriptions:
+                self.update_subscription(msg_type)
+            return
+        if deserialize() is not None:
+            self.pool.apply_async(self.dispatch, (deserialize(),))
+
+    def dispatch(self, message):
+        self.emitter.emit(message.type, message)
+        # Unsubscribe once the once() handlers are done
+        if not self.emitter.listeners(message.type):
+            self.update_subscription(message.type)
+
+    def update_subscription(self, event_name):
+        """Subscribe to or unsubscribe from the messages of an event.
+
+        Args:
+            event_name (str): event whose listeners changed
+        """
+        if event_name in self.LOCAL_EVENTS:
+            return
+        topic = ALL if event_name == 'message' else event_name
+        with self.subscriptions_lock:
+            listening = len(self.emitter.listeners(event_name)) > 0
+            if listening == (topic in self.subscriptions):
+                return
+            if listening:
+                self.subscriptions.add(topic)
+            else:
+                self.subscriptions.discard(topic)
+            self.emit(Message(SUBSCRIBE if listening else UNSUBSCRIBE,
+                              {'topics': [topic]}))
 
     def emit(self, message):
         if (not self.client or not self.client.sock or
                 not self.client.sock.connected):
             return
         if hasattr(message, 'serialize'):
-            self.client.send(message.serialize())
+            fmt = self.format
+            self.client.send(message.serialize(fmt),
+                             ABNF.OPCODE_BINARY if fmt == MSGPACK else
+                             ABNF.OPCODE_TEXT)
         else:
             self.client.send(json.dumps(message.__dict__))
 
     def on(self, event_name, func):
         self.emitter.on(event_name, func)
+        self.update_subscription(event_name)
 
     def once(self, event_name, func):
         self.emitter.once(event_name, func)
+        self.update_subscription(event_name)
 
     def remove(self, event_name, func):
         self.emitter.remove_listener(event_name, func)
+        self.update_subscription(event_name)
 
     def remove_all_listeners(self, event_name):
         '''
@@ -108,6 +291,7 @@ class WebsocketClient(object):
         if event_name is None:
             raise ValueError
         self.emitter.remove_all_listeners(event_name)
+        self.update_subscription(event_name)
 
     def run_forever(self):
         self.client.run_forever()
@@ -13,6 +13,120 @@
 # limitations under the License.
 #
 import json
+import re
+
+try:
+    import msgpack
+    if msgpack.version < (0, 5, 2):
+        msgpack = None  # Can't decode strings as unicode, raw=False
+except ImportError:
+    msgpack = None
+
+# Messages of the subscription protocol, handled by the bus itself
+SUBSCRIBE = 'mycroft.bus.subscribe'
+UNSUBSCRIBE = 'mycroft.bus.unsubscribe'
+# Subscription topic matching all messages
+ALL = '*'
+
+# Wire formats.  Messages are JSON unless a connection negotiated
+# MessagePack by sending SET_FORMAT, which the bus answers with FORMAT
+JSON = 'json'
+MSGPACK = 'msgpack'
+SET_FORMAT = 'mycroft.bus.set_format'
+FORMAT = 'mycroft.bus.format'
+
+
+def available_formats():
+    """ Get the wire formats this process can encode and decode. """
+    return [JSON, MSGPACK] if msgpack else [JSON]
+
+
+def is_msgpack(value):
+    """Tell if a serialized message is MessagePack.
+
+    A message is a map, which starts with a byte in 0x80-0x8f, 0xde or
+    0xdf in MessagePack, while JSON objects start with "{".
+    """
+    first = ord(value[0]) if value else 0
+    return 0x80 <= first <= 0x8f or first in (0xde, 0xdf)
+
+
+def describe(value):
+    """Get the text logged for a serialized message.
+
+    JSON messages are logged as they are, MessagePack ones are summarized
+    by their type and size.
+    """
+    if not is_msgpack(value):
+        return value
+    header = parse_header(value)
+    return '%s (%d bytes MessagePack)' % (header[0] if header else None,
+                                          len(value))
+
+
+# Start of the JSON messages serialized by Message, up to the context
+_JSON_HEADER = re.compile(r'{"type": ("(?:[^"\\]|\\.)*"), "context": ')
+_JSON_DATA = ', "data": '
+_json_decoder = json.JSONDecoder()
+_json_encode = json.JSONEncoder().encode
+# Errors of malformed MessagePack, besides ValueError
+_MSGPACK_ERRORS = (msgpack.UnpackException,) if msgpack else ()
+# Up to this size, decoding a whole MessagePack message is faster than
+# reading its header with an Unpacker
+_SMALL_MSGPACK = 512
+
+
+def parse_header(value):
+    """Get the type and context of a serialized message without decoding
+    its data.
+
+    Only works for JSON messages serialized with the header first, as
+    Message.serialize() does.  Truncated messages are rejected by a check
+    of their structure, the data isn't decoded so the receivers still have
+    to drop messages whose data is malformed.
+
+    Args:
+        value (str): serialized message
+
+    Returns:
+        tuple: (type, context), None if the header can't be read without
+               decoding the whole message or the message is truncated
+    """
+    try:
+        if is_msgpack(value):
+            if not msgpack:
+                return None
+            if len(value) <= _SMALL_MSGPACK:
+                obj = msgpack.unpackb(value, raw=False)
+                return obj.get('type'), obj.get('context')
+            unpacker = msgpack.Unpacker(raw=False)
+            unpacker.feed(value)
+            header = {}
+            for _ in range(unpacker.read_map_header()):
+                key = unpacker.unpack()
+                if key in ('type', 'context'):
+                    header[key] = unpacker.unpack()
+                else:
+                    unpacker.skip()
+            if unpacker.tell() != len(value):
+                return None
+            return header.get('type'), header.get('context')
+        match = _JSON_HEADER.match(value)
+        if not match or not value.endswith('}'):
+            return None
+        context, end = _json_decoder.raw_decode(value, match.end())
+        if not value.startswith(_JSON_DATA, end):
+            return None
+        return json.loads(match.group(1)), context
+    except (ValueError, TypeError) + _MSGPACK_ERRORS:
+        return None
+
+
+if msgpack:
+    # 3 entries map and the keys, in the order of the JSON messages
+    _MSGPACK_HEADER = '\x83' + msgpack.packb('type')
+    _MSGPACK_CONTEXT = msgpack.packb('context')
+    _MSGPACK_DATA = msgpack.packb('data')
 
 
 class Message(object):
@@ -37,20 +151,27 @@ class Message(object):
         self.data = data
         self.context = context
 
-    def serialize(self):
+    def serialize(self, fmt=JSON):
         """This returns a string of the message info.
 
         This makes it easy to send over a websocket. This uses
-        json dumps to generate the string with type, data and context
+        json dumps to generate the string with type, context and data, in
+        that order so the bus can read the header without decoding the data
+
+        Args:
+            fmt (str): wire format, JSON or MSGPACK
 
         Returns:
-            str: a json string representation of the message.
+            str: a json string representation of the message, or the
+                 MessagePack bytes
         """
-        return json.dumps({
-            'type': self.type,
-            'data': self.data,
-            'context': self.context
-        })
+        if fmt == MSGPACK:
+            return (_MSGPACK_HEADER + msgpack.packb(self.type) +
+                    _MSGPACK_CONTEXT + msgpack.packb(self.context) +
+                    _MSGPACK_DATA + msgpack.packb(self.data))
+        return '{"type": %s, "context": %s, "data": %s}' % (
+            _json_encode(self.type), _json_encode(self.context),
+            _json_encode(self.data))
 
     @staticmethod
     def deserialize(value):
@@ -63,12 +184,17 @@ class Message(object):
         Args:
             value(str): This is the json string received from the websocket
 
+        MessagePack messages are recognized and decoded as well.
+
         Returns:
             Message: message object constructed from the json string passed
             int the function.
             value(str): This is the string received from the websocket
         """
-        obj = json.loads(value)
+        if is_msgpack(value):
+            obj = msgpack.unpackb(value, raw=False)
+        else:
+            obj = json.loads(value)
         return Message(obj.get('type'), obj.get('data'), obj.get('context'))
 
     def reply(self, type, data, context={}):
@@ -12,10 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import os
+from signal import SIGTERM
+
 from tornado import autoreload, web, ioloop
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_unix_socket
 
 from mycroft.configuration import Configuration
-from mycroft.lock import Lock  # creates/supports PID locking file
+from mycroft.lock import Lock, Signal  # creates/supports PID locking file
+from mycroft.messagebus import build_socket_path
 from mycroft.messagebus.service.ws import WebsocketEventHandler
 from mycroft.util import validate_param
 
@@ -25,6 +31,14 @@ settings = {
 }
 
 
+def remove_socket(path):
+    """ Remove the Unix domain socket, clients then connect with TCP. """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 def main():
     import tornado.options
     lock = Lock("service")
@@ -36,6 +50,7 @@ def main():
 
     autoreload.add_reload_hook(reload_hook)
 
+    ignore_logs = Configuration.get().get("ignore_logs", [])
     config = Configuration.get().get("websocket")
 
     host = config.get("host")
@@ -46,11 +61,22 @@ def main():
     validate_param(route, "websocket.route")
 
     routes = [
-        (route, WebsocketEventHandler)
+        (route, WebsocketEventHandler, {'ignore_logs': ignore_logs})
     ]
     application = web.Application(routes, **settings)
     application.listen(port, host)
-    ioloop.IOLoop.instance().start()
+    # Faster transport for the clients on this machine
+    socket_path = build_socket_path(config.get("unix_socket"))
+    if socket_path:
+        server = HTTPServer(application)
+        server.add_socket(bind_unix_socket(socket_path))
+        # Kept referenced, the handler is removed when collected
+        sigterm = Signal(SIGTERM, lambda: remove_socket(socket_path))
+    try:
+        ioloop.IOLoop.instance().start()
+    finally:
+        if socket_path:
+            remove_socket(socket_path)
 
 
 if __name__ == "__main__":
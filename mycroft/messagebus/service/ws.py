@@ -13,58 +13,203 @@
 # limitations under the License.
 #
 import json
+import logging
 import sys
 import traceback
 
 import tornado.websocket
 from pyee import EventEmitter
 
-from mycroft.messagebus.message import Message
+from mycroft.messagebus.message import Message, SUBSCRIBE, UNSUBSCRIBE, \
+    ALL, JSON, MSGPACK, SET_FORMAT, FORMAT, available_formats, is_msgpack, \
+    parse_header, describe
 from mycroft.util.log import LOG
 
 
 EventBusEmitter = EventEmitter()
 
+
+class Subscriptions(object):
+    """
+    Subscriptions
+    Index of the connections interested in each message type.
+
+    Topics are message types, "prefix*" for all the types starting with
+    prefix, and "*" for all messages.  Connections which never subscribed
+    receive all messages, as clients predating subscriptions expect.
+    """
+
+    def __init__(self):
+        self.types = {}  # Message type -> set of connections
+        self.prefixes = {}  # Prefix -> set of connections
+        self.topics = {}  # Connection -> set of topics
+        self.everything = set()  # Connections which never subscribed
+
+    def add(self, client):
+        self.everything.add(client)
+
+    def remove(self, client):
+        self.unsubscribe(client, list(self.topics.get(client, [])))
+        del self.topics[client]
+        self.everything.discard(client)
+
+    def _index(self, topic):
+        if topic.endswith(ALL):
+            return self.prefixes, topic[:-1]
+        return self.types, topic
+
+    def subscribe(self, client, topics):
+        self.everything.discard(client)
+        client_topics = self.topics.setdefault(client, set())
+        for topic in topics:
+            index, key = self._index(topic)
+            index.setdefault(key, set()).add(client)
+            client_topics.add(topic)
+
+    def unsubscribe(self, client, topics):
+        self.everything.discard(client)
+        client_topics = self.topics.setdefault(client, set())
+        for topic in topics:
+            index, key = self._index(topic)
+            clients = index.get(key)
+            if clients:
+                clients.discard(client)
+                if not clients:
+                    del index[key]
+            client_topics.discard(topic)
+
+    def clients(self, msg_type):
+        """Get the connections a message must be sent to.
+
+        Args:
+            msg_type (str): type of the message
+
+        Returns:
+            set: connections subscribed to the message
+        """
+        msg_type = msg_type or ''
+        clients = set(self.everything)
+        clients.update(self.types.get(msg_type, []))
+        for prefix, subscribers in self.prefixes.iteritems():
+            if msg_type.startswith(prefix):
+                clients.update(subscribers)
+        return clients
+
+
 client_connections = []
+subscriptions = Subscriptions()
 
 
 class WebsocketEventHandler(tornado.websocket.WebSocketHandler):
+    """
+    WebsocketEventHandler
+    Connection of a client to the message bus.
+
+    Messages are routed on their type, read from the header without
+    building the message.  Truncated frames are dropped, the data isn't
+    checked: clients drop the messages they can't decode.  The message is
+    only built when a handler of the bus process listens to the type or it
+    must be translated to the wire format of a recipient.
+    """
+    # Wire format of the messages sent to this connection
+    format = JSON
+    # Message types not logged
+    ignore_logs = frozenset()
+
     def __init__(self, application, request, **kwargs):
         tornado.websocket.WebSocketHandler.__init__(
             self, application, request, **kwargs)
         self.emitter = EventBusEmitter
 
+    def initialize(self, ignore_logs=()):
+        self.ignore_logs = frozenset(ignore_logs)
+
     def on(self, event_name, handler):
         self.emitter.on(event_name, handler)
 
+    def log_message(self, msg_type, message):
+        if LOG.level > logging.DEBUG or msg_type in self.ignore_logs:
+            return
+        LOG(__name__).debug(describe(message))
+
     def on_message(self, message):
-        LOG.debug(message)
-        try:
-            deserialized_message = Message.deserialize(message)
-        except:
+        # Decoded at most once, when needed
+        decoded = []
+
+        def deserialize():
+            if not decoded:
+                decoded.append(Message.deserialize(message))
+            return decoded[0]
+
+        header = parse_header(message)
+        if header is None:
+            # Not serialized by Message, decode all of it
+            try:
+                header = deserialize().type, deserialize().context
+            except:
+                LOG.debug(message)
+                return
+        msg_type = header[0]
+        self.log_message(msg_type, message)
+
+        if msg_type in (SUBSCRIBE, UNSUBSCRIBE):
+            self.update_subscriptions(deserialize())
+            return
+        if msg_type == SET_FORMAT:
+            self.set_format(deserialize())
             return
 
         try:
-            self.emitter.emit(deserialized_message.type, deserialized_message)
+            if self.emitter.listeners(msg_type):
+                self.emitter.emit(msg_type, deserialize())
         except Exception, e:
             LOG.exception(e)
             traceback.print_exc(file=sys.stdout)
             pass
 
-        for client in client_connections:
-            client.write_message(message)
+        # Translated once per format used by the recipients
+        frames = {MSGPACK if is_msgpack(message) else JSON: message}
+        for client in subscriptions.clients(msg_type):
+            fmt = client.format
+            if fmt not in frames:
+                try:
+                    frames[fmt] = deserialize().serialize(fmt)
+                except:
+                    LOG.debug("Can't translate " + msg_type)
+                    return
+            client.write_message(frames[fmt], binary=(fmt == MSGPACK))
+
+    def update_subscriptions(self, message):
+        topics = (message.data or {}).get('topics', [])
+        if isinstance(topics, basestring):
+            topics = [topics]
+        if message.type == SUBSCRIBE:
+            subscriptions.subscribe(self, topics)
+        else:
+            subscriptions.unsubscribe(self, topics)
+
+    def set_format(self, message):
+        """ Switch the connection to the wire format it asks for. """
+        fmt = (message.data or {}).get('format')
+        if fmt in available_formats():
+            self.format = fmt
+        self.write_message(Message(FORMAT, {'format': self.format})
+                           .serialize())
 
     def open(self):
         self.write_message(Message("connected").serialize())
         client_connections.append(self)
+        subscriptions.add(self)
 
     def on_close(self):
         client_connections.remove(self)
+        subscriptions.remove(self)
 
     def emit(self, channel_message):
         if (hasattr(channel_message, 'serialize') and
                 callable(getattr(channel_message, 'serialize'))):
-            self.write_message(channel_message.serialize())
+            self.write_message(channel_message.serialize(self.format),
+                               binary=(self.format == MSGPACK))
         else:
             self.write_message(json.dumps(channel_message))
 
@@ -13,12 +13,14 @@
 # limitations under the License.
 #
 import argparse
+import logging
 import sys
 
 from os.path import dirname, exists, isdir
 
 from mycroft.configuration import Configuration
 from mycroft.messagebus.client.ws import WebsocketClient
+from mycroft.messagebus.message import describe
 from mycroft.skills.core import create_skill_descriptor, load_skill
 from mycroft.skills.intent_service import IntentService
 from mycroft.util.log import LOG
@@ -78,7 +80,9 @@ class SkillContainer(object):
 
     def run(self):
         try:
-            self.ws.on('message', LOG.debug)
+            if LOG.level <= logging.DEBUG:
+                self.ws.on('received',
+                           lambda message: LOG.debug(describe(message)))
             self.ws.on('open', self.load_skill)
             self.ws.on('error', LOG.error)
             self.ws.run_forever()
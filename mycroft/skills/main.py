@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-import json
+import logging
 import subprocess
 import sys
 import time
@@ -27,12 +27,13 @@ from mycroft import MYCROFT_ROOT_PATH
 from mycroft.api import is_paired
 from mycroft.configuration import Configuration
 from mycroft.messagebus.client.ws import WebsocketClient
-from mycroft.messagebus.message import Message
+from mycroft.messagebus.message import Message, describe, parse_header
 from mycroft.skills.core import load_skill, create_skill_descriptor, \
     MainModule, FallbackSkill
 from mycroft.skills.event_scheduler import EventScheduler
 from mycroft.skills.intent_service import IntentService
 from mycroft.skills.padatious_service import PadatiousService
+from mycroft.skills.vocabulary import VocabularyCache
 from mycroft.util import connected
 from mycroft.util.log import LOG
 
@@ -66,6 +67,7 @@ def _starting_up():
         - a timer to check for internet connection
         - adapt intent service
         - padatious intent service
+        - vocabulary cache, for the grammar of the speech client
     """
     global ws, skill_manager, event_scheduler
 
@@ -76,6 +78,7 @@ def _starting_up():
 
     service = IntentService(ws)
     PadatiousService(ws, service)
+    VocabularyCache(ws)
     event_scheduler = EventScheduler(ws)
 
     # Create a thread that monitors the loaded skills, looking for updates
@@ -401,21 +404,19 @@ def main():
 
     # Listen for messages and echo them for logging
     def _echo(message):
-        try:
-            _message = json.loads(message)
-
-            if _message.get("type") in ignore_logs:
-                return
-
-            if _message.get("type") == "registration":
-                # do not log tokens from registration messages
-                _message["data"]["token"] = None
-            message = json.dumps(_message)
-        except BaseException:
-            pass
-        LOG('SKILLS').debug(message)
-
-    ws.on('message', _echo)
+        header = parse_header(message)
+        msg_type = header[0] if header else None
+        if msg_type in ignore_logs:
+            return
+        if msg_type == "registration":
+            # do not log tokens from registration messages
+            registration = Message.deserialize(message)
+            registration.data["token"] = None
+            message = registration.serialize()
+        LOG('SKILLS').debug(describe(message))
+
+    if LOG.level <= logging.DEBUG:
+        ws.on('received', _echo)
     # Startup will be called after websocket is fully live
     ws.once('open', _starting_up)
     ws.run_forever()
@@ -0,0 +1,86 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import OrderedDict
+from threading import Lock
+
+from mycroft.messagebus.message import Message
+
+# Asks for the vocabulary and intents of the loaded skills, answered with
+# VOCABULARY_RESPONSE holding the registration messages
+VOCABULARY_REQUEST = 'skill.vocabulary.request'
+VOCABULARY_RESPONSE = 'skill.vocabulary.response'
+
+REGISTRATIONS = ('register_vocab', 'register_intent',
+                 'padatious:register_intent', 'padatious:register_entity')
+
+
+class VocabularyCache(object):
+    """
+    VocabularyCache
+    Keeps the vocabulary and intents registered by the loaded skills and
+    sends them to the processes asking for them, like the speech client
+    building its grammar of the commands after it (re)started.
+
+    Only the current registrations are kept, a registration replaces the
+    previous one of the same vocabulary, intent or entity and the
+    registrations of detached intents and skills are dropped.
+
+    Args:
+        emitter (WebsocketClient): message bus connection
+    """
+
+    def __init__(self, emitter):
+        self.emitter = emitter
+        self.lock = Lock()
+        self.registrations = OrderedDict()  # key -> (type, data)
+        for msg_type in REGISTRATIONS:
+            emitter.on(msg_type, self.handle_register)
+        emitter.on('detach_intent', self.handle_detach_intent)
+        emitter.on('detach_skill', self.handle_detach_skill)
+        emitter.on(VOCABULARY_REQUEST, self.handle_request)
+
+    @staticmethod
+    def _key(msg_type, data):
+        if msg_type == 'register_vocab':
+            return msg_type, data.get('regex') or (data.get('start'),
+                                                   data.get('end'))
+        return msg_type, data.get('name')
+
+    def handle_register(self, message):
+        data = message.data or {}
+        with self.lock:
+            self.registrations[self._key(message.type, data)] = (
+                message.type, data)
+
+    def _remove(self, matches):
+        with self.lock:
+            for key in [k for k in self.registrations
+                        if k[0] != 'register_vocab' and matches(k[1])]:
+                del self.registrations[key]
+
+    def handle_detach_intent(self, message):
+        name = message.data.get('intent_name')
+        self._remove(lambda n: n == name)
+
+    def handle_detach_skill(self, message):
+        skill_id = str(message.data.get('skill_id'))
+        self._remove(lambda n: str(n).startswith(skill_id))
+
+    def handle_request(self, message):
+        with self.lock:
+            registrations = [[msg_type, data] for msg_type, data in
+                             self.registrations.values()]
+        self.emitter.emit(Message(VOCABULARY_RESPONSE,
+                                  {'registrations': registrations}))
@@ -12,10 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import json
 import re
+import time
+from Queue import Queue, Empty
 from abc import ABCMeta, abstractmethod
+from os.path import abspath, dirname, join
+from threading import Thread, Lock
+
 from requests import post
+from requests.compat import urlencode
 from speech_recognition import Recognizer
+from websocket import (
+    create_connection,
+    WebSocketConnectionClosedException,
+    WebSocketTimeoutException
+)
 
 from mycroft.api import STTApi
 from mycroft.configuration import Configuration
@@ -23,12 +35,19 @@ from mycroft.util.log import LOG
 
 
 class STT(object):
+    """Speech to text engine.
+
+    Args:
+        config_stt (dict): stt configuration with the module and its
+                           settings, defaults to the stt section of the
+                           configuration
+    """
     __metaclass__ = ABCMeta
 
-    def __init__(self):
+    def __init__(self, config_stt=None):
         config_core = Configuration.get()
         self.lang = str(self.init_language(config_core))
-        config_stt = config_core.get("stt", {})
+        config_stt = config_stt or config_core.get("stt", {})
         self.config = config_stt.get(config_stt.get("module"), {})
         self.credential = self.config.get("credential", {})
         self.recognizer = Recognizer()
@@ -46,26 +65,54 @@ class STT(object):
         pass
 
 
+class StreamingSTT(STT):
+    """STT engine receiving the audio while the phrase is being recorded.
+
+    stream_start() is called when recording begins, stream_data() with the
+    audio as it is captured and stream_stop() once the end of speech has been
+    detected, returning the transcription.  An instance handles a single
+    stream at a time.
+    """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def stream_start(self, language=None):
+        pass
+
+    @abstractmethod
+    def stream_data(self, data):
+        pass
+
+    @abstractmethod
+    def stream_stop(self):
+        pass
+
+    def execute(self, audio, language=None):
+        self.stream_start(language)
+        self.stream_data(audio.frame_data)
+        return self.stream_stop()
+
+
 class TokenSTT(STT):
     __metaclass__ = ABCMeta
 
-    def __init__(self):
-        super(TokenSTT, self).__init__()
+    def __init__(self, config_stt=None):
+        super(TokenSTT, self).__init__(config_stt)
         self.token = str(self.credential.get("token"))
 
 
 class BasicSTT(STT):
     __metaclass__ = ABCMeta
 
-    def __init__(self):
-        super(BasicSTT, self).__init__()
+    def __init__(self, config_stt=None):
+        super(BasicSTT, self).__init__(config_stt)
         self.username = str(self.credential.get("username"))
         self.password = str(self.credential.get("password"))
 
 
 class GoogleSTT(TokenSTT):
-    def __init__(self):
-        super(GoogleSTT, self).__init__()
+    def __init__(self, config_stt=None):
+        super(GoogleSTT, self).__init__(config_stt)
 
     def execute(self, audio, language=None):
         self.lang = language or self.lang
@@ -73,8 +120,8 @@ class GoogleSTT(TokenSTT):
 
 
 class WITSTT(TokenSTT):
-    def __init__(self):
-        super(WITSTT, self).__init__()
+    def __init__(self, config_stt=None):
+        super(WITSTT, self).__init__(config_stt)
 
     def execute(self, audio, language=None):
         LOG.warning("WITSTT language should be configured at wit.ai settings.")
@@ -82,8 +129,8 @@ class WITSTT(TokenSTT):
 
 
 class IBMSTT(BasicSTT):
-    def __init__(self):
-        super(IBMSTT, self).__init__()
+    def __init__(self, config_stt=None):
+        super(IBMSTT, self).__init__(config_stt)
 
     def execute(self, audio, language=None):
         self.lang = language or self.lang
@@ -92,8 +139,8 @@ class IBMSTT(BasicSTT):
 
 
 class MycroftSTT(STT):
-    def __init__(self):
-        super(MycroftSTT, self).__init__()
+    def __init__(self, config_stt=None):
+        super(MycroftSTT, self).__init__(config_stt)
         self.api = STTApi()
 
     def execute(self, audio, language=None):
@@ -106,8 +153,8 @@ class MycroftSTT(STT):
 
 
 class KaldiSTT(STT):
-    def __init__(self):
-        super(KaldiSTT, self).__init__()
+    def __init__(self, config_stt=None):
+        super(KaldiSTT, self).__init__(config_stt)
 
     def execute(self, audio, language=None):
         language = language or self.lang
@@ -122,18 +169,284 @@ class KaldiSTT(STT):
             return None
 
 
+class KaldiStreamingSTT(StreamingSTT):
+    """Streams audio to a kaldi-gstreamer-server websocket.
+
+    The audio is sent as binary frames followed by "EOS".  The server replies
+    with JSON results and closes the connection once the last final result
+    has been sent.
+    """
+    CONTENT_TYPE = ("audio/x-raw, layout=(string)interleaved, "
+                    "rate=(int)%d, format=(string)S16LE, channels=(int)1")
+
+    # Seconds to wait for the final results after the end of the audio
+    TIMEOUT = 10
+
+    def __init__(self, config_stt=None):
+        super(KaldiStreamingSTT, self).__init__(config_stt)
+        listener_config = Configuration.get().get("listener", {})
+        self.sample_rate = listener_config.get("sample_rate", 16000)
+        self.ws = None
+        self.reader = None
+        self.transcripts = []
+
+    def stream_start(self, language=None):
+        self.lang = language or self.lang
+        self.transcripts = []
+        url = self.config.get("uri") + "?" + urlencode({
+            "content-type": self.CONTENT_TYPE % self.sample_rate
+        })
+        self.ws = create_connection(url, timeout=self.TIMEOUT)
+        self.reader = Thread(target=self._read_results, args=(self.ws,))
+        self.reader.daemon = True
+        self.reader.start()
+
+    def stream_data(self, data):
+        self.ws.send_binary(data)
+
+    def stream_stop(self):
+        try:
+            self.ws.send("EOS")
+            self.reader.join(self.TIMEOUT)
+        finally:
+            self.ws.close()
+            self.ws = None
+        text = " ".join(self.transcripts)
+        return re.sub(r'\s*\[noise\]\s*', ' ', text).strip() or None
+
+    def _read_results(self, ws):
+        while True:
+            try:
+                message = ws.recv()
+            except WebSocketTimeoutException:
+                continue  # No results while the user is still speaking
+            except (WebSocketConnectionClosedException, IOError):
+                break
+            if not message:
+                break
+            response = json.loads(message)
+            if response.get("status", 0) != 0:
+                LOG.error("Kaldi error: " + str(response.get("message")))
+                break
+            result = response.get("result", {})
+            if result.get("final") and result.get("hypotheses"):
+                self.transcripts.append(
+                    result["hypotheses"][0]["transcript"])
+
+
+class PocketSphinxSTT(STT):
+    """Transcribes locally with pocketsphinx.
+
+    Slower and less accurate than the remote engines but always available,
+    meant to be raced against them by CompositeSTT.  Uses the acoustic
+    model of the wake word engine, the language model or JSGF grammar are
+    given by the "lm" or "jsgf" settings.
+    """
+    MODEL_DIR = join(dirname(dirname(abspath(__file__))), 'client', 'speech',
+                     'recognizer', 'model')
+
+    def __init__(self, config_stt=None):
+        super(PocketSphinxSTT, self).__init__(config_stt)
+        from pocketsphinx import Decoder, get_model_path
+        model_dir = join(self.MODEL_DIR, self.lang.lower())
+        config = Decoder.default_config()
+        config.set_string('-hmm', self.config.get('hmm',
+                                                  join(model_dir, 'hmm')))
+        config.set_string('-dict', self.config.get(
+            'dict', join(model_dir, 'cmudict-' + self.lang.lower() +
+                         '.dict')))
+        if self.config.get('jsgf'):
+            config.set_string('-jsgf', self.config['jsgf'])
+        else:
+            config.set_string('-lm', self.config.get(
+                'lm', join(get_model_path(), self.lang.lower() + '.lm.bin')))
+        config.set_float('-samprate', 16000)
+        config.set_string('-logfn', '/dev/null')
+        self.decoder = Decoder(config)
+        self.lock = Lock()
+
+    def execute(self, audio, language=None):
+        data = audio.get_raw_data(convert_rate=16000, convert_width=2)
+        with self.lock:
+            self.decoder.start_utt()
+            self.decoder.process_raw(data, False, True)
+            self.decoder.end_utt()
+            hyp = self.decoder.hyp()
+        return hyp.hypstr if hyp else None
+
+
+class CompositeSTT(STT):
+    """Sends the audio to several engines, the first transcription wins.
+
+    The engines are started in order, each one "hedge_delay" seconds after
+    the previous, or right away when the previous one failed.  A delay of 0
+    races all of them.  The first non empty transcription is returned and
+    the other engines are abandoned, their late results are discarded.  If
+    every engine fails the first error is raised.
+
+    Abandoned requests keep running until the engine answers, an engine
+    with "max_in_flight" of them still running is skipped rather than
+    queuing more work behind them (PocketSphinxSTT decodes one utterance
+    at a time).  Engines not started yet when the result is accepted are
+    not run at all.
+
+    Settings of the "composite" stt section:
+        engines: module names using their own stt section, or settings
+                 including the module, e.g. {"module": "kaldi", "uri": ...}
+        hedge_delay: seconds before starting the next engine
+        timeout: seconds to wait for a transcription
+        max_in_flight: requests an engine may have running, abandoned ones
+                       included
+    """
+
+    def __init__(self, config_stt=None):
+        super(CompositeSTT, self).__init__(config_stt)
+        config_stt = config_stt or Configuration.get().get("stt", {})
+        self.hedge_delay = self.config.get("hedge_delay", 1.0)
+        self.timeout = self.config.get("timeout", 15.0)
+        self.max_in_flight = self.config.get("max_in_flight", 2)
+        self.engines = []
+        for engine in self.config.get("engines", ["mycroft"]):
+            if isinstance(engine, dict):
+                module = engine["module"]
+                config = {"module": module, module: engine}
+                name = engine.get("name", module)
+            else:
+                module = name = engine
+                config = {"module": module,
+                          module: config_stt.get(module, {})}
+            self.engines.append((name, STTFactory.create(config)))
+        # Engine name -> [requests, wins, errors, late results, latencies]
+        self.stats = dict((name, [0, 0, 0, 0, []])
+                          for name, _ in self.engines)
+        self.in_flight = dict((name, 0) for name, _ in self.engines)
+        self.lock = Lock()
+
+    def _run(self, name, engine, audio, language, results, done):
+        try:
+            with self.lock:
+                if done[0]:
+                    return  # Result accepted before the thread got to run
+                self.stats[name][0] += 1
+            start = time.time()
+            text = error = None
+            try:
+                text = engine.execute(audio, language)
+            except Exception as e:
+                error = e
+            latency = time.time() - start
+            with self.lock:
+                stats = self.stats[name]
+                stats[4].append(latency)
+                if error:
+                    stats[2] += 1
+                if done[0]:
+                    stats[3] += 1
+            results.put((name, text, error))
+        finally:
+            with self.lock:
+                self.in_flight[name] -= 1
+
+    def execute(self, audio, language=None):
+        self.lang = language or self.lang
+        results = Queue()
+        done = [False]  # Set once a result was accepted
+        errors = []
+        started = pending = 0
+        deadline = time.time() + self.timeout
+        next_start = time.time()
+        try:
+            while started < len(self.engines) or pending:
+                now = time.time()
+                if now >= deadline:
+                    LOG.warning("No transcription in %.1fs" % self.timeout)
+                    break
+                if started < len(self.engines) and now >= next_start:
+                    name, engine = self.engines[started]
+                    started += 1
+                    with self.lock:
+                        busy = self.in_flight[name] >= self.max_in_flight
+                        if not busy:
+                            self.in_flight[name] += 1
+                    if busy:
+                        # Try the next engine right away
+                        LOG.warning(name + " STT skipped, still busy")
+                        continue
+                    t = Thread(target=self._run,
+                               args=(name, engine, audio, self.lang,
+                                     results, done))
+                    t.daemon = True
+                    t.start()
+                    pending += 1
+                    next_start = now + self.hedge_delay
+                    continue
+                if started < len(self.engines):
+                    wait = min(next_start, deadline) - now
+                else:
+                    wait = deadline - now
+                try:
+                    name, text, error = results.get(timeout=max(wait, 0))
+                except Empty:
+                    continue
+                pending -= 1
+                if text and text.strip():
+                    with self.lock:
+                        self.stats[name][1] += 1
+                    LOG.debug("STT result from " + name)
+                    return text
+                if error:
+                    LOG.error(name + " STT failed: " + repr(error))
+                    errors.append(error)
+                # Nothing from this engine, don't wait to try the next one
+                next_start = time.time()
+        finally:
+            done[0] = True
+        if errors:
+            raise errors[0]
+        return None
+
+    def report(self, metrics):
+        """Add the statistics of every engine to metrics.
+
+        Args:
+            metrics (MetricsAggregator): metrics to update
+        """
+        with self.lock:
+            for name, stats in self.stats.items():
+                requests, wins, errors, late, latencies = stats
+                prefix = "mycroft.stt." + name + "."
+                metrics.increment(prefix + "requests", requests)
+                metrics.increment(prefix + "wins", wins)
+                metrics.increment(prefix + "errors", errors)
+                metrics.increment(prefix + "late", late)
+                for latency in latencies:
+                    metrics.timer(prefix + "time_s", latency)
+                if requests:
+                    metrics.level(prefix + "win_rate",
+                                  float(wins) / requests)
+                self.stats[name] = [0, 0, 0, 0, []]
+
+
 class STTFactory(object):
     CLASSES = {
         "mycroft": MycroftSTT,
         "google": GoogleSTT,
         "wit": WITSTT,
         "ibm": IBMSTT,
-        "kaldi": KaldiSTT
+        "kaldi": KaldiSTT,
+        "kaldi_streaming": KaldiStreamingSTT,
+        "pocketsphinx": PocketSphinxSTT,
+        "composite": CompositeSTT
     }
 
     @staticmethod
-    def create():
-        config = Configuration.get().get("stt", {})
+    def create(config=None):
+        """Create the configured STT engine.
+
+        Args:
+            config (dict): stt configuration, defaults to the stt section
+        """
+        config = config or Configuration.get().get("stt", {})
         module = config.get("module", "mycroft")
         clazz = STTFactory.CLASSES.get(module)
-        return clazz()
+        return clazz(config)
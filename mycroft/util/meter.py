@@ -0,0 +1,130 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import mmap
+import struct
+import time
+
+import os
+
+from mycroft.util.signal import get_ipc_directory
+
+
+class MicMeter(object):
+    """Microphone level shared between processes through a memory map.
+
+    The record has a fixed layout: sequence number, current energy, energy
+    threshold and the time of the update.  The listener updates it in place
+    and readers poll it, neither side opens or closes files after creation.
+
+    The sequence number is odd while an update is in progress, readers retry
+    until they get a consistent record.  If the listener died in the middle
+    of an update, readers keep the last consistent record.
+
+    Args:
+        path (str): file backing the memory map, defaults to mic_level.mmap
+                    in the IPC directory
+        writer (bool): True to create the file and update the record
+    """
+    FORMAT = '<Qddd'
+    SIZE = struct.calcsize(FORMAT)
+    # Reads of a record being updated before giving up
+    READ_TRIES = 1000
+
+    def __init__(self, path=None, writer=False):
+        self.path = path or os.path.join(get_ipc_directory(),
+                                         "mic_level.mmap")
+        self.writer = writer
+        self.seq = 0
+        self.map = None
+        self.last = None
+        if writer:
+            self._open()
+
+    def _open(self):
+        if self.writer:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            if os.fstat(fd).st_size < self.SIZE:
+                os.write(fd, b'\0' * self.SIZE)
+            access = mmap.ACCESS_WRITE
+        else:
+            fd = os.open(self.path, os.O_RDONLY)
+            access = mmap.ACCESS_READ
+        try:
+            self.map = mmap.mmap(fd, self.SIZE, access=access)
+        finally:
+            os.close(fd)
+        if self.writer:
+            self.seq = struct.unpack_from('<Q', self.map, 0)[0] & ~1
+
+    def update(self, energy, threshold):
+        """Publish the current energy level.
+
+        Args:
+            energy (float): energy of the latest audio
+            threshold (float): energy threshold of the recognizer
+        """
+        struct.pack_into('<Q', self.map, 0, self.seq + 1)
+        struct.pack_into('<ddd', self.map, 8, energy, threshold, time.time())
+        self.seq += 2
+        struct.pack_into('<Q', self.map, 0, self.seq)
+
+    def read(self):
+        """Get the latest level.
+
+        Returns:
+            tuple: (energy, threshold, timestamp, sequence number) or None if
+                   the listener hasn't created the meter yet.  The last
+                   level read if the record stays inconsistent.
+        """
+        if self.map is None:
+            if not os.path.isfile(self.path):
+                return None
+            try:
+                self._open()
+            except (OSError, ValueError, mmap.error):
+                return None  # Being created
+        for _ in range(self.READ_TRIES):
+            seq, energy, threshold, stamp = struct.unpack_from(self.FORMAT,
+                                                               self.map, 0)
+            if not seq & 1 and \
+                    struct.unpack_from('<Q', self.map, 0)[0] == seq:
+                self.last = energy, threshold, stamp, seq
+                break
+        return self.last
+
+    def wait(self, seq, timeout=None, interval=0.05):
+        """Wait for a level newer than seq.
+
+        Args:
+            seq (int): sequence number of the last level seen
+            timeout (float): maximum seconds to wait, None to wait forever
+            interval (float): seconds between polls
+
+        Returns:
+            tuple: as read(), None if no new level arrived in time
+        """
+        end = time.time() + timeout if timeout is not None else None
+        while True:
+            level = self.read()
+            if level and level[3] != seq:
+                return level
+            if end is not None and time.time() >= end:
+                return None
+            time.sleep(interval)
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import fcntl
+import mmap
+import struct
 import tempfile
+import threading
 import time
 
 import os
@@ -84,18 +88,241 @@ def create_file(filename):
         f.write('')
 
 
+class SignalBoard(object):
+    """Table of named signals in a memory mapped file shared by processes.
+
+    The file holds a generation counter, bumped on every change, followed by
+    NUM_SLOTS fixed size slots.  Each slot has its own sequence number (odd
+    while being written), the signal name and the time it was set, 0 when
+    not set.  Cleared slots keep their name and are reused for new names
+    once the table is full.  A slot left odd by a writer that died in the
+    middle of a change reads as empty and is repaired by the next write.
+
+    Checking a signal only reads the map, without locks or system calls.
+    Changes are serialized with flock() on the file and a thread lock.
+    Waiters in the same process are woken right away, other processes see
+    changes at their next poll of the generation counter.
+
+    Args:
+        path (str): file backing the table, created if needed
+    """
+    HEADER = struct.Struct('<Q')
+    SLOT = struct.Struct('<Q32sd')
+    NUM_SLOTS = 64
+    SIZE = HEADER.size + NUM_SLOTS * SLOT.size
+    # Interval between checks that the file hasn't been replaced or removed
+    CHECK_FILE_SEC = 5.0
+    # Reads of a slot being written before treating it as empty
+    READ_TRIES = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.changed = threading.Condition()
+        self.indexes = {}  # Cache of signal name -> slot index
+        self.fd = None
+        self.map = None
+        self._open()
+
+    def _open(self):
+        self.close()
+        try:
+            save = os.umask(0)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        finally:
+            os.umask(save)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size < self.SIZE:
+                os.ftruncate(self.fd, self.SIZE)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.map = mmap.mmap(self.fd, self.SIZE)
+        self.inode = os.fstat(self.fd).st_ino
+        self.next_file_check = time.time() + self.CHECK_FILE_SEC
+        self.indexes = {}
+
+    def _check_file(self):
+        # Follow the file if it is removed, e.g. by a cleanup of /tmp
+        if time.time() > self.next_file_check:
+            try:
+                replaced = os.stat(self.path).st_ino != self.inode
+            except OSError:
+                replaced = True
+            if replaced:
+                self._open()
+            else:
+                self.next_file_check = time.time() + self.CHECK_FILE_SEC
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    @property
+    def generation(self):
+        """ int: number of changes made to the table """
+        return self.HEADER.unpack_from(self.map, 0)[0]
+
+    def _offset(self, index):
+        return self.HEADER.size + index * self.SLOT.size
+
+    def _read_slot(self, index):
+        offset = self._offset(index)
+        for _ in range(self.READ_TRIES):
+            seq, name, set_time = self.SLOT.unpack_from(self.map, offset)
+            if not seq & 1 and \
+                    struct.unpack_from('<Q', self.map, offset)[0] == seq:
+                return name.rstrip(b'\0'), set_time
+        # The writer died half way, the slot is overwritten when reused
+        return b'', 0
+
+    def _write_slot(self, index, name, set_time):
+        offset = self._offset(index)
+        seq = struct.unpack_from('<Q', self.map, offset)[0]
+        seq += seq & 1  # Left odd by a writer that died
+        struct.pack_into('<Q', self.map, offset, seq + 1)
+        struct.pack_into('<32sd', self.map, offset + 8, name, set_time)
+        struct.pack_into('<Q', self.map, offset, seq + 2)
+        self.HEADER.pack_into(self.map, 0, self.generation + 1)
+        with self.changed:
+            self.changed.notify_all()
+
+    def _find(self, name):
+        index = self.indexes.get(name)
+        if index is not None and self._read_slot(index)[0] == name:
+            return index
+        for index in range(self.NUM_SLOTS):
+            if self._read_slot(index)[0] == name:
+                self.indexes[name] = index
+                return index
+        return None
+
+    def _locked(self):
+        return _BoardLock(self)
+
+    @staticmethod
+    def _encode(name):
+        if isinstance(name, unicode):
+            return name.encode('utf-8')
+        return name
+
+    def set(self, name):
+        """Set a signal, refreshing its time if already set.
+
+        Returns:
+            bool: False if the table is full
+        """
+        name = self._encode(name)
+        if len(name) > 32:
+            raise ValueError("Signal name too long: " + name)
+        self._check_file()
+        with self._locked():
+            index = self._find(name)
+            if index is None:
+                for i in range(self.NUM_SLOTS):
+                    slot_name, set_time = self._read_slot(i)
+                    if not slot_name or not set_time:
+                        index = i
+                        break
+                else:
+                    LOG.error("No free slot for signal " + name)
+                    return False
+            self._write_slot(index, name, time.time())
+            self.indexes[name] = index
+        return True
+
+    def check(self, name, sec_lifetime=0):
+        """ See check_for_signal() """
+        name = self._encode(name)
+        self._check_file()
+        index = self._find(name)
+        if index is None:
+            return False
+        set_time = self._read_slot(index)[1]
+        if not set_time:
+            return False
+        if sec_lifetime == -1:
+            return True
+        if sec_lifetime == 0 or \
+                int(set_time + sec_lifetime) < int(time.time()):
+            # Consume the single-use signal or remove once expired.  Only
+            # one process can consume it.
+            with self._locked():
+                if self._read_slot(index) != (name, set_time):
+                    return False
+                self._write_slot(index, name, 0)
+            return sec_lifetime == 0
+        return True
+
+    def wait(self, predicate, timeout=None, interval=0.05):
+        """Wait for predicate() to become True.
+
+        predicate is evaluated after every change to the table made by this
+        process and every interval seconds for changes made by others.
+
+        Returns:
+            bool: False if timed out
+        """
+        end = time.time() + timeout if timeout is not None else None
+        while not predicate():
+            wait = interval
+            if end is not None:
+                wait = min(wait, end - time.time())
+                if wait <= 0:
+                    return False
+            generation = self.generation
+            with self.changed:
+                if self.generation == generation:
+                    self.changed.wait(wait)
+        return True
+
+
+class _BoardLock(object):
+    """ Lock of a SignalBoard against other threads and processes """
+
+    def __init__(self, board):
+        self.board = board
+
+    def __enter__(self):
+        self.board.lock.acquire()
+        fcntl.flock(self.board.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self.board.fd, fcntl.LOCK_UN)
+        self.board.lock.release()
+
+
+_board = None
+_board_lock = threading.Lock()
+
+
+def get_signal_board():
+    """ Get the SignalBoard of the IPC directory, shared by all processes """
+    global _board
+    with _board_lock:
+        if _board is None:
+            path = os.path.join(get_ipc_directory(), "signals.mmap")
+            _board = SignalBoard(path)
+    return _board
+
+
 def create_signal(signal_name):
     """Create a named signal
 
     Args:
-        signal_name (str): The signal's name.  Must only contain characters
-            valid in filenames.
+        signal_name (str): The signal's name.  At most 32 characters.
+
+    Returns:
+        bool: True if the signal was created
     """
     try:
-        path = os.path.join(get_ipc_directory(), "signal", signal_name)
-        create_file(path)
-        return os.path.isfile(path)
-    except IOError:
+        return get_signal_board().set(signal_name)
+    except (IOError, OSError, ValueError, struct.error) as e:
+        LOG.error("Could not create signal " + signal_name + ": " + repr(e))
         return False
 
 
@@ -103,8 +330,7 @@ def check_for_signal(signal_name, sec_lifetime=0):
     """See if a named signal exists
 
     Args:
-        signal_name (str): The signal's name.  Must only contain characters
-            valid in filenames.
+        signal_name (str): The signal's name.
         sec_lifetime (int, optional): How many seconds the signal should
             remain valid.  If 0 or not specified, it is a single-use signal.
             If -1, it never expires.
@@ -112,18 +338,32 @@ def check_for_signal(signal_name, sec_lifetime=0):
     Returns:
         bool: True if the signal is defined, False otherwise
     """
-    path = os.path.join(get_ipc_directory(), "signal", signal_name)
-    if os.path.isfile(path):
-        if sec_lifetime == 0:
-            # consume this single-use signal
-            os.remove(path)
-        elif sec_lifetime == -1:
-            return True
-        elif int(os.path.getctime(path) + sec_lifetime) < int(time.time()):
-            # remove once expired
-            os.remove(path)
-            return False
-        return True
+    return get_signal_board().check(signal_name, sec_lifetime)
+
+
+def wait_for_signal(signal_name, timeout=None):
+    """Wait for a named signal to be created, without consuming it
 
-    # No such signal exists
-    return False
+    Args:
+        signal_name (str): The signal's name.
+        timeout (float, optional): Maximum seconds to wait, forever if None
+
+    Returns:
+        bool: True if the signal exists, False if timed out
+    """
+    return get_signal_board().wait(
+        lambda: check_for_signal(signal_name, -1), timeout)
+
+
+def wait_for_signal_clear(signal_name, timeout=None):
+    """Wait for a named signal to be consumed
+
+    Args:
+        signal_name (str): The signal's name.
+        timeout (float, optional): Maximum seconds to wait, forever if None
+
+    Returns:
+        bool: True if the signal doesn't exist, False if timed out
+    """
+    return get_signal_board().wait(
+        lambda: not check_for_signal(signal_name, -1), timeout)
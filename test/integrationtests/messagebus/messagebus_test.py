@@ -117,14 +117,14 @@ class TestMessageMethods(unittest.TestCase):
                                 {'target': 4}, {'target': 5})
         self.message3 = Message("status", "OK")
         # serialized results of each of the messages
-        self.serialized = ['{"data": {}, "type": "empty", "context": null}',
-                           '{"data": {}, "type": "enclosure.reset",\
-                            "context": null}',
-                           '{"data": { "target": 4}, \
-                            "type": "enclosure.system.blink", \
-                            "context": {"target": 5}}',
-                           '{"data": "OK", "type": "status", \
-                            "context": null}']
+        self.serialized = ['{"type": "empty", "context": null, "data": {}}',
+                           '{"type": "enclosure.reset", "context": null,\
+                            "data": {}}',
+                           '{"type": "enclosure.system.blink", \
+                            "context": {"target": 5}, \
+                            "data": { "target": 4}}',
+                           '{"type": "status", "context": null, \
+                            "data": "OK"}']
 
     def test_serialize(self):
         """This test the serialize method
@@ -153,10 +153,10 @@ class TestMessageMethods(unittest.TestCase):
         """
         message = self.empty_message.reply("status", "OK")
         self.assertEqual(message.serialize(),
-                         '{"data": "OK", "type": "status", "context": {}}')
+                         '{"type": "status", "context": {}, "data": "OK"}')
         message = self.message1.reply("status", "OK")
         self.assertEqual(message.serialize(),
-                         '{"data": "OK", "type": "status", "context": {}}')
+                         '{"type": "status", "context": {}, "data": "OK"}')
         message = self.message2.reply("status", "OK")
 
     def test_publish(self):
@@ -0,0 +1,152 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import mock
+from os.path import isfile, join
+
+from mycroft.client.speech.archive import AudioArchiver, ScpUploader
+from mycroft.client.speech.mic import ResponsiveRecognizer
+
+AUDIO = b'\0\1' * 16000  # One second
+
+
+class AudioArchiverTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.dir)
+
+    def test_archive(self):
+        archiver = AudioArchiver(self.dir, 'wav')
+        archiver.start()
+        self.assertTrue(archiver.archive(AUDIO, 16000, 2, 'test'))
+        archiver.stop()
+        with open(join(self.dir, 'test.wav'), 'rb') as f:
+            self.assertEqual(f.read(4), b'RIFF')
+
+    def test_queue_full(self):
+        # Not started, nothing is taken from the queue
+        archiver = AudioArchiver(self.dir, 'wav', queue_size=2)
+        self.assertTrue(archiver.archive(AUDIO, 16000, 2, 'a'))
+        self.assertTrue(archiver.archive(AUDIO, 16000, 2, 'b'))
+        self.assertFalse(archiver.archive(AUDIO, 16000, 2, 'c'))
+        metrics = mock.Mock()
+        archiver.report(metrics)
+        metrics.increment.assert_any_call(
+            "mycroft.archive.recordings.dropped", 1)
+        metrics.level.assert_any_call(
+            "mycroft.archive.recordings.queue_depth", 2)
+
+    def test_rotation(self):
+        # Room for two recordings
+        archiver = AudioArchiver(self.dir, 'wav', quota_mb=0.07)
+        for i in range(3):
+            filename = archiver.save(AUDIO, 16000, 2, str(i))
+            os.utime(filename, (i, i))
+        archiver.rotate()
+        self.assertEqual(sorted(os.listdir(self.dir)), ['1.wav', '2.wav'])
+        self.assertEqual(archiver.rotated, 1)
+
+    def test_upload(self):
+        uploader = mock.Mock()
+        archiver = AudioArchiver(self.dir, 'wav', uploader=uploader)
+        archiver.save(AUDIO, 16000, 2, 'test')
+        self.assertTrue(uploader.notify.called)
+
+    def test_name(self):
+        """ Each archive has its own metrics, uploads included. """
+        uploader = mock.Mock()
+        archiver = AudioArchiver(self.dir, 'wav', uploader=uploader,
+                                 name='wake_words')
+        metrics = mock.Mock()
+        archiver.report(metrics)
+        metrics.level.assert_any_call(
+            "mycroft.archive.wake_words.disk_bytes", 0)
+        uploader.report.assert_called_with(metrics,
+                                           "mycroft.archive.wake_words.")
+
+    def test_upload_spool_full(self):
+        # Room for two recordings, all waiting for upload
+        archiver = AudioArchiver(self.dir, 'wav', quota_mb=0.07,
+                                 uploader=mock.Mock())
+        for i in range(3):
+            archiver.save(AUDIO, 16000, 2, str(i))
+        self.assertEqual(sorted(os.listdir(self.dir)), ['0.wav', '1.wav'])
+        self.assertEqual((archiver.dropped, archiver.rotated), (1, 0))
+
+        # Room again once uploaded
+        os.remove(join(self.dir, '0.wav'))
+        self.assertTrue(archiver.save(AUDIO, 16000, 2, '3'))
+
+
+class RecognizerArchiveTest(unittest.TestCase):
+    def test_shared_report(self):
+        """ Archivers shared by several microphones are reported once. """
+        archiver = mock.Mock()
+        recognizers = []
+        for owner in (True, False):
+            recognizer = ResponsiveRecognizer.__new__(ResponsiveRecognizer)
+            recognizer.wake_word_archiver = archiver
+            recognizer.utterance_archiver = None
+            recognizer._owns_archivers = owner
+            recognizers.append(recognizer)
+        metrics = mock.Mock()
+        for recognizer in recognizers:
+            recognizer.report_metrics(metrics)
+        archiver.report.assert_called_once_with(metrics)
+
+
+class ScpUploaderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.uploader = ScpUploader({'server': 'test'}, self.dir)
+        self.uploader.BATCH_DELAY = 0.01
+        for name in ('a.flac', 'b.flac', 'c.flac.tmp'):
+            with open(join(self.dir, name), 'w') as f:
+                f.write('x')
+
+    def tearDown(self):
+        rmtree(self.dir)
+
+    def test_batch(self):
+        def upload(files):
+            self.uploader.stop()
+            return True
+
+        self.uploader.upload = mock.Mock(side_effect=upload)
+        self.uploader.run()
+        # Files spooled are sent at once, except the ones being written
+        self.uploader.upload.assert_called_once_with(
+            [join(self.dir, 'a.flac'), join(self.dir, 'b.flac')])
+        self.assertEqual(os.listdir(self.dir), ['c.flac.tmp'])
+
+    def test_retry(self):
+        results = [False, True]
+
+        def upload(files):
+            if len(results) == 1:
+                self.uploader.stop()
+            return results.pop(0)
+
+        self.uploader.upload = mock.Mock(side_effect=upload)
+        self.uploader.run()
+        self.assertEqual(self.uploader.upload.call_count, 2)
+        self.assertEqual(self.uploader.failures, 1)
+        self.assertFalse(isfile(join(self.dir, 'a.flac')))
@@ -0,0 +1,95 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from threading import Thread
+from time import sleep
+
+from mycroft.client.speech.audio_buffer import (
+    CyclicAudioBuffer,
+    PhraseAudioBuffer
+)
+
+
+class CyclicAudioBufferTest(unittest.TestCase):
+    def test_initial_data(self):
+        buff = CyclicAudioBuffer(8, b'\0\0')
+        self.assertEqual(len(buff), 2)
+        self.assertEqual(buff.get().tobytes(), b'\0\0')
+
+    def test_fill(self):
+        buff = CyclicAudioBuffer(8)
+        buff.append(b'abc')
+        buff.append(b'def')
+        self.assertEqual(len(buff), 6)
+        self.assertEqual(buff.get().tobytes(), b'abcdef')
+        self.assertEqual(buff.get_last(2).tobytes(), b'ef')
+
+    def test_wrap_around(self):
+        buff = CyclicAudioBuffer(8)
+        data = b''
+        for i in range(20):
+            chunk = str(i % 10) * 3
+            buff.append(chunk)
+            data += chunk
+            self.assertEqual(buff.get().tobytes(), data[-8:])
+            self.assertEqual(buff.get_last(5).tobytes(), data[-5:])
+        self.assertEqual(len(buff), 8)
+
+    def test_oversized_chunk(self):
+        buff = CyclicAudioBuffer(4)
+        buff.append(b'x')
+        buff.append(b'abcdefgh')
+        self.assertEqual(buff.get().tobytes(), b'efgh')
+
+    def test_clear(self):
+        buff = CyclicAudioBuffer(4, b'abcd')
+        buff.clear()
+        self.assertEqual(len(buff), 0)
+        self.assertEqual(buff.get().tobytes(), b'')
+        buff.append(b'xy')
+        self.assertEqual(buff.get().tobytes(), b'xy')
+
+
+class PhraseAudioBufferTest(unittest.TestCase):
+    def test_append(self):
+        buff = PhraseAudioBuffer(6, b'\0\0')
+        buff.append(b'ab')
+        buff.append(b'cdef')
+        # Audio beyond the preallocated size is dropped
+        self.assertEqual(len(buff), 6)
+        self.assertEqual(buff.get().tobytes(), b'\0\0abcd')
+
+    def test_chunks_while_recording(self):
+        buff = PhraseAudioBuffer(1024)
+        received = []
+
+        def consume():
+            for chunk in buff.chunks():
+                received.append(chunk)
+
+        t = Thread(target=consume)
+        t.start()
+        for i in range(10):
+            buff.append(str(i) * 4)
+            sleep(0.01)
+        buff.finish()
+        t.join(5)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(b''.join(received), buff.get().tobytes())
+
+    def test_chunks_after_finish(self):
+        buff = PhraseAudioBuffer(8, b'ab')
+        buff.finish()
+        self.assertEqual(list(buff.chunks()), [b'ab'])
@@ -15,12 +15,15 @@
 import unittest
 from Queue import Queue
 
+import mock
+
 import speech_recognition
 from os.path import dirname, join
 from speech_recognition import WavFile, AudioData
 
+from mycroft.client.speech.audio_buffer import PhraseAudioBuffer
 from mycroft.client.speech.listener import AudioConsumer, RecognizerLoop
-from mycroft.stt import MycroftSTT
+from mycroft.stt import CompositeSTT, MycroftSTT
 
 
 class MockRecognizer(object):
@@ -198,3 +201,97 @@ class AudioConsumerTest(unittest.TestCase):
         self.assertIsNotNone(utterances)
         self.assertTrue(len(utterances) == 1)
         self.assertEquals("record", utterances[0])
+
+    def test_source(self):
+        """ Utterances heard by a named microphone carry its name. """
+        self.consumer.stt = mock.Mock(lang='en-US')
+        self.consumer.stt.execute.return_value = 'turn on the light'
+        audio = AudioData(b'\0' * 3200, 16000, 2)
+        audio.source_id = 'kitchen'
+        monitor = {}
+
+        def callback(message):
+            monitor.update(message)
+
+        self.loop.once('recognizer_loop:utterance', callback)
+        self.consumer.transcribe(audio)
+        self.assertEquals(monitor['utterances'], ['turn on the light'])
+        self.assertEquals(monitor['source'], 'kitchen')
+
+    def test_local_source(self):
+        """ Local transcriptions carry the name of their microphone. """
+        self.consumer.stt = mock.Mock(lang='en-US')
+        monitor = {}
+
+        def callback(message):
+            monitor.update(message)
+
+        self.loop.once('recognizer_loop:utterance', callback)
+        self.consumer.handle_local_transcription('Turn on the light', 0.1,
+                                                 'kitchen')
+        self.assertEquals(monitor['utterances'], ['turn on the light'])
+        self.assertEquals(monitor['source'], 'kitchen')
+
+    @mock.patch('mycroft.client.speech.listener.LOG')
+    def test_no_transcription(self, mock_log):
+        """ An engine returning None (e.g. timed out) is not an error. """
+        self.consumer.stt = mock.Mock(lang='en-US')
+        self.consumer.stt.execute.return_value = None
+        stream = mock.Mock()
+        stream.stop.return_value = None
+        monitor = {}
+
+        def callback(message):
+            monitor.update(message)
+
+        self.loop.once('recognizer_loop:utterance', callback)
+        self.consumer.transcribe(AudioData(b'\0' * 3200, 16000, 2))
+        self.consumer.transcribe(AudioData(b'\0' * 3200, 16000, 2), stream)
+        self.assertEquals(monitor, {})
+        self.assertFalse(mock_log.error.called)
+
+    def test_get_stream(self):
+        """ The stream is matched to its phrase, not to its length. """
+        phrase_buffer = PhraseAudioBuffer(3200, b'\0' * 3200)
+        self.consumer.stt_stream = mock.Mock(phrase_buffer=phrase_buffer)
+        audio = AudioData(b'\0' * 3200, 16000, 2)
+        audio.phrase_id = phrase_buffer.id
+        self.assertIs(self.consumer.get_stream(audio),
+                      self.consumer.stt_stream)
+        # Same length, heard by another microphone
+        other = AudioData(b'\0' * 3200, 16000, 2)
+        other.phrase_id = PhraseAudioBuffer(3200).id
+        self.assertIsNone(self.consumer.get_stream(other))
+
+    def test_report(self):
+        """ The statistics are published and cleared periodically. """
+        self.consumer.stt = mock.Mock(spec=CompositeSTT)
+        self.consumer.metrics = mock.Mock()
+        self.consumer.REPORT_SEC = 0.0
+        self.consumer.read = lambda: setattr(self.loop.state, 'running',
+                                             False)
+        self.loop.state.running = True
+        self.consumer.run()
+        self.consumer.stt.report.assert_called_with(self.consumer.metrics)
+        self.assertEqual(self.consumer.metrics.flush.call_count, 2)
+
+    def test_duplicate(self):
+        """ A command heard by two microphones is processed once. """
+        def heard(source, end_time):
+            audio = AudioData(b'\0' * 3200, 16000, 2)
+            audio.source_id = source
+            audio.end_time = end_time
+            return audio
+
+        self.assertFalse(self.consumer.is_duplicate(heard('kitchen', 10.0)))
+        self.assertTrue(self.consumer.is_duplicate(heard('bedroom', 10.5)))
+        self.assertFalse(self.consumer.is_duplicate(heard('kitchen', 10.6)))
+        self.assertFalse(self.consumer.is_duplicate(heard('bedroom', 20.0)))
+        # Single microphone
+        self.assertFalse(self.consumer.is_duplicate(
+            AudioData(b'\0' * 3200, 16000, 2)))
+
+        with mock.patch.object(self.consumer, 'process') as mock_process:
+            self.queue.put(heard('kitchen', 20.2))
+            self.consumer.read()
+            self.assertFalse(mock_process.called)
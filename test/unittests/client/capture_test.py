@@ -0,0 +1,105 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from threading import Event
+
+from mycroft.client.speech.capture import CaptureHub
+
+
+class CountingStream(object):
+    """ Stream returning numbered chunks, up to limit. """
+
+    def __init__(self, limit):
+        self.count = 0
+        self.limit = limit
+        self.done = Event()
+
+    def read(self, size):
+        if self.count >= self.limit:
+            self.done.set()
+            self.done.wait()
+            raise IOError("No more audio")
+        self.count += 1
+        return str(self.count - 1)
+
+
+class MockSource(object):
+    CHUNK = 1024
+    SAMPLE_RATE = 1024  # One chunk per second
+    SAMPLE_WIDTH = 2
+
+    def __init__(self, limit):
+        self.stream = CountingStream(limit)
+
+
+class CaptureHubTest(unittest.TestCase):
+    def create_hub(self, limit, buffer_sec):
+        source = MockSource(limit)
+        errors = []
+        hub = CaptureHub(source, buffer_sec, errors.append)
+        return hub, source, errors
+
+    def read_all(self, cursor):
+        chunks = []
+        try:
+            while True:
+                chunks.append(cursor.read())
+        except EOFError:
+            pass
+        return chunks
+
+    def test_fan_out(self):
+        hub, source, _ = self.create_hub(10, 20)
+        first = hub.create_cursor('first')
+        second = hub.create_cursor('second')
+        hub.start()
+        source.stream.done.wait()
+        hub.stop()
+        expected = [str(i) for i in range(10)]
+        self.assertEqual(self.read_all(first), expected)
+        self.assertEqual(self.read_all(second), expected)
+        self.assertEqual(hub.stats()['first'],
+                         {'lag': 0, 'lag_sec': 0, 'max_lag': 10,
+                          'dropped': 0})
+
+    def test_slow_consumer(self):
+        hub, source, _ = self.create_hub(10, 4)
+        slow = hub.create_cursor('slow')
+        hub.start()
+        source.stream.done.wait()
+        self.assertEqual(slow.lag, 10)
+        hub.stop()
+        # Capture never waited for the consumer, which skips oldest audio
+        self.assertEqual(self.read_all(slow), ['6', '7', '8', '9'])
+        self.assertEqual(slow.dropped, 6)
+        self.assertEqual(slow.max_lag, 4)
+
+    def test_source(self):
+        hub, source, _ = self.create_hub(3, 10)
+        with hub.create_source('recognizer') as capture_source:
+            self.assertEqual(capture_source.CHUNK, source.CHUNK)
+            hub.start()
+            self.assertEqual(capture_source.stream.read(1024), '0')
+            self.assertIn('recognizer', hub.stats())
+        self.assertNotIn('recognizer', hub.stats())
+        hub.stop()
+
+    def test_errors(self):
+        hub, source, errors = self.create_hub(0, 10)
+        hub.start()
+        source.stream.done.wait()
+        hub.stop()
+        self.assertTrue(len(errors) > 0)
+        self.assertTrue(isinstance(errors[0], IOError))
@@ -0,0 +1,125 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+
+from mycroft.client.speech.grammar import VocabularyGrammar
+
+
+class VocabularyGrammarTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.grammar = VocabularyGrammar(lambda word: word != 'xyzzy')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        path = join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def register_weather(self):
+        for word in ['Weather', 'forecast', 'xyzzy']:
+            self.grammar.handle('register_vocab',
+                                {'start': word, 'end': 'WeatherKeyword'})
+        self.grammar.handle('register_intent', {
+            'name': '1:WeatherIntent',
+            'requires': [('WeatherKeyword', 'WeatherKeyword')],
+            'at_least_one': [], 'optional': []
+        })
+
+    def test_empty(self):
+        self.assertIsNone(self.grammar.build())
+        self.grammar.handle('register_vocab', {'regex': '(?P<x>.*)'})
+        self.assertIsNone(self.grammar.build())
+
+    def test_adapt(self):
+        self.register_weather()
+        jsgf = self.grammar.build()
+        self.assertIn('<adapt_1_WeatherIntent> = ( forecast | weather )+;',
+                      jsgf)
+        self.assertIn('public <command> = <adapt_1_WeatherIntent>;', jsgf)
+
+    def test_regex(self):
+        self.grammar.handle('register_vocab', {
+            'regex': 'remind me (to|about) (?P<Reminder>.*)|'
+                     'set a \\w+ reminder (?P<Reminder>.*)'
+        })
+        self.grammar.handle('register_intent', {
+            'name': '3:ReminderIntent',
+            'requires': [('Reminder', 'Reminder')],
+            'at_least_one': [], 'optional': []
+        })
+        self.assertIn('<adapt_3_ReminderIntent> = ( remind me | '
+                      'set a reminder )+;', self.grammar.build())
+
+    def test_padatious(self):
+        self.grammar.handle('padatious:register_entity', {
+            'name': '2:place',
+            'file_name': self.write('place.entity', 'London\nNew York\n')
+        })
+        self.grammar.handle('padatious:register_intent', {
+            'name': '2:weather.intent',
+            'file_name': self.write(
+                'weather.intent',
+                "what's the weather (in | at) {place}\n"
+                "(tell me | ) the forecast\n"
+                "xyzzy weather\n")
+        })
+        jsgf = self.grammar.build()
+        self.assertIn('<padatious_2_weather_intent_place> = london | '
+                      'new york;', jsgf)
+        self.assertIn("<padatious_2_weather_intent> = ( what's the weather "
+                      "( in | at ) <padatious_2_weather_intent_place> ) | "
+                      "( [ tell me ] the forecast );", jsgf)
+
+    def test_incremental(self):
+        self.register_weather()
+        self.grammar.build()
+        rule = self.grammar.rules['1:WeatherIntent']
+        self.grammar.handle('register_vocab',
+                            {'start': 'rain', 'end': 'OtherKeyword'})
+        self.grammar.build()
+        self.assertIs(self.grammar.rules['1:WeatherIntent'], rule)
+        self.grammar.handle('register_vocab',
+                            {'start': 'rain', 'end': 'WeatherKeyword'})
+        self.assertIn('rain', self.grammar.build())
+
+    def test_detach_skill(self):
+        self.register_weather()
+        version = self.grammar.version
+        self.grammar.handle('detach_skill', {'skill_id': '1:'})
+        self.assertGreater(self.grammar.version, version)
+        self.assertIsNone(self.grammar.build())
+
+    def test_clear(self):
+        self.register_weather()
+        version = self.grammar.version
+        self.grammar.clear()
+        self.assertGreater(self.grammar.version, version)
+        self.assertIsNone(self.grammar.build())
+
+    def test_save(self):
+        path = join(self.dir, 'commands.jsgf')
+        self.assertFalse(self.grammar.save(path))
+        self.register_weather()
+        self.assertTrue(self.grammar.save(path))
+        with open(path) as f:
+            self.assertEqual(f.read(), self.grammar.build())
@@ -0,0 +1,121 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+import mock
+
+from mycroft.client.speech.hotword_factory import (
+    PocketsphinxHotWord,
+    PocketsphinxMultiHotWord
+)
+
+
+class PocketsphinxHotWordTest(unittest.TestCase):
+    def setUp(self):
+        self.config = {'module': 'pocketsphinx',
+                       'phonemes': 'HH EY . M AY K R AO F T',
+                       'threshold': 1e-90}
+
+    @mock.patch('pocketsphinx.Decoder')
+    def test_streaming_update(self, mock_decoder):
+        engine = PocketsphinxHotWord('hey mycroft', self.config)
+        self.assertTrue(engine.streaming)
+        decoder = engine.decoder
+        decoder.hyp.return_value = None
+
+        self.assertFalse(engine.update(b'\0\0'))
+        self.assertFalse(engine.update(b'\0\0'))
+        # The utterance is kept open between chunks
+        self.assertEqual(decoder.start_utt.call_count, 1)
+        self.assertEqual(decoder.process_raw.call_count, 2)
+
+        decoder.hyp.return_value = mock.Mock(hypstr='HEY MYCROFT')
+        self.assertTrue(engine.update(b'\0\0'))
+        # A detection restarts the search
+        self.assertEqual(decoder.end_utt.call_count, 1)
+        self.assertFalse(engine.in_utterance)
+
+    @mock.patch('pocketsphinx.Decoder')
+    def test_found_end(self, mock_decoder):
+        engine = PocketsphinxHotWord('hey mycroft', self.config)
+        engine.sample_rate = 16000
+        decoder = engine.decoder
+        decoder.hyp.return_value = None
+        engine.update(b'\0\0' * 16000)
+        decoder.hyp.return_value = mock.Mock(hypstr='HEY MYCROFT')
+        decoder.seg.return_value = [mock.Mock(end_frame=149)]
+        self.assertTrue(engine.update(b'\0\0' * 8000))
+        # Decoded 1.5 s, the phrase ended after 1.5 s
+        self.assertAlmostEqual(engine.found_end, 0.0)
+
+        decoder.seg.return_value = [mock.Mock(end_frame=39)]
+        self.assertTrue(engine.found_wake_word(b'\0\0' * 16000))
+        self.assertAlmostEqual(engine.found_end, 0.6)
+
+    @mock.patch('pocketsphinx.Decoder')
+    def test_windowed_fallback(self, mock_decoder):
+        self.config['streaming'] = False
+        engine = PocketsphinxHotWord('hey mycroft', self.config)
+        self.assertFalse(engine.streaming)
+
+        engine.decoder.hyp.return_value = None
+        engine.update(b'\0\0')
+        # A windowed transcription closes any streaming utterance first
+        engine.found_wake_word(b'\0\0')
+        self.assertEqual(engine.decoder.start_utt.call_count, 2)
+        self.assertEqual(engine.decoder.end_utt.call_count, 2)
+
+
+class PocketsphinxMultiHotWordTest(unittest.TestCase):
+    def setUp(self):
+        self.config = {'module': 'pocketsphinx_multi',
+                       'phonemes': 'HH EY . M AY K R AO F T',
+                       'threshold': 1e-90,
+                       'phrases': {
+                           'wake up': {'phonemes': 'W EY K . AH P',
+                                       'threshold': 1e-20}
+                       }}
+
+    @mock.patch('pocketsphinx.Decoder')
+    @mock.patch('mycroft.client.speech.hotword_factory.LOG')
+    def test_module_name(self, mock_log, mock_decoder):
+        PocketsphinxMultiHotWord('hey mycroft', self.config)
+        self.assertFalse(mock_log.warning.called)
+
+    @mock.patch('pocketsphinx.Decoder')
+    def test_keyword_list(self, mock_decoder):
+        engine = PocketsphinxMultiHotWord('hey mycroft', self.config)
+        decoder = engine.decoder
+        name, kws_file = decoder.set_kws.call_args[0]
+        decoder.set_search.assert_called_with(name)
+        with open(kws_file) as f:
+            self.assertEqual(f.read().splitlines(),
+                             ['hey mycroft /1e-90/', 'wake up /1e-20/'])
+        self.assertEqual(engine.num_phonemes, 10)
+
+    @mock.patch('pocketsphinx.Decoder')
+    def test_found_phrase(self, mock_decoder):
+        engine = PocketsphinxMultiHotWord('hey mycroft', self.config)
+        decoder = engine.decoder
+        decoder.hyp.return_value = None
+        self.assertFalse(engine.update(b'\0\0'))
+
+        decoder.hyp.return_value = mock.Mock(hypstr='WAKE UP')
+        self.assertTrue(engine.update(b'\0\0'))
+        self.assertEqual(engine.found_phrase, 'wake up')
+
+        decoder.hyp.return_value = mock.Mock(hypstr='wake up hey mycroft')
+        self.assertTrue(engine.found_wake_word(b'\0\0'))
+        self.assertEqual(engine.found_phrase, 'hey mycroft')
@@ -0,0 +1,111 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from threading import Timer
+
+import mock
+import pyaudio
+
+from mycroft.client.speech.mic import CallbackStream, MutableStream
+
+
+class MutableStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.wrapped = mock.Mock()
+        self.wrapped.get_read_available.return_value = 1024
+        self.wrapped.read.return_value = b'\1\0' * 1024
+        self.wrapped.get_input_latency.return_value = 0.0
+        self.stream = MutableStream(self.wrapped, pyaudio.paInt16)
+        self.stream.MUTED_WAIT_SEC = 0.01
+
+    def test_read(self):
+        self.assertEqual(self.stream.read(1024), b'\1\0' * 1024)
+        self.assertFalse(self.wrapped.stop_stream.called)
+
+    def test_muted(self):
+        self.stream.mute()
+        # The device is paused rather than drained
+        self.assertEqual(self.stream.read(1024), b'\0\0')
+        self.assertEqual(self.stream.read(1024), b'\0\0')
+        self.assertEqual(self.wrapped.stop_stream.call_count, 1)
+        self.assertFalse(self.wrapped.read.called)
+
+        self.stream.unmute()
+        self.assertEqual(self.stream.read(1024), b'\1\0' * 1024)
+        self.assertEqual(self.wrapped.start_stream.call_count, 1)
+
+    def test_unmuted_while_waiting(self):
+        self.stream.MUTED_WAIT_SEC = 10
+        self.stream.mute()
+        Timer(0.05, self.stream.unmute).start()
+        # Parked until unmuted, then reads audio
+        self.assertEqual(self.stream.read(1024), b'\1\0' * 1024)
+
+
+class CallbackStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.audio = mock.Mock()
+        # 8 frames of 2 bytes in the ring
+        self.stream = CallbackStream(self.audio, rate=4,
+                                     format=pyaudio.paInt16,
+                                     frames_per_buffer=2, buffer_sec=2.0,
+                                     input=True)
+        self.callback = self.audio.open.call_args[1]['stream_callback']
+
+    def capture(self, data, status=0, time_info=None):
+        result = self.callback(data, len(data) // 2, time_info or {}, status)
+        self.assertEqual(result, (None, pyaudio.paContinue))
+
+    def test_open(self):
+        kwargs = self.audio.open.call_args[1]
+        self.assertEqual(kwargs['rate'], 4)
+        self.assertEqual(kwargs['frames_per_buffer'], 2)
+        self.assertTrue(kwargs['input'])
+
+    def test_read_wraps_around(self):
+        self.capture(b'aabbcc')
+        self.assertEqual(self.stream.read(3), b'aabbcc')
+        self.capture(b'ddeeffgg')
+        self.assertEqual(self.stream.get_read_available(), 4)
+        self.assertEqual(self.stream.read(2), b'ddee')
+        self.assertEqual(self.stream.read(2), b'ffgg')
+
+    def test_read_waits(self):
+        Timer(0.05, self.capture, (b'aabb',)).start()
+        self.assertEqual(self.stream.read(2), b'aabb')
+
+    def test_overflow(self):
+        self.capture(b'x' * 16)
+        self.capture(b'yy', status=pyaudio.paInputOverflow)
+        self.assertEqual(self.stream.overflows, 1)
+        self.assertEqual(self.stream.device_overflows, 1)
+        self.assertEqual(self.stream.read(8), b'x' * 16)
+
+    def test_report(self):
+        self.capture(b'aa', time_info={'input_buffer_adc_time': 1.0,
+                                       'current_time': 1.1})
+        self.capture(b'x' * 16)
+        metrics = mock.Mock()
+        self.stream.report(metrics)
+        metrics.increment.assert_any_call("mycroft.mic.overflows", 1)
+        metrics.level.assert_any_call("mycroft.mic.latency_max_s",
+                                      mock.ANY)
+        self.assertAlmostEqual(self.stream.latency_max, 0.0)
+
+    def test_restart_drops_stale_audio(self):
+        self.capture(b'aabb')
+        self.stream.stop_stream()
+        self.stream.start_stream()
+        self.assertEqual(self.stream.get_read_available(), 0)
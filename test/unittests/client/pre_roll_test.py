@@ -0,0 +1,126 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import struct
+import unittest
+
+import mock
+from pyee import EventEmitter
+from speech_recognition import AudioSource
+
+from mycroft.client.speech.audio_buffer import CyclicAudioBuffer
+from mycroft.client.speech.hotword_factory import HotWordEngine
+from mycroft.client.speech.mic import ResponsiveRecognizer
+
+CHUNK = 1024
+WAKE_CHUNK = 10
+
+
+def make_chunk(i):
+    return struct.pack('<h', 1000 + i) * CHUNK
+
+
+class ChunkStream(object):
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self, size):
+        if not self.chunks:
+            raise EOFError
+        return self.chunks.pop(0)
+
+
+class ChunkSource(AudioSource):
+    def __init__(self, chunks):
+        self.stream = ChunkStream(chunks)
+        self.CHUNK = CHUNK
+        self.SAMPLE_RATE = 16000
+        self.SAMPLE_WIDTH = 2
+
+
+class StreamingEngine(HotWordEngine):
+    """ Detects the wake word at the end of chunk WAKE_CHUNK. """
+
+    def __init__(self):
+        super(StreamingEngine, self).__init__('hey mycroft', {})
+        self.streaming = True
+
+    def update(self, chunk):
+        return chunk == make_chunk(WAKE_CHUNK)
+
+
+class PreRollTest(unittest.TestCase):
+    def setUp(self):
+        self.recognizer = ResponsiveRecognizer(StreamingEngine())
+        self.recognizer.skip_wake_word = False
+        self.recognizer.wake_word_archiver = None
+        self.recognizer.utterance_archiver = None
+        self.recognizer._skip_wake_word = lambda: False
+
+    def record(self):
+        source = ChunkSource(make_chunk(i) for i in range(WAKE_CHUNK + 4))
+        emitter = EventEmitter()
+        buffers = []
+        emitter.on('recognizer_loop:record_stream', buffers.append)
+        with mock.patch('mycroft.client.speech.mic.play_wav'):
+            self.assertRaises(EOFError, self.recognizer.listen, source,
+                              emitter)
+        return buffers[0].get().tobytes()
+
+    def test_pre_roll(self):
+        # The wake word ended one chunk before its detection
+        self.recognizer.wake_word_recognizer.found_end = CHUNK / 16000.0
+        self.recognizer.pre_roll_sec = 4 * CHUNK / 16000.0
+        phrase = self.record()
+        self.assertEqual(phrase, b'\0\0' + b''.join(
+            make_chunk(i) for i in range(WAKE_CHUNK, WAKE_CHUNK + 4)))
+
+    def test_no_pre_roll(self):
+        # Without the end of the wake word, recording starts after the
+        # chunk it was detected in
+        self.recognizer.pre_roll_sec = 2 * CHUNK / 16000.0
+        phrase = self.record()
+        self.assertEqual(phrase, b'\0\0' + b''.join(
+            make_chunk(i) for i in range(WAKE_CHUNK + 1, WAKE_CHUNK + 4)))
+
+    def test_windowed(self):
+        source = ChunkSource([])
+        audio_buffer = CyclicAudioBuffer(4 * CHUNK * 2)
+        for i in range(4):
+            audio_buffer.append(make_chunk(i))
+        engine = self.recognizer.wake_word_recognizer
+        engine.streaming = False
+        self.recognizer.streaming_wake_word = False
+        # The silence padding the tested window isn't part of the pre-roll
+        engine.found_end = (CHUNK + 160) / 16000.0
+        self.assertEqual(self.recognizer._get_pre_roll(
+            audio_buffer, source, 2 * CHUNK * 2, 320), make_chunk(3))
+        # Unknown end, the last pre_roll_sec before the detection
+        engine.found_end = None
+        self.assertEqual(self.recognizer._get_pre_roll(
+            audio_buffer, source, 2 * CHUNK * 2, 320),
+            make_chunk(2) + make_chunk(3))
+
+    def test_max_phrase_size(self):
+        source = ChunkSource([])
+        sec_per_buffer = float(CHUNK) / 16000
+        pre_roll = b'\0\0' * 16000 * 60
+        self.recognizer.wake_word_recognizer.found_end = 60.0
+        audio_buffer = CyclicAudioBuffer(len(pre_roll), pre_roll)
+        pre_roll = self.recognizer._get_pre_roll(audio_buffer, source,
+                                                 0, 0)
+        phrase_buffer = self.recognizer._create_phrase_buffer(
+            source, sec_per_buffer, pre_roll)
+        self.assertEqual(self.recognizer.max_phrase_size(source),
+                         phrase_buffer.size)
@@ -0,0 +1,247 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from threading import Event, Lock, Thread
+
+import mock
+
+from mycroft.client.speech.grammar import VocabularyGrammar
+from mycroft.client.speech.listener import AudioProducer, RecognizerLoop, \
+    _get_config_key
+
+RELOADS = ['reload', 'reload_wake_word', 'reload_wakeup', 'reload_stt']
+
+
+def base_config():
+    return {
+        'lang': 'en-us',
+        'listener': {'wake_word': 'hey mycroft', 'sample_rate': 16000},
+        'hotwords': {'hey mycroft': {'module': 'pocketsphinx'}},
+        'stt': {'module': 'mycroft'},
+        'server': {'url': 'https://api.mycroft.ai'}
+    }
+
+
+class RecognizerLoopConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.config = base_config()
+        patches = [mock.patch('mycroft.client.speech.listener.Configuration')]
+        for name in RELOADS:
+            patches.append(mock.patch.object(RecognizerLoop, name))
+        patches.append(mock.patch.object(RecognizerLoop, '_load_config',
+                                         RecognizerLoop._snapshot_config))
+        self.mocks = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+        self.mocks[0].get.side_effect = lambda: self.config
+        self.loop = RecognizerLoop()
+
+    def check(self, *expected):
+        self.loop._check_config()
+        for name, m in zip(RELOADS, self.mocks[1:]):
+            self.assertEqual(m.called, name in expected, name)
+            m.reset_mock()
+
+    def test_get_config_key(self):
+        self.assertEqual(_get_config_key(self.config, 'listener.wake_word'),
+                         'hey mycroft')
+        self.assertIsNone(_get_config_key(self.config, 'listener.phonemes'))
+        self.assertIsNone(_get_config_key(self.config, 'lang.missing'))
+
+    def test_unchanged(self):
+        self.check()
+
+    def test_unrelated_change(self):
+        self.config['server']['url'] = 'http://localhost'
+        self.check()
+
+    def test_wake_word_change(self):
+        self.config['listener']['wake_word'] = 'hey computer'
+        self.check('reload_wake_word')
+        # The new configuration is the reference for the next changes
+        self.check()
+
+    def test_in_place_change(self):
+        # The loaded configuration is updated in place on reload
+        self.config['stt']['module'] = 'google'
+        self.check('reload_stt')
+
+    def test_hotwords_change(self):
+        self.config['hotwords']['wake up'] = {'module': 'pocketsphinx'}
+        self.check('reload_wake_word', 'reload_wakeup')
+
+    def test_listener_change(self):
+        self.config['listener']['sample_rate'] = 44100
+        self.config['listener']['wake_word'] = 'hey computer'
+        self.check('reload')
+
+    def test_lang_change(self):
+        self.config['lang'] = 'de-de'
+        self.check('reload')
+
+
+class RecognizerLoopDevicesTest(unittest.TestCase):
+    @mock.patch('mycroft.client.speech.listener.ResponsiveRecognizer')
+    @mock.patch('mycroft.client.speech.listener.MutableMicrophone')
+    def load(self, devices, mock_mic, mock_recognizer):
+        loop = RecognizerLoop.__new__(RecognizerLoop)
+        loop.mute_calls = 0
+        loop.config_core = {'lang': 'en-us'}
+        loop.config = {'device_index': 0, 'sample_rate': 16000,
+                       'devices': devices}
+        loop.wakeword_recognizer = mock.Mock()
+        loop.create_wake_word_recognizer = mock.Mock()
+        loop.device_configs = loop._get_device_configs()
+        loop._load_devices()
+        return loop, mock_mic, mock_recognizer
+
+    def test_single_device(self):
+        loop, mock_mic, _ = self.load(None)
+        self.assertEqual(len(loop.microphones), 1)
+        self.assertEqual(loop.source_ids, [None])
+        self.assertEqual(mock_mic.call_args[0], (0, 16000))
+        self.assertFalse(loop.create_wake_word_recognizer.called)
+
+    def test_devices(self):
+        loop, mock_mic, mock_recognizer = self.load(
+            [{'name': 'kitchen', 'device_index': 1},
+             {'name': 'bedroom', 'device_index': 2, 'sample_rate': 44100,
+              'wake_word': 'hey computer'}])
+        self.assertEqual(loop.source_ids, ['kitchen', 'bedroom'])
+        self.assertEqual([c[0] for c in mock_mic.call_args_list],
+                         [(1, 16000), (2, 44100)])
+        # Every microphone has its own wake word decoder
+        self.assertEqual(loop.create_wake_word_recognizer.call_count, 1)
+        self.assertEqual(
+            loop.create_wake_word_recognizer.call_args[0][0]['wake_word'],
+            'hey computer')
+        self.assertIs(loop.microphone, loop.microphones[0])
+        # The recognizers get the settings of their device
+        configs = [c[1]['config'] for c in mock_recognizer.call_args_list]
+        self.assertEqual([c['listener']['sample_rate'] for c in configs],
+                         [16000, 44100])
+        self.assertEqual(configs[0]['lang'], 'en-us')
+
+    @mock.patch('mycroft.client.speech.listener.check_for_signal',
+                return_value=True)
+    def test_devices_local_stt(self, _):
+        """ The local STT listens to every microphone. """
+        loop, _, _ = self.load([{'name': 'kitchen'}, {'name': 'bedroom'}])
+        self.assertEqual(loop.source_ids, ['kitchen', 'bedroom'])
+        self.assertEqual(loop.create_wake_word_recognizer.call_count, 1)
+
+
+class RecognizerLoopGrammarTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = RecognizerLoop.__new__(RecognizerLoop)
+        self.loop.config = {}
+        self.loop.grammar = VocabularyGrammar()
+        self.loop.grammar_path = '/tmp/commands.jsgf'
+        self.loop._grammar_lock = Lock()
+        self.loop._grammar_timer = None
+        self.loop.grammar_complete = False
+        self.loop.wakeword_recognizer = mock.Mock()
+        self.loop.consumer = mock.Mock()
+        patcher = mock.patch.object(self.loop.grammar, 'save',
+                                    return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('mycroft.client.speech.listener.'
+                             'check_for_signal', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.loop._grammar_timer.cancel()
+
+    def test_language_model_kept(self):
+        self.loop.update_grammar('register_vocab', {'start': 'weather',
+                                                    'end': 'Weather'})
+        self.loop.apply_grammar()
+        self.assertFalse(self.loop.consumer.set_grammar.called)
+
+    def test_set_vocabulary(self):
+        self.loop.update_grammar('register_intent', {'name': '1:Old'})
+        self.loop.set_vocabulary([
+            ['register_vocab', {'start': 'weather', 'end': 'Weather'}],
+            ['register_intent', {'name': '1:Weather',
+                                 'requires': [['Weather', 'Weather']]}]
+        ])
+        self.assertTrue(self.loop.grammar_complete)
+        self.assertEqual(list(self.loop.grammar.intents), ['1:Weather'])
+        self.loop.apply_grammar()
+        self.loop.consumer.set_grammar.assert_called_once_with(
+            '/tmp/commands.jsgf', self.loop.grammar.version)
+
+
+class AudioProducerReportTest(unittest.TestCase):
+    def setUp(self):
+        self.producer = AudioProducer(mock.Mock(), None, mock.Mock(),
+                                      mock.Mock(), mock.Mock(),
+                                      source_id='kitchen')
+        self.producer.hub = mock.Mock(sec_per_chunk=0.5)
+        self.producer.metrics = mock.Mock()
+
+    def set_stats(self, lag, max_lag, dropped):
+        self.producer.hub.stats.return_value = {'recognizer': {
+            'lag': lag, 'lag_sec': lag * 0.5, 'max_lag': max_lag,
+            'dropped': dropped}}
+
+    @mock.patch('mycroft.client.speech.listener.LOG')
+    def test_report(self, mock_log):
+        self.set_stats(1, 4, 0)
+        self.producer.report()
+        self.assertTrue(mock_log.debug.called)
+        self.producer.metrics.level.assert_any_call(
+            'mycroft.capture.kitchen.recognizer.max_lag_s', 2.0)
+        self.producer.mic.report_metrics.assert_called_with(
+            self.producer.metrics)
+        self.producer.recognizer.report_metrics.assert_called_with(
+            self.producer.metrics)
+        # Published and cleared at every report
+        self.assertEqual(self.producer.metrics.flush.call_count, 1)
+
+        # Chunks dropped since the last report are warned about
+        self.set_stats(2, 8, 3)
+        self.producer.report()
+        self.assertTrue(mock_log.warning.called)
+        self.producer.metrics.increment.assert_called_with(
+            'mycroft.capture.kitchen.recognizer.dropped', 3)
+        self.producer.report()
+        self.producer.metrics.increment.assert_called_with(
+            'mycroft.capture.kitchen.recognizer.dropped', 0)
+
+    def test_concurrent_report(self):
+        """ The final report of the producer waits for the loop's one. """
+        self.set_stats(1, 4, 0)
+        entered = Event()
+        release = Event()
+
+        def report_metrics(metrics):
+            entered.set()
+            release.wait(5)
+
+        self.producer.mic.report_metrics.side_effect = report_metrics
+        first = Thread(target=self.producer.report)
+        first.start()
+        entered.wait(5)
+        second = Thread(target=self.producer.report)
+        second.start()
+        second.join(0.2)
+        self.assertEqual(self.producer.mic.report_metrics.call_count, 1)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(self.producer.metrics.flush.call_count, 2)
@@ -0,0 +1,153 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import unittest
+from Queue import Queue
+from threading import Event
+
+from mycroft.client.speech.transcriber_pool import TranscriberPool
+
+
+class Hyp(object):
+    def __init__(self, hypstr):
+        self.hypstr = hypstr
+
+
+class EchoDecoder(object):
+    """ Decoder "transcribing" audio to its own content. """
+    search = ''
+
+    def set_jsgf_file(self, name, path):
+        pass
+
+    def set_search(self, name):
+        self.search = name + ':'
+
+    def start_utt(self):
+        self.data = b''
+
+    def process_raw(self, data, no_search, full_utt):
+        self.data += data
+
+    def end_utt(self):
+        pass
+
+    def hyp(self):
+        return Hyp(self.search + self.data) if self.data else None
+
+
+class CrashingDecoder(EchoDecoder):
+    """ Decoder killing its process when given "crash". """
+    def end_utt(self):
+        if self.data == b'crash':
+            os._exit(1)
+
+
+class TranscriberPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = TranscriberPool(EchoDecoder, num_workers=2,
+                                    max_audio_size=16)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_results(self):
+        results = {}
+        done = Event()
+
+        def callback(text, hypstr, decode_time):
+            results[text] = hypstr
+            self.assertGreaterEqual(decode_time, 0)
+            if len(results) == 10:
+                done.set()
+
+        # More jobs than slots, submit() waits for slots to be freed
+        for i in range(10):
+            text = 'audio %d' % i
+            self.pool.submit(text,
+                             lambda h, t, text=text: callback(text, h, t))
+        done.wait(10)
+        self.assertEqual(len(results), 10)
+        for text, hypstr in results.items():
+            self.assertEqual(text, hypstr)
+
+    def test_truncated(self):
+        results = []
+        done = Event()
+
+        def callback(hypstr, decode_time):
+            results.append(hypstr)
+            done.set()
+
+        self.pool.submit(b'x' * 100, callback)
+        done.wait(10)
+        self.assertEqual(results, [b'x' * 16])
+
+    def test_empty(self):
+        results = []
+        done = Event()
+
+        def callback(hypstr, decode_time):
+            results.append(hypstr)
+            done.set()
+
+        self.pool.submit(b'', callback)
+        done.wait(10)
+        self.assertEqual(results, [None])
+
+    def test_grammar(self):
+        results = []
+        done = Event()
+
+        def callback(hypstr, decode_time):
+            results.append(hypstr)
+            done.set()
+
+        self.pool.set_grammar('/tmp/commands.jsgf', 1)
+        self.pool.submit(b'audio', callback)
+        done.wait(10)
+        self.assertEqual(results, [b'commands1:audio'])
+
+    def test_dropped(self):
+        self.pool.free_slots = Queue()
+        self.pool.SLOT_TIMEOUT_SEC = 0.1
+        self.assertFalse(self.pool.submit(b'audio', lambda h, t: None))
+
+
+class TranscriberPoolCrashTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = TranscriberPool(CrashingDecoder, num_workers=1,
+                                    max_audio_size=16)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_crash(self):
+        results = []
+        done = Event()
+
+        def callback(hypstr, decode_time):
+            results.append(hypstr)
+            done.set()
+
+        # The worker is replaced and the slots of the lost utterances freed
+        for _ in range(3):
+            self.assertTrue(self.pool.submit(b'crash', callback))
+        self.assertTrue(self.pool.submit(b'audio', callback))
+        done.wait(20)
+        self.assertEqual(results, [b'audio'])
+        self.assertEqual(len(self.pool.workers), 1)
+        self.assertEqual(self.pool.jobs, {})
+        self.assertEqual(self.pool.free_slots.qsize(), 2)
@@ -0,0 +1,127 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import audioop
+import math
+import random
+import struct
+import unittest
+
+from mycroft.client.speech.vad import (
+    NoiseFloorEstimator,
+    SpectralVAD,
+    VADEngine,
+    VADFactory
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RATE = 16000
+CHUNK = 1024
+
+
+def noise_chunk(amplitude):
+    return struct.pack('<%dh' % CHUNK, *[
+        int(random.uniform(-amplitude, amplitude)) for _ in range(CHUNK)])
+
+
+def voiced_chunk(amplitude, offset=0):
+    # Harmonics of a 200 Hz fundamental, roughly like a vowel
+    return struct.pack('<%dh' % CHUNK, *[
+        int(amplitude / 3 * sum(math.sin(2 * math.pi * f * (i + offset) /
+                                         RATE) for f in (200, 400, 800)))
+        for i in range(CHUNK)])
+
+
+class VADEngineTest(unittest.TestCase):
+    def test_energy(self):
+        vad = VADEngine()
+        chunk = voiced_chunk(3000)
+        energy = vad.calc_energy(chunk, 2)
+        self.assertEqual(energy, audioop.rms(chunk, 2))
+        self.assertTrue(vad.is_speech(chunk, energy, energy - 1))
+        self.assertFalse(vad.is_speech(chunk, energy, energy + 1))
+
+    def test_factory(self):
+        self.assertEqual(type(VADFactory.create()), VADEngine)
+        vad = VADFactory.create({'module': 'unknown'})
+        self.assertEqual(type(vad), VADEngine)
+
+
+class NoiseFloorEstimatorTest(unittest.TestCase):
+    SEC_PER_CHUNK = 0.1
+
+    def feed(self, estimator, energies):
+        for energy in energies:
+            estimator.update(energy, self.SEC_PER_CHUNK)
+
+    def test_speech_with_pauses(self):
+        estimator = NoiseFloorEstimator(window_sec=5.0)
+        self.assertIsNone(estimator.floor)
+        # Words at 2000 with short pauses at the background level of 100
+        self.feed(estimator, ([2000] * 8 + [100] * 4) * 5)
+        self.assertLess(estimator.floor, 200)
+
+    def test_follows_background(self):
+        estimator = NoiseFloorEstimator(window_sec=5.0)
+        self.feed(estimator, [100] * 50)
+        self.assertAlmostEqual(estimator.floor, 100)
+        # Louder background is accepted once the window has passed
+        self.feed(estimator, [500] * 60)
+        self.assertAlmostEqual(estimator.floor, 500, delta=1)
+        # Quieter background is accepted right away
+        self.feed(estimator, [50] * 10)
+        self.assertLess(estimator.floor, 60)
+
+    def test_ignores_muted(self):
+        estimator = NoiseFloorEstimator()
+        self.feed(estimator, [100] * 10 + [0] * 10)
+        self.assertAlmostEqual(estimator.floor, 100)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class SpectralVADTest(unittest.TestCase):
+    def setUp(self):
+        self.vad = VADFactory.create({'module': 'spectral'}, RATE)
+
+    def is_speech(self, chunk):
+        energy = self.vad.calc_energy(chunk, 2)
+        return self.vad.is_speech(chunk, energy, 0)
+
+    def test_factory(self):
+        self.assertEqual(type(self.vad), SpectralVAD)
+
+    def test_calc_energy(self):
+        chunk = voiced_chunk(3000)
+        self.assertAlmostEqual(self.vad.calc_energy(chunk, 2),
+                               audioop.rms(chunk, 2), delta=1)
+
+    def test_speech_over_noise(self):
+        for i in range(20):
+            self.assertFalse(self.is_speech(noise_chunk(50)))
+        for i in range(5):
+            self.assertTrue(self.is_speech(voiced_chunk(3000, i * CHUNK)))
+        self.assertFalse(self.is_speech(noise_chunk(50)))
+
+    def test_loud_noise_is_not_speech(self):
+        for i in range(20):
+            self.assertFalse(self.is_speech(noise_chunk(50)))
+        # Broadband noise has a high zero-crossing rate
+        self.assertFalse(self.is_speech(noise_chunk(5000)))
+
+    def test_muted_chunk(self):
+        self.assertFalse(self.is_speech(b'\0\0'))
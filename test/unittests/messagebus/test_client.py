@@ -0,0 +1,139 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import shutil
+import tempfile
+import unittest
+from threading import Event, Thread
+
+import mock
+from os.path import join
+from tornado import ioloop, web
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_unix_socket
+
+from mycroft.messagebus import build_socket_path
+from mycroft.messagebus.client.ws import UnixSocketApp, WebsocketClient
+from mycroft.messagebus.message import Message
+from mycroft.messagebus.service.ws import WebsocketEventHandler
+
+
+class WebsocketClientDispatchTest(unittest.TestCase):
+    def setUp(self):
+        self.ws = WebsocketClient(fmt='json')
+        self.ws.client = mock.Mock()
+        self.ws.pool = mock.Mock()
+
+    def receive(self, message):
+        self.ws.on_message(self.ws.client, message.serialize())
+
+    @mock.patch('mycroft.messagebus.message.Message.deserialize')
+    def test_uninteresting(self, mock_deserialize):
+        self.receive(Message('enclosure.mouth.viseme', {'code': '3'}))
+        self.receive(Message('enclosure.mouth.viseme', {'code': '4'}))
+        self.assertFalse(mock_deserialize.called)
+        self.assertFalse(self.ws.pool.apply_async.called)
+        self.assertEqual(self.ws.dropped['enclosure.mouth.viseme'], 2)
+
+    def test_dispatch(self):
+        handler = mock.Mock()
+        self.ws.on('speak', handler)
+        self.receive(Message('speak', {'utterance': 'hello'}))
+        func, (message,) = self.ws.pool.apply_async.call_args[0]
+        self.assertEqual(message.data, {'utterance': 'hello'})
+        func(message)
+        handler.assert_called_once_with(message)
+        self.assertEqual(self.ws.dropped, {})
+
+    def test_raw_listeners(self):
+        raw = mock.Mock()
+        self.ws.on('received', raw)
+        message = Message('speak', {'utterance': 'hello'})
+        self.receive(message)
+        raw.assert_called_once_with(message.serialize())
+        self.assertFalse(self.ws.pool.apply_async.called)
+
+    def test_legacy_serializer(self):
+        handler = mock.Mock()
+        self.ws.on('speak', handler)
+        self.ws.on_message(self.ws.client, '{"data": {}, "type": "speak", '
+                                           '"context": null}')
+        message = self.ws.pool.apply_async.call_args[0][1][0]
+        self.assertEqual(message.type, 'speak')
+
+
+class UnixSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = join(self.directory, 'bus.sock')
+
+    @mock.patch('mycroft.messagebus.get_ipc_directory')
+    def test_socket_path(self, mock_ipc):
+        mock_ipc.return_value = '/tmp/mycroft/ipc'
+        self.assertEqual(build_socket_path('bus.sock'),
+                         '/tmp/mycroft/ipc/bus.sock')
+        self.assertEqual(build_socket_path('/run/bus'), '/run/bus')
+        self.assertIsNone(build_socket_path(''))
+
+    def test_transport(self):
+        ws = WebsocketClient(fmt='json')
+        ws.socket_path = self.path
+        # The bus doesn't listen to the socket
+        self.assertNotIsInstance(ws.create_client(), UnixSocketApp)
+        sock = bind_unix_socket(self.path)
+        self.addCleanup(sock.close)
+        self.assertIsInstance(ws.create_client(), UnixSocketApp)
+        self.assertNotIsInstance(ws.create_client(unix_socket=False),
+                                 UnixSocketApp)
+
+    def test_stale_socket(self):
+        # Left by a bus which isn't running, connecting is refused
+        sock = bind_unix_socket(self.path)
+        sock.close()
+        ws = WebsocketClient(fmt='json')
+        ws.socket_path = self.path
+        ws.client = ws.create_client()
+        with mock.patch.object(WebsocketClient, 'run_forever') as mock_run:
+            ws.client.run_forever()
+        self.assertNotIsInstance(ws.client, UnixSocketApp)
+        self.assertTrue(mock_run.called)
+
+    def test_round_trip(self):
+        app = web.Application([('/core', WebsocketEventHandler)])
+        loop = ioloop.IOLoop()
+        server = HTTPServer(app, io_loop=loop)
+        server.add_socket(bind_unix_socket(self.path))
+        thread = Thread(target=loop.start)
+        thread.daemon = True
+        thread.start()
+
+        ws = WebsocketClient(fmt='json')
+        ws.socket_path = self.path
+        ws.client = ws.create_client()
+        received = Event()
+        ws.on('speak', lambda message: received.set())
+        ws.once('open', lambda: ws.emit(Message('speak')))
+        client_thread = Thread(target=ws.run_forever)
+        client_thread.daemon = True
+        client_thread.start()
+        try:
+            self.assertTrue(received.wait(5))
+        finally:
+            ws.close()
+            client_thread.join(5)
+            loop.add_callback(server.stop)
+            loop.add_callback(loop.stop)
+            thread.join(5)
+        self.assertFalse(client_thread.is_alive())
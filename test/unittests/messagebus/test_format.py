@@ -0,0 +1,164 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import unittest
+
+import mock
+from websocket import ABNF
+
+from mycroft.messagebus.client.ws import WebsocketClient
+from mycroft.messagebus.message import Message, is_msgpack, parse_header
+from mycroft.messagebus.service import ws as service
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MockHandler(service.WebsocketEventHandler):
+    def __init__(self, fmt='json'):
+        self.emitter = mock.Mock()
+        self.write_message = mock.Mock()
+        self.format = fmt
+
+
+class HeaderTest(unittest.TestCase):
+    def test_json(self):
+        message = Message('speak', {'type': 'data type'}, {'target': 'cli'})
+        self.assertEqual(parse_header(message.serialize()),
+                         ('speak', {'target': 'cli'}))
+        self.assertEqual(parse_header(Message('a"b').serialize()),
+                         ('a"b', None))
+
+    def test_other_layouts(self):
+        # Decoding the data would be needed to find the type
+        self.assertIsNone(parse_header(
+            '{"data": {"type": "x"}, "type": "speak", "context": null}'))
+        self.assertIsNone(parse_header('{"type": "speak", "context": {'))
+
+    def test_truncated(self):
+        frame = Message('speak', {'utterance': 'hello'}).serialize()
+        self.assertEqual(parse_header(frame), ('speak', None))
+        self.assertIsNone(parse_header(frame[:-5]))
+        self.assertIsNone(parse_header(frame + ' '))
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        message = Message('speak', {'type': 'data type'}, {'target': 'cli'})
+        self.assertEqual(parse_header(message.serialize('msgpack')),
+                         ('speak', {'target': 'cli'}))
+        # Any order of the keys
+        packed = msgpack.packb({'data': [1, 2], 'type': 'speak',
+                                'context': None})
+        self.assertEqual(parse_header(packed), ('speak', None))
+
+        frame = message.serialize('msgpack')
+        self.assertIsNone(parse_header(frame[:-3]))
+        self.assertIsNone(parse_header(frame + '\x00'))
+
+        # Large messages, the header is read without decoding the data
+        message.data = {'items': ['word %d' % i for i in range(100)]}
+        frame = message.serialize('msgpack')
+        self.assertEqual(parse_header(frame), ('speak', {'target': 'cli'}))
+        self.assertIsNone(parse_header(frame[:-3]))
+        self.assertIsNone(parse_header(frame + '\x00'))
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class MessageFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.message = Message('speak', {'utterance': u'h\xe9llo',
+                                         'values': [1, 2.5, None, True]},
+                               {'source': 'kitchen'})
+
+    def test_round_trip(self):
+        packed = self.message.serialize('msgpack')
+        self.assertTrue(is_msgpack(packed))
+        self.assertFalse(is_msgpack(self.message.serialize()))
+        self.assertFalse(is_msgpack(''))
+        # Decodes to the same message as JSON
+        self.assertEqual(Message.deserialize(packed).__dict__,
+                         Message.deserialize(self.message.serialize())
+                         .__dict__)
+
+    def test_translation(self):
+        sender = MockHandler('msgpack')
+        binary = MockHandler('msgpack')
+        text = MockHandler('json')
+        for handler in (sender, binary, text):
+            service.subscriptions.add(handler)
+            self.addCleanup(service.subscriptions.remove, handler)
+
+        frame = self.message.serialize('msgpack')
+        sender.on_message(frame)
+        # Forwarded as is to the peers using the same format
+        self.assertIs(binary.write_message.call_args[0][0], frame)
+        self.assertEqual(binary.write_message.call_args[1],
+                         {'binary': True})
+        text_frame = text.write_message.call_args[0][0]
+        self.assertEqual(json.loads(text_frame)['data']['utterance'],
+                         u'h\xe9llo')
+        self.assertEqual(text.write_message.call_args[1], {'binary': False})
+
+    def test_negotiation(self):
+        handler = MockHandler()
+        handler.on_message(Message('mycroft.bus.set_format',
+                                   {'format': 'msgpack'}).serialize())
+        self.assertEqual(handler.format, 'msgpack')
+        handler.on_message(Message('mycroft.bus.set_format',
+                                   {'format': 'xml'}).serialize())
+        self.assertEqual(handler.format, 'msgpack')
+        reply = json.loads(handler.write_message.call_args[0][0])
+        self.assertEqual(reply['data'], {'format': 'msgpack'})
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class WebsocketClientFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.ws = WebsocketClient(fmt='msgpack')
+        self.ws.client = mock.Mock()
+        self.ws.pool = mock.Mock()
+
+    def test_negotiation(self):
+        self.ws.on_open(self.ws.client)
+        sent = [json.loads(c[0][0])['type'] for c in
+                self.ws.client.send.call_args_list]
+        self.assertEqual(sent, ['mycroft.bus.subscribe',
+                                'mycroft.bus.set_format'])
+        self.assertEqual(self.ws.format, 'json')
+
+        self.ws.on_message(self.ws.client, Message(
+            'mycroft.bus.format', {'format': 'msgpack'}).serialize())
+        self.ws.emit(Message('speak'))
+        data, opcode = self.ws.client.send.call_args[0]
+        self.assertEqual(Message.deserialize(data).type, 'speak')
+        self.assertEqual(opcode, ABNF.OPCODE_BINARY)
+
+        # A new connection starts in JSON
+        self.ws.on_open(self.ws.client)
+        self.assertEqual(self.ws.format, 'json')
+
+    def test_raw_listeners(self):
+        received = mock.Mock()
+        message = mock.Mock()
+        self.ws.on('received', received)
+        self.ws.on('message', message)
+        frame = Message('speak').serialize('msgpack')
+        self.ws.on_message(self.ws.client, frame)
+        # Logged as received, "message" listeners always get JSON
+        received.assert_called_once_with(frame)
+        self.assertEqual(json.loads(message.call_args[0][0])['type'],
+                         'speak')
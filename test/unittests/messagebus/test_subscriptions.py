@@ -0,0 +1,195 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import unittest
+
+import mock
+
+from mycroft.messagebus.client.ws import WebsocketClient
+from mycroft.messagebus.message import Message, available_formats
+from mycroft.messagebus.service import ws as service
+
+
+class SubscriptionsTest(unittest.TestCase):
+    def setUp(self):
+        self.subscriptions = service.Subscriptions()
+        self.legacy, self.speech, self.gui = 'legacy', 'speech', 'gui'
+        for client in (self.legacy, self.speech, self.gui):
+            self.subscriptions.add(client)
+        self.subscriptions.subscribe(self.speech, ['mycroft.mic.mute'])
+        self.subscriptions.subscribe(self.gui, ['enclosure.*', 'speak'])
+
+    def test_clients(self):
+        clients = self.subscriptions.clients
+        self.assertEqual(clients('mycroft.mic.mute'),
+                         set([self.legacy, self.speech]))
+        self.assertEqual(clients('enclosure.mouth.viseme'),
+                         set([self.legacy, self.gui]))
+        self.assertEqual(clients('speak'), set([self.legacy, self.gui]))
+        self.assertEqual(clients('skill.converse.request'),
+                         set([self.legacy]))
+        self.assertEqual(clients(None), set([self.legacy]))
+
+    def test_all(self):
+        self.subscriptions.subscribe(self.speech, ['*'])
+        self.assertIn(self.speech, self.subscriptions.clients('anything'))
+
+    def test_unsubscribe(self):
+        self.subscriptions.unsubscribe(self.gui, ['speak'])
+        self.assertNotIn(self.gui, self.subscriptions.clients('speak'))
+        self.subscriptions.unsubscribe(self.speech, ['mycroft.mic.mute'])
+        # Nothing left, but the connection doesn't receive everything again
+        self.assertNotIn(self.speech, self.subscriptions.clients('other'))
+        self.assertNotIn('mycroft.mic.mute', self.subscriptions.types)
+
+    def test_remove(self):
+        self.subscriptions.remove(self.gui)
+        self.subscriptions.remove(self.legacy)
+        self.assertEqual(self.subscriptions.clients('enclosure.eyes.blink'),
+                         set())
+        self.assertEqual(self.subscriptions.prefixes, {})
+
+
+class MockHandler(service.WebsocketEventHandler):
+    def __init__(self):
+        self.emitter = mock.Mock()
+        self.write_message = mock.Mock()
+
+
+class WebsocketEventHandlerTest(unittest.TestCase):
+    def create_handler(self):
+        handler = MockHandler()
+        service.subscriptions.add(handler)
+        self.addCleanup(service.subscriptions.remove, handler)
+        return handler
+
+    def send(self, handler, message):
+        handler.on_message(message.serialize())
+
+    def test_routing(self):
+        sender = self.create_handler()
+        listener = self.create_handler()
+        legacy = self.create_handler()
+        self.send(sender, Message('mycroft.bus.subscribe', {'topics': []}))
+        self.send(listener, Message('mycroft.bus.subscribe',
+                                    {'topics': ['speak']}))
+        # Subscriptions are not broadcast
+        self.assertFalse(legacy.write_message.called)
+
+        self.send(sender, Message('speak', {'utterance': 'hello'}))
+        self.send(sender, Message('enclosure.mouth.viseme'))
+        self.assertFalse(sender.write_message.called)
+        self.assertEqual(listener.write_message.call_count, 1)
+        self.assertEqual(legacy.write_message.call_count, 2)
+        sent = json.loads(listener.write_message.call_args[0][0])
+        self.assertEqual(sent['type'], 'speak')
+
+    @mock.patch('mycroft.messagebus.message.Message.deserialize')
+    def test_header_only(self, mock_deserialize):
+        sender = self.create_handler()
+        sender.emitter = service.EventBusEmitter
+        listener = self.create_handler()
+        message = Message('enclosure.mouth.viseme', {'code': '3'})
+        self.send(sender, message)
+        # Forwarded without building the message
+        self.assertFalse(mock_deserialize.called)
+        self.assertEqual(listener.write_message.call_args[0][0],
+                         message.serialize())
+
+        # Decoded for the handlers of the bus process
+        handler = mock.Mock()
+        service.EventBusEmitter.on('enclosure.mouth.viseme', handler)
+        self.addCleanup(service.EventBusEmitter.remove_all_listeners,
+                        'enclosure.mouth.viseme')
+        self.send(sender, message)
+        mock_deserialize.assert_called_once_with(message.serialize())
+        handler.assert_called_once_with(mock_deserialize.return_value)
+
+    def test_malformed(self):
+        sender = self.create_handler()
+        listener = self.create_handler()
+        frame = Message('speak', {'utterance': 'hello'}).serialize()
+        sender.on_message(frame[:-5])
+        sender.on_message(frame + 'x')
+        self.assertFalse(listener.write_message.called)
+
+
+class WebsocketClientSubscriptionTest(unittest.TestCase):
+    def setUp(self):
+        self.ws = WebsocketClient(fmt='json')
+        self.ws.client = mock.Mock()
+
+    def sent(self):
+        messages = [json.loads(c[0][0]) for c in
+                    self.ws.client.send.call_args_list]
+        self.ws.client.send.reset_mock()
+        return [(m['type'], m['data']['topics']) for m in messages]
+
+    def test_handlers(self):
+        handler = mock.Mock()
+        self.ws.on('speak', handler)
+        self.ws.on('speak', mock.Mock())
+        self.ws.on('open', handler)
+        self.assertEqual(self.sent(), [('mycroft.bus.subscribe', ['speak'])])
+        self.ws.remove('speak', handler)
+        self.assertEqual(self.sent(), [])
+        self.ws.remove_all_listeners('speak')
+        self.assertEqual(self.sent(),
+                         [('mycroft.bus.unsubscribe', ['speak'])])
+
+    def test_all(self):
+        self.ws.on('received', mock.Mock())
+        self.assertEqual(self.sent(), [])
+        self.ws.on('message', mock.Mock())
+        self.assertEqual(self.sent(), [('mycroft.bus.subscribe', ['*'])])
+
+    def test_once(self):
+        handler = mock.Mock()
+        self.ws.once('mycroft.skills.loaded', handler)
+        self.assertEqual(self.sent(), [('mycroft.bus.subscribe',
+                                        ['mycroft.skills.loaded'])])
+        self.ws.dispatch(Message('mycroft.skills.loaded'))
+        self.assertTrue(handler.called)
+        self.assertEqual(self.sent(), [('mycroft.bus.unsubscribe',
+                                        ['mycroft.skills.loaded'])])
+
+    def test_reconnect(self):
+        self.ws.on('speak', mock.Mock())
+        self.sent()
+        self.ws.on_open(self.ws.client)
+        self.assertEqual(self.sent(), [('mycroft.bus.subscribe', ['speak'])])
+
+    def test_malformed(self):
+        handler = mock.Mock()
+        self.ws.on('speak', handler)
+        self.ws.pool = mock.Mock()
+        frame = Message('speak', {'utterance': 'hello'}).serialize()
+        # The bus routes on the header, the data is checked here
+        self.ws.on_message(None, frame.replace('hello"', 'hello'))
+        self.assertFalse(self.ws.pool.apply_async.called)
+        self.ws.on_message(None, frame)
+        self.assertTrue(self.ws.pool.apply_async.called)
+
+    @unittest.skipIf('msgpack' not in available_formats(),
+                     'msgpack is not installed')
+    def test_received(self):
+        handler = mock.Mock()
+        self.ws.on('received', handler)
+        frame = Message('speak', {'utterance': 'hello'}).serialize('msgpack')
+        with mock.patch.object(Message, 'deserialize') as mock_deserialize:
+            self.ws.on_message(None, frame)
+        # Passed as received, nothing listens to the message itself
+        handler.assert_called_once_with(frame)
+        self.assertFalse(mock_deserialize.called)
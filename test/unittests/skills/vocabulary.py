@@ -0,0 +1,82 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from pyee import EventEmitter
+
+from mycroft.messagebus.message import Message
+from mycroft.skills.vocabulary import VocabularyCache, VOCABULARY_REQUEST, \
+    VOCABULARY_RESPONSE
+
+
+class MockEmitter(EventEmitter):
+    def __init__(self):
+        super(MockEmitter, self).__init__()
+        self.sent = []
+
+    def emit(self, message, *args):
+        if isinstance(message, Message):
+            self.sent.append(message)
+            super(MockEmitter, self).emit(message.type, message)
+        else:
+            super(MockEmitter, self).emit(message, *args)
+
+
+class VocabularyCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.emitter = MockEmitter()
+        self.cache = VocabularyCache(self.emitter)
+
+    def request(self):
+        self.emitter.sent = []
+        self.emitter.emit(Message(VOCABULARY_REQUEST))
+        response = self.emitter.sent[-1]
+        self.assertEqual(response.type, VOCABULARY_RESPONSE)
+        return response.data['registrations']
+
+    def register(self, msg_type, data):
+        self.emitter.emit(Message(msg_type, data))
+
+    def test_request(self):
+        self.assertEqual(self.request(), [])
+        self.register('register_vocab', {'start': 'weather',
+                                         'end': 'WeatherKeyword'})
+        self.register('register_vocab', {'start': 'weather',
+                                         'end': 'WeatherKeyword'})
+        self.register('register_vocab', {'regex': '(?P<Place>.*)'})
+        self.register('register_intent', {'name': '1:WeatherIntent'})
+        self.assertEqual(self.request(), [
+            ['register_vocab', {'start': 'weather', 'end': 'WeatherKeyword'}],
+            ['register_vocab', {'regex': '(?P<Place>.*)'}],
+            ['register_intent', {'name': '1:WeatherIntent'}]
+        ])
+
+    def test_detach(self):
+        self.register('register_vocab', {'start': 'weather',
+                                         'end': 'WeatherKeyword'})
+        self.register('register_intent', {'name': '1:WeatherIntent'})
+        self.register('register_intent', {'name': '1:ForecastIntent'})
+        self.register('padatious:register_intent',
+                      {'name': '2:time.intent', 'file_name': 'time.intent'})
+        self.register('detach_intent', {'intent_name': '1:ForecastIntent'})
+        self.register('detach_skill', {'skill_id': '2:'})
+        self.assertEqual(self.request(), [
+            ['register_vocab', {'start': 'weather', 'end': 'WeatherKeyword'}],
+            ['register_intent', {'name': '1:WeatherIntent'}]
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,14 +12,59 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import json
 import unittest
+from threading import Event, Thread
 
 import mock
+from requests import Session
+from tornado import gen, ioloop, web, websocket
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
 
 import mycroft.stt
 from mycroft.configuration import Configuration
 
 
+class MockKaldiHandler(websocket.WebSocketHandler):
+    """ Stand-in for a kaldi-gstreamer-server speech endpoint. """
+    received = []
+
+    def open(self):
+        MockKaldiHandler.received = []
+        self.content_type = self.get_argument('content-type')
+
+    def on_message(self, message):
+        if message == 'EOS':
+            num_bytes = sum(len(m) for m in MockKaldiHandler.received)
+            for transcript in ['[noise] hello', 'world %d' % num_bytes]:
+                self.write_message(json.dumps({
+                    'status': 0,
+                    'result': {'hypotheses': [{'transcript': transcript}],
+                               'final': True}
+                }))
+            self.close()
+        else:
+            MockKaldiHandler.received.append(message)
+            self.write_message(json.dumps({
+                'status': 0,
+                'result': {'hypotheses': [{'transcript': 'hel'}],
+                           'final': False}
+            }))
+
+
+class MockKaldiHttpHandler(web.RequestHandler):
+    """ Stand-in for a kaldi HTTP endpoint, slow or failing on demand. """
+
+    @gen.coroutine
+    def post(self, delay, utterance):
+        yield gen.sleep(float(delay))
+        if utterance == 'error':
+            self.set_status(500)
+        else:
+            self.write({'hypotheses': [{'utterance': utterance}]})
+
+
 class TestSTT(unittest.TestCase):
     @mock.patch.object(Configuration, 'get')
     def test_factory(self, mock_get):
@@ -169,3 +214,130 @@ class TestSTT(unittest.TestCase):
         audio = mock.MagicMock()
         stt = mycroft.stt.KaldiSTT()
         self.assertEquals(stt.execute(audio), 'text')
+
+    @mock.patch.object(Configuration, 'get')
+    def test_kaldi_streaming_stt(self, mock_get):
+        app = web.Application([(r'/client/ws/speech', MockKaldiHandler)])
+        loop = ioloop.IOLoop()
+        sock, port = bind_unused_port()
+        server = HTTPServer(app, io_loop=loop)
+        server.add_sockets([sock])
+        thread = Thread(target=loop.start)
+        thread.daemon = True
+        thread.start()
+
+        config = {'stt': {
+                 'module': 'kaldi_streaming',
+                 'kaldi_streaming': {
+                     'uri': 'ws://127.0.0.1:%d/client/ws/speech' % port}
+            },
+            'listener': {'sample_rate': 16000},
+            "lang": "en-US"
+        }
+        mock_get.return_value = config
+        try:
+            stt = mycroft.stt.STTFactory.create()
+            self.assertEquals(type(stt), mycroft.stt.KaldiStreamingSTT)
+            stt.stream_start()
+            for i in range(5):
+                stt.stream_data(b'\0' * 2048)
+            self.assertEquals(stt.stream_stop(), 'hello world 10240')
+
+            # Complete clips go through the same stream
+            audio = mock.MagicMock(frame_data=b'\0' * 100)
+            self.assertEquals(stt.execute(audio), 'hello world 100')
+        finally:
+            loop.add_callback(server.stop)
+            loop.add_callback(loop.stop)
+            thread.join(5)
+
+    # requests.post may have been replaced by other tests
+    @mock.patch('mycroft.stt.post', Session().post)
+    @mock.patch.object(Configuration, 'get')
+    def test_composite_stt(self, mock_get):
+        app = web.Application([(r'/(.*)/(.*)', MockKaldiHttpHandler)])
+        loop = ioloop.IOLoop()
+        sock, port = bind_unused_port()
+        server = HTTPServer(app, io_loop=loop)
+        server.add_sockets([sock])
+        thread = Thread(target=loop.start)
+        thread.daemon = True
+        thread.start()
+
+        def kaldi(name, delay, utterance):
+            return {'module': 'kaldi', 'name': name,
+                    'uri': 'http://127.0.0.1:%d/%s/%s' % (port, delay,
+                                                          utterance)}
+
+        def create(hedge_delay, *engines):
+            mock_get.return_value = {'stt': {
+                'module': 'composite',
+                'composite': {'engines': list(engines),
+                              'hedge_delay': hedge_delay, 'timeout': 5}
+            }, 'lang': 'en-US'}
+            stt = mycroft.stt.STTFactory.create()
+            self.assertEquals(type(stt), mycroft.stt.CompositeSTT)
+            return stt
+
+        audio = mock.MagicMock()
+        audio.get_wav_data.return_value = b'\0' * 100
+        try:
+            # Fast primary, the secondary is never used
+            stt = create(1.0, kaldi('fast', 0, 'hello'),
+                         kaldi('slow', 2, 'late'))
+            self.assertEquals(stt.execute(audio), 'hello')
+            self.assertEquals(stt.stats['slow'][0], 0)
+
+            # Slow primary, hedged to the secondary
+            stt = create(0.2, kaldi('slow', 2, 'late'),
+                         kaldi('fast', 0, 'hello'))
+            self.assertEquals(stt.execute(audio), 'hello')
+            self.assertEquals(stt.stats['fast'][:2], [1, 1])
+            self.assertEquals(stt.stats['slow'][:2], [1, 0])
+
+            # Failed primary, the secondary starts without waiting
+            stt = create(5.0, kaldi('bad', 0, 'error'),
+                         kaldi('fast', 0, 'hello'))
+            self.assertEquals(stt.execute(audio), 'hello')
+
+            metrics = mock.MagicMock()
+            stt.report(metrics)
+            metrics.level.assert_any_call('mycroft.stt.fast.win_rate', 1.0)
+            metrics.level.assert_any_call('mycroft.stt.bad.win_rate', 0.0)
+        finally:
+            loop.add_callback(server.stop)
+            loop.add_callback(loop.stop)
+            thread.join(5)
+
+    @mock.patch.object(Configuration, 'get')
+    def test_composite_busy(self, mock_get):
+        mock_get.return_value = {'stt': {
+            'module': 'composite',
+            'composite': {'engines': ['slow', 'fast'], 'hedge_delay': 0,
+                          'timeout': 5, 'max_in_flight': 1}
+        }, 'lang': 'en-US'}
+        started = Event()
+        release = Event()
+
+        def slow(audio, language):
+            started.set()
+            release.wait(5)
+
+        def fast(audio, language):
+            started.wait(5)
+            return 'hello'
+
+        engines = [mock.Mock(execute=mock.Mock(side_effect=slow)),
+                   mock.Mock(execute=mock.Mock(side_effect=fast))]
+        with mock.patch.object(mycroft.stt.STTFactory, 'create',
+                               side_effect=engines):
+            stt = mycroft.stt.CompositeSTT()
+        audio = mock.MagicMock()
+        try:
+            self.assertEquals(stt.execute(audio), 'hello')
+            # The abandoned slow request is still running, not started again
+            self.assertEquals(stt.execute(audio), 'hello')
+            self.assertEquals(stt.stats['slow'][0], 1)
+            self.assertEquals(stt.stats['fast'][:2], [2, 2])
+        finally:
+            release.set()
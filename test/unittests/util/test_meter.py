@@ -0,0 +1,76 @@
+# Copyright 2017 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from os.path import join
+
+from mycroft.util.meter import MicMeter
+
+
+class TestMicMeter(unittest.TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.path = join(self.dir, 'mic_level.mmap')
+
+    def tearDown(self):
+        rmtree(self.dir)
+
+    def test_not_created(self):
+        reader = MicMeter(self.path)
+        self.assertIsNone(reader.read())
+        self.assertIsNone(reader.wait(None, timeout=0.01))
+
+    def test_update(self):
+        writer = MicMeter(self.path, writer=True)
+        reader = MicMeter(self.path)
+        writer.update(100.0, 50.0)
+        energy, threshold, stamp, seq = reader.read()
+        self.assertEqual((energy, threshold), (100.0, 50.0))
+        self.assertGreater(stamp, 0)
+
+        # No new level
+        self.assertIsNone(reader.wait(seq, timeout=0.01))
+        writer.update(200.0, 60.0)
+        level = reader.wait(seq, timeout=0.01)
+        self.assertEqual(level[:2], (200.0, 60.0))
+        self.assertGreater(level[3], seq)
+        writer.close()
+        reader.close()
+
+    def test_restart(self):
+        writer = MicMeter(self.path, writer=True)
+        writer.update(1.0, 2.0)
+        writer.close()
+        reader = MicMeter(self.path)
+        seq = reader.read()[3]
+        # A restarted listener continues the sequence
+        writer = MicMeter(self.path, writer=True)
+        writer.update(3.0, 4.0)
+        self.assertEqual(reader.wait(seq, timeout=0.01)[:2], (3.0, 4.0))
+
+    def test_dead_writer(self):
+        writer = MicMeter(self.path, writer=True)
+        writer.update(1.0, 2.0)
+        reader = MicMeter(self.path)
+        level = reader.read()
+        seq = level[3]
+        # The listener died in the middle of an update
+        writer.map[0] = chr(ord(writer.map[0]) + 1)
+        self.assertEqual(reader.read(), level)
+        self.assertIsNone(reader.wait(seq, timeout=0.01))
+        writer.close()
+        reader.close()
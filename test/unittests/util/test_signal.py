@@ -12,34 +12,104 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import struct
+import time
 import unittest
 from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Timer
 
-from os.path import exists, isfile
+import mock
+from os.path import join
 
+import mycroft.util.signal
 from mycroft.util import create_signal, check_for_signal
+from mycroft.util.signal import (
+    SignalBoard,
+    wait_for_signal,
+    wait_for_signal_clear
+)
 
 
 class TestSignals(unittest.TestCase):
     def setUp(self):
-        if exists('/tmp/mycroft'):
-            rmtree('/tmp/mycroft')
+        self.dir = mkdtemp()
+        self.board = SignalBoard(join(self.dir, 'signals.mmap'))
+        patcher = mock.patch.object(mycroft.util.signal, '_board', self.board)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.board.close()
+        rmtree(self.dir)
 
     def test_create_signal(self):
-        create_signal('test_signal')
-        self.assertTrue(isfile('/tmp/mycroft/ipc/signal/test_signal'))
+        self.assertTrue(create_signal('test_signal'))
+        self.assertTrue(check_for_signal('test_signal', -1))
 
     def test_check_signal(self):
-        if exists('/tmp/mycroft'):
-            rmtree('/tmp/mycroft')
-        # check that signal is not found if file does not exist
+        # check that signal is not found if it was never created
         self.assertFalse(check_for_signal('test_signal'))
 
         # Check that the signal is found when created
         create_signal('test_signal')
         self.assertTrue(check_for_signal('test_signal'))
         # Check that the signal is removed after use
-        self.assertFalse(isfile('/tmp/mycroft/ipc/signal/test_signal'))
+        self.assertFalse(check_for_signal('test_signal'))
+
+    def test_lifetime(self):
+        create_signal('test_signal')
+        self.assertTrue(check_for_signal('test_signal', 10))
+        self.assertTrue(check_for_signal('test_signal', -1))
+        with mock.patch('time.time', return_value=time.time() + 20):
+            self.assertFalse(check_for_signal('test_signal', 10))
+        self.assertFalse(check_for_signal('test_signal', -1))
+
+    def test_shared(self):
+        other = SignalBoard(self.board.path)
+        generation = other.generation
+        create_signal('test_signal')
+        self.assertGreater(other.generation, generation)
+        self.assertTrue(other.check('test_signal'))
+        self.assertFalse(check_for_signal('test_signal'))
+        other.close()
+
+    def test_slots_reused(self):
+        for i in range(SignalBoard.NUM_SLOTS):
+            self.assertTrue(create_signal('signal%d' % i))
+        self.assertFalse(create_signal('one_too_many'))
+        check_for_signal('signal0')
+        self.assertTrue(create_signal('one_too_many'))
+        self.assertTrue(check_for_signal('one_too_many', -1))
+
+    def test_dead_writer(self):
+        create_signal('test_signal')
+        # A writer killed between the two writes of the sequence number
+        index = self.board._find('test_signal')
+        offset = self.board._offset(index)
+        seq = struct.unpack_from('<Q', self.board.map, offset)[0]
+        struct.pack_into('<Q', self.board.map, offset, seq + 1)
+
+        self.assertFalse(check_for_signal('test_signal', -1))
+        self.assertTrue(create_signal('test_signal'))
+        self.assertTrue(check_for_signal('test_signal', -1))
+        seq = struct.unpack_from('<Q', self.board.map, offset)[0]
+        self.assertFalse(seq & 1)
+
+    def test_unicode_name(self):
+        self.assertTrue(create_signal(u'caf\xe9'))
+        self.assertTrue(check_for_signal(u'caf\xe9', -1))
+        self.assertFalse(create_signal(u'\xe9' * 20))
+
+    def test_wait_for_signal(self):
+        self.assertFalse(wait_for_signal('test_signal', 0.05))
+        Timer(0.05, create_signal, ('test_signal',)).start()
+        self.assertTrue(wait_for_signal('test_signal', 5))
+        # Waiting doesn't consume the signal
+        self.assertTrue(check_for_signal('test_signal', -1))
+
+        Timer(0.05, check_for_signal, ('test_signal',)).start()
+        self.assertTrue(wait_for_signal_clear('test_signal', 5))
 
 
 if __name__ == "__main__":